@@ -1,20 +1,29 @@
 import base64
+import io
+import zipfile
 from unittest import mock
 from urllib import request
 
 import PyPDF2
+from django.core import signals
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from card_generator.api.tests.v1.cards.factories import CardFactory
+from card_generator.cards.admission import RenderRejected
 from card_generator.cards.exceptions import QRCodeCharLimitException
+from card_generator.cards.models import Card
+from card_generator.cards.tests.mixins import SAMPLE_PDF, fake_convert_svgs
 from card_generator.users.tests.factories import UserFactory
 
 CARD_TITLE_1 = "Sample Title"
-FRONT_SVG_FILE = "card_generator/api/tests/v1/cards/samples/front_card.svg"
-BACK_SVG_FILE = "card_generator/api/tests/v1/cards/samples/back_card.svg"
-JPG_FILE = "card_generator/api/tests/v1/cards/samples/sample_image.jpg"
+FRONT_SVG_FILE = "card_generator/cards/samples/front_card.svg"
+BACK_SVG_FILE = "card_generator/cards/samples/back_card.svg"
+JPG_FILE = "card_generator/cards/samples/sample_image.jpg"
 
 
 class CardTestCase(APITestCase):
@@ -57,6 +66,24 @@ class CardTestCase(APITestCase):
         self.assertEqual(CARD_TITLE_1, response.data["title"])
         self.assertTrue(response.data["uuid"])
 
+    def test_create_card_optimized_templates(self):
+        with open(FRONT_SVG_FILE, "rb") as front_svg, open(
+            BACK_SVG_FILE, "rb"
+        ) as back_svg:
+            data = {
+                "title": CARD_TITLE_1,
+                "front_svg": front_svg,
+                "back_svg": back_svg,
+            }
+            response = self.client.post(self.url, data=data, format="multipart")
+
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertNotIn("current_version", response.data)
+        card = Card.objects.get(uuid=response.data["uuid"])
+        self.assertEqual(card.current_version.digest, response.data["version"])
+        self.assertTrue(card.current_version.front_svg_optimized)
+        self.assertTrue(card.current_version.back_svg_optimized)
+
     def test_create_with_string(self):
         data = {"title": CARD_TITLE_1, "front_svg": "random", "back_svg": "random"}
 
@@ -122,6 +149,7 @@ class CardDetailTestCase(APITestCase):
     """
 
     def setUp(self) -> None:
+        cache.clear()
         user = UserFactory()
         self.client.force_authenticate(user)
         with open(FRONT_SVG_FILE, "rb") as front_svg_file, open(
@@ -136,6 +164,7 @@ class CardDetailTestCase(APITestCase):
             response = self.client.post("/api/v1/cards/", data=data, format="multipart")
         self.assertEqual(status.HTTP_201_CREATED, response.status_code)
 
+        self.card_uuid = response.data["uuid"]
         self.detail_url = reverse(
             "api-v1:card-detail", kwargs={"uuid": response.data["uuid"]}
         )
@@ -148,6 +177,9 @@ class CardDetailTestCase(APITestCase):
         self.merge_cards_url = reverse(
             "api-v1:card-merge-cards", kwargs={"uuid": response.data["uuid"]}
         )
+        self.render_archive_url = reverse(
+            "api-v1:card-render-archive", kwargs={"uuid": response.data["uuid"]}
+        )
 
     def test_detail(self):
         response = self.client.get(self.detail_url)
@@ -332,6 +364,73 @@ class CardDetailTestCase(APITestCase):
         for field in fields:
             self.assertIn(field, response.data["fields"])
 
+    def test_card_fields_conditional_get(self):
+        response = self.client.get(self.fields_url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("Authorization", response["Vary"])
+        etag = response["ETag"]
+
+        with mock.patch.object(Card, "get_fields") as get_fields, CaptureQueriesContext(
+            connection
+        ) as queries:
+            response = self.client.get(self.fields_url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+            self.assertEqual(etag, response["ETag"])
+            response = self.client.get(
+                self.fields_url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+            )
+            self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+            response = self.client.get(self.fields_url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertEqual(10, len(response.data["fields"]))
+        get_fields.assert_not_called()
+        # Only the savepoints of the atomic requests
+        self.assertFalse(
+            [query for query in queries if "SAVEPOINT" not in query["sql"]]
+        )
+
+    def test_card_update_invalidates_cache(self):
+        etags = {}
+        for url in (self.detail_url, self.fields_url, "/api/v1/cards/"):
+            etags[url] = self.client.get(url)["ETag"]
+
+        card = Card.objects.get(uuid=self.card_uuid)
+        card.title = "New Title"
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            card.save()
+            # Until the commit, a concurrent request could cache the previous card again
+            self.assertIsNotNone(cache.get(f"card-response:{self.card_uuid}:fields"))
+        self.assertTrue(callbacks)
+
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertNotEqual(etag, response["ETag"])
+        self.assertEqual("New Title", response.data[0]["title"])
+
+    def test_card_delete_invalidates_list(self):
+        other_card = CardFactory()
+        response = self.client.get("/api/v1/cards/")
+        self.assertNotIn("Last-Modified", response)
+        etag = response["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other_card.delete()
+
+        response = self.client.get("/api/v1/cards/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(1, len(response.data))
+
+    def test_cards_list_queries(self):
+        CardFactory.create_batch(3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/v1/cards/")
+        self.assertEqual(4, len(response.data))
+        self.assertEqual(
+            1, len([query for query in queries if "SAVEPOINT" not in query["sql"]])
+        )
+
     def test_anonymous_user_card_fields(self):
         self.client.logout()
         response = self.client.get(self.fields_url)
@@ -368,12 +467,108 @@ class CardDetailTestCase(APITestCase):
         with self.assertRaises(QRCodeCharLimitException):
             self.client.post(self.render_url, data, format="json")
 
-    @mock.patch("card_generator.cards.client.QueueCardsClient.get_queue_batch")
+    @mock.patch("card_generator.cards.pdf.convert_svgs", side_effect=fake_convert_svgs)
+    def test_card_render_archive(self, mock_convert_svgs):
+        data = {
+            "create_qr_code": True,
+            "records": [
+                {"given_name": "Test User", "identification_no": "id-1"},
+                {"given_name": "Test User", "identification_no": "id-2"},
+            ],
+            "name_field": "identification_no",
+        }
+        response = self.client.post(self.render_archive_url, data, format="json")
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.streaming)
+        self.assertEqual("application/zip", response["Content-Type"])
+
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(
+            [
+                "id-1.pdf",
+                "id-1_0.png",
+                "id-1_1.png",
+                "id-2.pdf",
+                "id-2_0.png",
+                "id-2_1.png",
+            ],
+            archive.namelist(),
+        )
+        with open(SAMPLE_PDF, "rb") as f:
+            self.assertEqual(f.read(), archive.read("id-1.pdf"))
+        self.assertEqual(b"png", archive.read("id-1_0.png"))
+
+    @mock.patch("card_generator.cards.pdf.convert_svgs", side_effect=fake_convert_svgs)
+    def test_card_render_archive_duplicate_names(self, mock_convert_svgs):
+        data = {
+            "create_qr_code": False,
+            "records": [
+                {"identification_no": "id-1"},
+                {"identification_no": "id-1"},
+                {"identification_no": "other/id-1"},
+            ],
+            "name_field": "identification_no",
+            "formats": ["pdf"],
+        }
+        response = self.client.post(self.render_archive_url, data, format="json")
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(["id-1.pdf", "id-1-1.pdf", "id-1-2.pdf"], archive.namelist())
+
+    @mock.patch("card_generator.api.v1.cards.views.get_render_slots")
+    def test_card_render_rejected(self, mock_get_render_slots):
+        mock_get_render_slots.return_value.acquire.side_effect = RenderRejected(
+            429, 10, "Too many renders in progress, retry later."
+        )
+        data = {"fields": {"given_name": "John"}, "create_qr_code": False}
+        response = self.client.post(self.render_url, data, format="json")
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, response.status_code)
+        self.assertEqual("10", response["Retry-After"])
+
+    @mock.patch("card_generator.api.v1.cards.views.get_render_slots")
+    def test_card_render_archive_rejected(self, mock_get_render_slots):
+        mock_get_render_slots.return_value.acquire.return_value.__enter__.side_effect = RenderRejected(
+            503, 10, "Timed out waiting for a render slot."
+        )
+        data = {"create_qr_code": True, "records": [{"given_name": "Test User"}]}
+        response = self.client.post(self.render_archive_url, data, format="json")
+        self.assertEqual(status.HTTP_503_SERVICE_UNAVAILABLE, response.status_code)
+        self.assertEqual("10", response["Retry-After"])
+
+    @mock.patch("card_generator.api.v1.cards.views.get_render_slots")
+    def test_card_render_archive_slot(self, mock_get_render_slots):
+        slot = mock_get_render_slots.return_value.acquire.return_value
+        data = {"create_qr_code": True, "records": [{"given_name": "Test User"}]}
+        response = self.client.post(self.render_archive_url, data, format="json")
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        slot.__enter__.assert_called_once_with()
+        slot.__exit__.assert_not_called()
+
+        # Released when the response is closed, even before the cards are rendered
+        with mock.patch.object(signals.request_finished, "send"):
+            response.close()
+        slot.__exit__.assert_called_once_with(None, None, None)
+
+    def test_card_render_duplex_front_only(self):
+        data = {
+            "fields": {"given_name": "John"},
+            "create_qr_code": False,
+            "imposition": {"duplex": True},
+        }
+        response = self.client.post(
+            f"{self.render_url}?front_only=true", data, format="json"
+        )
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn("imposition", response.data)
+
+    def test_card_render_archive_invalid_records(self):
+        data = {"create_qr_code": True, "records": [{"profile_svg_3": "invalid"}]}
+        response = self.client.post(self.render_archive_url, data, format="json")
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn("records", response.data)
+
     @mock.patch("card_generator.cards.client.QueueCardsClient.login")
-    @mock.patch("card_generator.tasks.cards.merge_cards.delay")
-    def test_merge_cards(self, mock_task, mock_login, mock_get_queue_batch):
-        mock_login.return_value = 1
-        mock_get_queue_batch.return_value = {"id": 1}
+    @mock.patch("card_generator.tasks.cards.merge_cards.apply_async")
+    def test_merge_cards(self, mock_task, mock_login):
         data = {"batch_id": 1}
         response = self.client.post(self.merge_cards_url, data=data, format="json")
         self.assertEqual(200, response.status_code)
@@ -382,6 +577,108 @@ class CardDetailTestCase(APITestCase):
             "update the batch record with the merged card pdf.",
             response.data["message"],
         )
+        # The endpoint does not communicate with OpenSPP
+        mock_login.assert_not_called()
+        mock_task.assert_called_once_with(
+            kwargs={"batch_id": 1}, task_id=response.data["task_id"], queue="merges"
+        )
+
+    @mock.patch("card_generator.tasks.cards.merge_cards.apply_async")
+    def test_merge_cards_duplicate_request(self, mock_task):
+        data = {"batch_id": 1}
+        response = self.client.post(self.merge_cards_url, data=data, format="json")
+        duplicate_response = self.client.post(
+            self.merge_cards_url, data=data, format="json"
+        )
+        self.assertEqual(1, mock_task.call_count)
+        self.assertEqual(200, duplicate_response.status_code)
+        self.assertEqual(
+            "Batch ID 1 is already being merged.", duplicate_response.data["message"]
+        )
+        self.assertEqual(response.data["task_id"], duplicate_response.data["task_id"])
+        self.assertEqual("queued", duplicate_response.data["status"])
+
+    @mock.patch("card_generator.tasks.registry.cache")
+    @mock.patch("card_generator.tasks.cards.merge_cards.apply_async")
+    def test_merge_cards_registry_unavailable(self, mock_task, mock_cache):
+        mock_cache.add.return_value = False
+        mock_cache.get.return_value = None
+        for _ in range(2):
+            response = self.client.post(
+                self.merge_cards_url, data={"batch_id": 1}, format="json"
+            )
+            self.assertEqual(200, response.status_code)
+        # Without the registry, the requests are merged without deduplication
+        self.assertEqual(2, mock_task.call_count)
+
+    @mock.patch("card_generator.tasks.cards.merge_cards.apply_async")
+    def test_merge_cards_status(self, mock_task):
+        status_url = reverse(
+            "api-v1:card-merge-cards-status",
+            kwargs={"uuid": self.card_uuid, "batch_id": 1},
+        )
+        response = self.client.get(status_url)
+        self.assertEqual(404, response.status_code)
+
+        merge_response = self.client.post(
+            self.merge_cards_url, data={"batch_id": 1}, format="json"
+        )
+        response = self.client.get(status_url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(merge_response.data["task_id"], response.data["task_id"])
+        self.assertEqual("queued", response.data["status"])
+
+    @mock.patch("card_generator.tasks.cards.merge_cards.apply_async")
+    def test_merge_cards_imposition(self, mock_task):
+        data = {
+            "batch_id": 1,
+            "imposition": {"sheet": "letter", "rows": 4, "duplex": True},
+        }
+        response = self.client.post(self.merge_cards_url, data=data, format="json")
+        self.assertEqual(200, response.status_code)
+        imposition = mock_task.call_args.kwargs["kwargs"]["imposition"]
+        self.assertEqual("letter", imposition["sheet"])
+        self.assertTrue(imposition["duplex"])
+        self.assertEqual(2, imposition["columns"])
+
+    @mock.patch("card_generator.tasks.cards.merge_cards.apply_async")
+    def test_merge_cards_queue(self, mock_task):
+        response = self.client.post(
+            self.merge_cards_url, data={"batch_id": 1}, format="json"
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("merges", mock_task.call_args.kwargs["queue"])
+
+        data = {"batch_id": 2, "batch_size": 5000}
+        response = self.client.post(self.merge_cards_url, data=data, format="json")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("bulk_merges", mock_task.call_args.kwargs["queue"])
+
+    @mock.patch("card_generator.tasks.cards.merge_cards.apply_async")
+    def test_merge_cards_invalid_batch_size(self, mock_task):
+        data = {"batch_id": 1, "batch_size": -1}
+        response = self.client.post(self.merge_cards_url, data=data, format="json")
+        self.assertEqual(400, response.status_code)
+        self.assertEqual("Invalid 'batch_size'.", response.data["message"])
+        mock_task.assert_not_called()
+
+    @mock.patch("card_generator.tasks.cards.merge_cards.apply_async")
+    def test_merge_cards_profile(self, mock_task):
+        self.client.force_authenticate(UserFactory(is_staff=True))
+        data = {"batch_id": 1}
+        response = self.client.post(
+            self.merge_cards_url, data=data, format="json", HTTP_X_PROFILE="1"
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(mock_task.call_args.kwargs["kwargs"]["profile"])
+
+    @mock.patch("card_generator.tasks.cards.merge_cards.apply_async")
+    def test_merge_cards_invalid_imposition(self, mock_task):
+        data = {"batch_id": 1, "imposition": {"columns": 3, "rows": 5}}
+        response = self.client.post(self.merge_cards_url, data=data, format="json")
+        self.assertEqual(400, response.status_code)
+        self.assertIn("imposition", response.data)
+        mock_task.assert_not_called()
 
     def test_merge_cards_empty_payload(self):
         response = self.client.post(self.merge_cards_url, data={}, format="json")
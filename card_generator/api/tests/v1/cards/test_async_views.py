@@ -0,0 +1,179 @@
+import threading
+from unittest import mock
+
+from django.core.files import File
+from django.db.backends.utils import CursorWrapper
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from card_generator.cards.admission import RenderRejected
+from card_generator.cards.models import Card
+from card_generator.cards.tests.mixins import fake_convert_svgs
+from card_generator.users.tests.factories import UserFactory
+from card_generator.utils.executor import ExecutorFull, get_render_executor
+
+FRONT_SVG_FILE = "card_generator/cards/samples/front_card.svg"
+BACK_SVG_FILE = "card_generator/cards/samples/back_card.svg"
+
+
+class CardAsyncViewsTestCase(TestCase):
+    def setUp(self):
+        self.card = Card(title="Sample Title")
+        with open(FRONT_SVG_FILE, "rb") as front_svg, open(
+            BACK_SVG_FILE, "rb"
+        ) as back_svg:
+            self.card.front_svg.save("front_card.svg", File(front_svg), save=False)
+            self.card.back_svg.save("back_card.svg", File(back_svg), save=False)
+        self.card.save()
+        token = Token.objects.create(user=UserFactory())
+        self.headers = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+        self.render_url = reverse(
+            "api-v1:card-render-async", kwargs={"uuid": self.card.uuid}
+        )
+        self.fields_url = reverse(
+            "api-v1:card-fields-async", kwargs={"uuid": self.card.uuid}
+        )
+        self.addCleanup(get_render_executor.cache_clear)
+
+    @mock.patch("card_generator.cards.pdf.convert_svgs", side_effect=fake_convert_svgs)
+    def test_render(self, mock_convert_svgs):
+        data = {"fields": {"given_name": "John"}, "create_qr_code": False}
+        response = self.client.post(
+            self.render_url, data, content_type="application/json", **self.headers
+        )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        files = response.json()["files"]
+        self.assertTrue(files["pdf"].startswith("data:application/pdf;base64,"))
+        self.assertEqual(2, len(files["png"]))
+
+    @mock.patch("card_generator.cards.pdf.convert_svgs", side_effect=fake_convert_svgs)
+    def test_render_without_queries_on_executor(self, mock_convert_svgs):
+        threads = []
+        execute = CursorWrapper._execute_with_wrappers
+
+        def record_thread(cursor, *args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return execute(cursor, *args, **kwargs)
+
+        data = {"fields": {"given_name": "John"}, "create_qr_code": False}
+        with mock.patch.object(CursorWrapper, "_execute_with_wrappers", record_thread):
+            response = self.client.post(
+                self.render_url, data, content_type="application/json", **self.headers
+            )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        # The threads of the executor never open a connection of their own
+        self.assertTrue(threads)
+        self.assertFalse([name for name in threads if name.startswith("render")])
+
+    def test_render_invalid_fields(self):
+        data = {"fields": {"profile_svg_3": "invalid"}, "create_qr_code": True}
+        response = self.client.post(
+            self.render_url, data, content_type="application/json", **self.headers
+        )
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_render_errors_like_viewset(self):
+        data = {"fields": {"profile_svg_3": "invalid"}, "create_qr_code": True}
+        response = self.client.post(
+            self.render_url, data, content_type="application/json", **self.headers
+        )
+        viewset_response = self.client.post(
+            reverse("api-v1:card-render", kwargs={"uuid": self.card.uuid}),
+            data,
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(viewset_response.json(), response.json())
+
+        response = self.client.get(self.render_url, **self.headers)
+        self.assertEqual(status.HTTP_405_METHOD_NOT_ALLOWED, response.status_code)
+        self.assertEqual('Method "GET" not allowed.', response.json()["detail"])
+
+    def test_render_csrf_exempt(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(
+            self.render_url, "{", content_type="application/json", **self.headers
+        )
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_render_invalid_json(self):
+        response = self.client.post(
+            self.render_url, "{", content_type="application/json", **self.headers
+        )
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    @override_settings(
+        OPENSPP_ASYNC_RENDER_WORKERS=1, OPENSPP_ASYNC_RENDER_QUEUE_SIZE=0
+    )
+    def test_render_queue_full(self):
+        get_render_executor.cache_clear()
+        with mock.patch(
+            "card_generator.utils.executor.BoundedExecutor.run",
+            side_effect=ExecutorFull(),
+        ):
+            response = self.client.post(
+                self.render_url,
+                {"fields": {}, "create_qr_code": False},
+                content_type="application/json",
+                **self.headers,
+            )
+        self.assertEqual(status.HTTP_503_SERVICE_UNAVAILABLE, response.status_code)
+        self.assertEqual("1", response["Retry-After"])
+
+    @mock.patch("card_generator.api.v1.cards.async_views.get_render_slots")
+    def test_render_rejected(self, mock_get_render_slots):
+        mock_get_render_slots.return_value.acquire_async.side_effect = RenderRejected(
+            503, 10, "Timed out waiting for a render slot."
+        )
+        response = self.client.post(
+            self.render_url,
+            {"fields": {}, "create_qr_code": False},
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(status.HTTP_503_SERVICE_UNAVAILABLE, response.status_code)
+        self.assertEqual("10", response["Retry-After"])
+
+    def test_render_unauthenticated(self):
+        response = self.client.post(
+            self.render_url, {}, content_type="application/json"
+        )
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, response.status_code)
+        self.assertEqual("Token", response["WWW-Authenticate"])
+
+        response = self.client.post(
+            self.render_url,
+            {},
+            content_type="application/json",
+            HTTP_AUTHORIZATION="Token invalid",
+        )
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, response.status_code)
+        self.assertEqual("Invalid token.", response.json()["detail"])
+
+    def test_fields(self):
+        response = self.client.get(self.fields_url, **self.headers)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(10, len(response.json()["fields"]))
+
+    def test_fields_cached(self):
+        response = self.client.get(self.fields_url, **self.headers)
+        viewset_response = self.client.get(
+            reverse("api-v1:card-fields", kwargs={"uuid": self.card.uuid}),
+            **self.headers,
+        )
+        self.assertEqual(viewset_response["ETag"], response["ETag"])
+
+        response = self.client.get(
+            self.fields_url, HTTP_IF_NONE_MATCH=response["ETag"], **self.headers
+        )
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+    def test_fields_not_found(self):
+        url = reverse(
+            "api-v1:card-fields-async",
+            kwargs={"uuid": "00000000-0000-0000-0000-000000000000"},
+        )
+        response = self.client.get(url, **self.headers)
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
@@ -0,0 +1,94 @@
+import logging
+from time import perf_counter
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from rest_framework.response import Response
+
+from card_generator.api.v1.cards.views import CardViewSet, get_rejected_response
+from card_generator.cards.admission import RenderRejected, get_render_slots
+from card_generator.utils.executor import ExecutorFull, get_render_executor
+from card_generator.utils.metrics import RENDER_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def async_api_view(view):
+    """
+    Mark an async view like DRF marks its views: exempt from CSRF checks, the requests are
+    authenticated with tokens. Async views cannot run in the transaction of ATOMIC_REQUESTS.
+    The decorators of Django 4.1 would wrap the view in a sync function.
+    """
+    view.csrf_exempt = True
+    return transaction.non_atomic_requests(view)
+
+
+async def dispatch(request, uuid, method: str, action: str, handler):
+    """
+    Handle a request with a `CardViewSet` set up like its router does, so the async views share
+    its authentication, permissions, throttles, errors and responses.
+    :param request: Django request object
+    :param uuid: UUID of the card
+    :param method: HTTP method of the view
+    :param action: Action of `CardViewSet` handling the request
+    :param handler: Coroutine function handling the request with the viewset and its request
+    :return: Response object, rendered by Django
+    """
+    view = CardViewSet(action_map={method: action}, detail=True, basename="card")
+    view.args, view.kwargs = (), {"uuid": str(uuid)}
+    request = view.initialize_request(request, *view.args, **view.kwargs)
+    view.request = request
+    view.headers = view.default_response_headers
+    try:
+        if request.method.lower() != method:
+            view.http_method_not_allowed(request)
+        await sync_to_async(view.initial)(request, *view.args, **view.kwargs)
+        response = await handler(view, request)
+    except Exception as e:  # noqa The viewset responds to the API errors
+        response = view.handle_exception(e)
+    return view.finalize_response(request, response, *view.args, **view.kwargs)
+
+
+async def render_card(view: CardViewSet, request) -> Response:
+    start = perf_counter()
+    render_status = "error"
+    try:
+        serializer = await sync_to_async(view.get_render_serializer)(request)
+        async with get_render_slots().acquire_async():
+            # Only the render runs on the executor, the card is resolved with the request
+            data = await get_render_executor().run(lambda: serializer.data)
+        render_status = "success"
+        return Response(data=data)
+    except RenderRejected as e:
+        render_status = "rejected"
+        logger.warning(f"Render of #{view.kwargs['uuid']} rejected. {str(e)}")
+        return get_rejected_response(e.status, e.retry_after, str(e))
+    except ExecutorFull:
+        render_status = "rejected"
+        logger.warning(
+            f"Render of #{view.kwargs['uuid']} rejected, the render queue is full."
+        )
+        return get_rejected_response(
+            503, 1, "Too many renders in progress, retry later."
+        )
+    finally:
+        RENDER_SECONDS.labels(status=render_status).observe(perf_counter() - start)
+
+
+async def get_fields(view: CardViewSet, request) -> Response:
+    return await sync_to_async(view.fields)(request, **view.kwargs)
+
+
+@async_api_view
+async def render(request, uuid):
+    """
+    Async version of `CardViewSet.render`. The render runs on the threads of the render
+    executor, so one process serves many renders waiting on the rasterizer.
+    """
+    return await dispatch(request, uuid, "post", "render", render_card)
+
+
+@async_api_view
+async def fields(request, uuid):
+    """Async version of `CardViewSet.fields`, with the same cached responses."""
+    return await dispatch(request, uuid, "get", "fields", get_fields)
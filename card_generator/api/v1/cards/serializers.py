@@ -4,6 +4,7 @@ from django.core.validators import FileExtensionValidator
 from rest_framework import serializers
 from rest_framework.fields import JSONField
 
+from card_generator.cards.imposition import SHEET_SIZES, ImpositionLayout
 from card_generator.cards.models import Card
 from card_generator.cards.pdf import CardRender
 
@@ -20,14 +21,46 @@ class CustomFileField(serializers.FileField):
 class CardSerializer(serializers.ModelSerializer):
     front_svg = CustomFileField(validators=[FileExtensionValidator(["svg"])])
     back_svg = CustomFileField(validators=[FileExtensionValidator(["svg"])])
+    version = serializers.SerializerMethodField()
+    __doc_version__ = """Digest of the version of the templates used by the renders."""
 
     class Meta:
         model = Card
-        exclude = ("created", "modified", "id")
+        exclude = ("created", "modified", "id", "current_version")
         read_only_fields = ("uuid",)
 
         extra_kwargs = {"url": {"view_name": "api:cards", "lookup_field": "uuid"}}
 
+    def get_version(self, obj) -> str | None:
+        return obj.current_version.digest if obj.current_version else None
+
+
+class ImpositionSerializer(serializers.Serializer):
+    """Serializer for the layout of cards on print sheets."""
+
+    sheet = serializers.ChoiceField(choices=list(SHEET_SIZES), default="a4")
+    __doc_sheet__ = """Size of the print sheet."""
+
+    columns = serializers.IntegerField(min_value=1, default=2)
+    rows = serializers.IntegerField(min_value=1, default=5)
+
+    gap = serializers.FloatField(min_value=0, default=3)
+    __doc_gap__ = """Space between the cards in millimeters."""
+
+    crop_marks = serializers.BooleanField(default=True)
+
+    duplex = serializers.BooleanField(default=False)
+    __doc_duplex__ = """Place the back of the cards on their own sheet, mirrored to line up with the front
+    when printed on both sides.
+    """
+
+    def validate(self, data):
+        try:
+            ImpositionLayout(**data)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return data
+
 
 class CardRenderSerializer(serializers.Serializer):
     """Serializer for rendering card template."""
@@ -40,6 +73,9 @@ class CardRenderSerializer(serializers.Serializer):
     fields = JSONField(required=True, write_only=True)
     __doc_fields__ = """Dictionary of fields with its values."""
 
+    imposition = ImpositionSerializer(required=False, write_only=True)
+    __doc_imposition__ = """Place the card on a print sheet with crop marks instead of one page per side."""
+
     files = serializers.SerializerMethodField()
     __doc_files__ = (
         """Files generated after applying the values on the card template."""
@@ -49,24 +85,75 @@ class CardRenderSerializer(serializers.Serializer):
         card = self.context["card"]
         front_only = self.context.get("front_only", False)
         card_render = CardRender(
-            card, obj["fields"], obj["create_qr_code"], front_only=front_only
+            card,
+            obj["fields"],
+            obj["create_qr_code"],
+            front_only=front_only,
+            imposition=obj.get("imposition"),
+            profile=self.context.get("profile"),
         )
         return card_render.render()
 
     def validate(self, data):
-        create_qrcode = data["create_qr_code"]
-        fields = data["fields"]
-        items = [
-            key
-            for key, value in fields.items()
-            if ("profile" in key or (not create_qrcode and "qrcode" in key))
-            and "data:image" not in value
-        ]
-
-        if items:
+        validate_fields(data["fields"], data["create_qr_code"])
+        if self.context.get("front_only") and data.get("imposition", {}).get("duplex"):
             raise serializers.ValidationError(
                 {
-                    "fields": f"Fields `{', '.join(items)}` value should be in data uri format."
+                    "imposition": "Duplex imposition needs the back of the card, it cannot be used with `front_only`."
                 }
             )
         return data
+
+
+class CardRenderArchiveSerializer(serializers.Serializer):
+    """Serializer for rendering many cards into a ZIP archive."""
+
+    create_qr_code = serializers.BooleanField(default=True)
+    __doc_create_qr_code__ = (
+        """Checks if the qrcode code should be generated with the value given."""
+    )
+
+    records = serializers.ListField(child=JSONField(), allow_empty=False)
+    __doc_records__ = (
+        """List of dictionaries of fields with their values, one per card."""
+    )
+
+    formats = serializers.MultipleChoiceField(
+        choices=["pdf", "png"], default=["pdf", "png"]
+    )
+    __doc_formats__ = """Files to add to the archive for each card."""
+
+    name_field = serializers.CharField(required=False)
+    __doc_name_field__ = """Field used to name the files of a card, defaults to the record number.
+    A name used by a previous card is suffixed with the record number, e.g. `name-3`.
+    """
+
+    def validate_records(self, records):
+        for index, fields in enumerate(records):
+            if not isinstance(fields, dict):
+                raise serializers.ValidationError(
+                    f"Record {index} should be a dictionary of fields."
+                )
+        return records
+
+    def validate(self, data):
+        for fields in data["records"]:
+            validate_fields(fields, data["create_qr_code"], field_name="records")
+        return data
+
+
+def validate_fields(fields: dict, create_qrcode: bool, field_name: str = "fields"):
+    """Check that the images of the fields are provided as data URIs."""
+    items = [
+        key
+        for key, value in fields.items()
+        if ("profile" in key or (not create_qrcode and "qrcode" in key))
+        and "data:image" not in value
+    ]
+
+    if items:
+        raise serializers.ValidationError(
+            {
+                field_name: f"Fields `{', '.join(items)}` value should be in data uri format."
+            }
+        )
@@ -1,20 +1,59 @@
 import logging
+import uuid
+from time import perf_counter
 
 from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
 from drf_spectacular.utils import OpenApiExample, extend_schema, extend_schema_view
+from opentelemetry.trace import SpanKind
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from card_generator.api.v1.cards.serializers import CardRenderSerializer, CardSerializer
-from card_generator.cards.client import QueueCardsClient
+from card_generator.api.v1.cards.serializers import (
+    CardRenderArchiveSerializer,
+    CardRenderSerializer,
+    CardSerializer,
+    ImpositionSerializer,
+)
+from card_generator.cards.admission import RenderRejected, get_render_slots
+from card_generator.cards.archive import HeldStream, stream_cards_archive
+from card_generator.cards.cache import (
+    LIST_KEY,
+    get_card_key,
+    get_etag,
+    get_response,
+    set_response,
+)
 from card_generator.cards.models import Card
+from card_generator.tasks import status
 from card_generator.tasks.cards import merge_cards as merge_cards_task
+from card_generator.tasks.queues import get_merge_queue
+from card_generator.tasks.registry import register_merge_task, release_merge_task
+from card_generator.utils.metrics import RENDER_SECONDS
+from card_generator.utils.profiling import is_profiling_requested
+from card_generator.utils.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
 
+def get_rejected_response(status: int, retry_after: int, detail: str) -> Response:
+    """Respond to a render rejected because the host is saturated with renders."""
+    return Response(
+        status=status,
+        data={"detail": detail},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
 @extend_schema(tags=["cards"])
 @extend_schema_view(
     list=extend_schema(description="List all available card templates."),
@@ -29,11 +68,72 @@ class CardViewSet(ModelViewSet):
     """
 
     serializer_class = CardSerializer
-    queryset = Card.objects.all()
+    queryset = Card.objects.select_related("current_version").order_by("pk")
     lookup_field = "uuid"
     authentication_classes = (TokenAuthentication,)
     http_method_names = ("get", "post", "put", "delete")
 
+    def get_cached_response(self, request, key: str, build):
+        """
+        Respond with the cached response of a view, or build and cache it until the cards change.
+        The response has an ETag validator, and a Last-Modified one with a modification time,
+        so a client polling the view gets a 304 while it does not change.
+        :param request: Request object
+        :param key: Cache key of the response
+        :param build: Function returning the data of the response, the parts identifying it in
+            its ETag and its modification time, or None
+        :return: Response object with the data, or 304 when the client has it already
+        """
+        cached = get_response(key)
+        if cached is None:
+            data, etag_parts, last_modified = build()
+            cached = set_response(key, data, get_etag(*etag_parts), last_modified)
+        last_modified = cached["last_modified"] and int(cached["last_modified"])
+        response = get_conditional_response(
+            request, etag=cached["etag"], last_modified=last_modified
+        ) or Response(data=cached["data"])
+        response["ETag"] = cached["etag"]
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(
+            response, private=True, max_age=settings.OPENSPP_CARD_MAX_AGE
+        )
+        patch_vary_headers(response, ("Authorization",))
+        return response
+
+    def get_response_key(self, view: str) -> str:
+        try:
+            card_uuid = uuid.UUID(self.kwargs[self.lookup_field])
+        except ValueError:
+            raise NotFound()
+        return get_card_key(card_uuid, view)
+
+    def list(self, request, *args, **kwargs):
+        # Without Last-Modified: removing a card does not move the modification time of the
+        # list, the ETag identifies the cards it contains
+        def build():
+            cards = list(self.filter_queryset(self.get_queryset()))
+            return (
+                self.get_serializer(cards, many=True).data,
+                [f"{card.uuid}:{card.modified.isoformat()}" for card in cards],
+                None,
+            )
+
+        return self.get_cached_response(request, LIST_KEY, build)
+
+    def retrieve(self, request, *args, **kwargs):
+        def build():
+            card = self.get_object()
+            return (
+                self.get_serializer(card).data,
+                ("retrieve", card.uuid, card.modified.isoformat()),
+                card.modified.timestamp(),
+            )
+
+        return self.get_cached_response(
+            request, self.get_response_key("retrieve"), build
+        )
+
     @action(
         methods=["post"],
         detail=True,
@@ -41,17 +141,86 @@ class CardViewSet(ModelViewSet):
     def render(self, request, **kwargs):
         """
         Generate a card from a template with the provided values.
+        Staff users can profile the render with the `X-Profile` header.
+        When the host is saturated with renders, the request waits for a render slot, or is rejected with
+        429 when too many requests are waiting, and with 503 when the wait times out.
         :param request: Request object
         :param kwargs: Unrequired keyword arguments that may be passed to this function
         :return: Response object with the data rendered.
         """
-        front_only = self.request.query_params.get("front_only")
+        start = perf_counter()
+        render_status = "error"
+        try:
+            serializer = self.get_render_serializer(request)
+            with get_render_slots().acquire():
+                response = Response(data=serializer.data)
+            render_status = "success"
+            return response
+        except RenderRejected as e:
+            render_status = "rejected"
+            return get_rejected_response(e.status, e.retry_after, str(e))
+        finally:
+            RENDER_SECONDS.labels(status=render_status).observe(perf_counter() - start)
+
+    def get_render_serializer(self, request) -> CardRenderSerializer:
+        """
+        Validate the values of a render of the card. The card is rendered when the data of the
+        serializer is read, without any query: the card is fetched with its current version, so
+        the async views render on threads without a database connection.
+        :param request: Request object
+        :return: The validated serializer
+        """
         serializer = CardRenderSerializer(
             data=request.data,
-            context={"card": self.get_object(), "front_only": front_only},
+            context={
+                "card": self.get_object(),
+                "front_only": request.query_params.get("front_only"),
+                "profile": is_profiling_requested(request),
+            },
         )
         serializer.is_valid(raise_exception=True)
-        return Response(data=serializer.data)
+        return serializer
+
+    @extend_schema(
+        request=CardRenderArchiveSerializer,
+        responses={(200, "application/zip"): bytes},
+    )
+    @action(methods=["post"], detail=True, url_path="render-archive")
+    def render_archive(self, request, **kwargs):
+        """
+        Generate many cards from a template into a ZIP archive. The archive is streamed while the cards are
+        rendered one by one, so the response starts as soon as the first card is done. The stream holds a
+        render slot, the request is rejected like the renders when there is none.
+        :param request: Request object
+        :param kwargs: Unrequired keyword arguments that may be passed to this function
+        :return: Streaming response of the ZIP archive
+        """
+        card = self.get_object()
+        serializer = CardRenderArchiveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        # The cards are rendered one at a time, holding a render slot until the stream is closed
+        slot = get_render_slots().acquire()
+        try:
+            slot.__enter__()
+        except RenderRejected as e:
+            return get_rejected_response(e.status, e.retry_after, str(e))
+        response = StreamingHttpResponse(
+            HeldStream(
+                stream_cards_archive(
+                    card,
+                    data["records"],
+                    data["create_qr_code"],
+                    front_only=bool(request.query_params.get("front_only")),
+                    formats=sorted(data["formats"]),
+                    name_field=data.get("name_field"),
+                ),
+                slot,
+            ),
+            content_type="application/zip",
+        )
+        response["Content-Disposition"] = f'attachment; filename="{card.uuid}.zip"'
+        return response
 
     @action(
         methods=["get"],
@@ -64,17 +233,41 @@ class CardViewSet(ModelViewSet):
         :param kwargs: Unrequired keyword arguments that may be passed to this function
         :return: Response object with the list of fields
         """
-        data = {"fields": self.get_object().get_fields()}
-        return Response(data=data)
+
+        def build():
+            card = self.get_object()
+            return (
+                {"fields": card.get_fields()},
+                ("fields", card.uuid, card.modified.isoformat()),
+                card.modified.timestamp(),
+            )
+
+        return self.get_cached_response(request, self.get_response_key("fields"), build)
 
     @extend_schema(
-        examples=[OpenApiExample(value={"batch_id": 1}, name="Sample request")],
+        examples=[
+            OpenApiExample(value={"batch_id": 1}, name="Sample request"),
+            OpenApiExample(
+                value={"batch_id": 1, "batch_size": 5000},
+                name="Sample request with the size of the batch",
+            ),
+            OpenApiExample(
+                value={"batch_id": 1, "imposition": {"sheet": "a4", "duplex": True}},
+                name="Sample request with print sheets",
+            ),
+        ],
     )
     @action(methods=["post"], detail=True, url_path="openspp/merge-cards")
     def merge_cards(self, request, **kwargs):
         """
         This is a dedicated action for OpenSPP. It accepts a batch queue ID and will return a message. The actual
-        process of merging cards is done through a background process.
+        process of merging cards is done through a background process, which also checks that the batch exists.
+        Duplicate requests for a batch that is still being merged return the in-flight task instead of starting
+        a new one. The status of the merge is available in `openspp/merge-cards/<batch_id>/`.
+        With `imposition`, the merged cards are tiled onto print sheets with crop marks.
+        Staff users can profile the merge with the `X-Profile` header.
+        With the number of cards of the batch in `batch_size`, large batches are merged on the bulk merges queue,
+        so they do not hold back the small ones.
         :param request: Request object
         :param kwargs: Unrequired keyword arguments that may be passed to this function
         :return: Response object with a message
@@ -88,25 +281,80 @@ class CardViewSet(ModelViewSet):
         if isinstance(batch_id, str) and not batch_id.isnumeric():
             return Response(status=400, data={"message": "Invalid 'batch_id'."})
 
-        client = QueueCardsClient(
-            server_root=settings.OPENSPP_SERVER_ROOT,
-            username=settings.OPENSPP_USERNAME,
-            password=settings.OPENSPP_API_TOKEN,
-            db_name=settings.OPENSPP_DB_NAME,
-        )
-        record = client.get_queue_batch(batch_id=batch_id)
-        if not record:
-            return Response(
-                status=404,
-                data={"message": f"No data associated with Batch ID {batch_id}"},
+        batch_id = int(batch_id)
+        batch_size = request.data.get("batch_size")
+        if batch_size is not None:
+            if not str(batch_size).isnumeric():
+                return Response(status=400, data={"message": "Invalid 'batch_size'."})
+            batch_size = int(batch_size)
+        task_kwargs = {"batch_id": batch_id}
+        if request.data.get("imposition") is not None:
+            imposition_serializer = ImpositionSerializer(
+                data=request.data["imposition"]
             )
+            if not imposition_serializer.is_valid():
+                return Response(
+                    status=400, data={"imposition": imposition_serializer.errors}
+                )
+            task_kwargs["imposition"] = dict(imposition_serializer.validated_data)
+        if is_profiling_requested(request):
+            task_kwargs["profile"] = True
+
         logger.info(f"Batch ID #{batch_id}")
-        merge_cards_task.delay(batch_id=int(batch_id))
+        task, created = register_merge_task(batch_id=batch_id)
+        if not created:
+            return Response(
+                status=200,
+                data={
+                    "message": f"Batch ID {batch_id} is already being merged.",
+                    **(status.get_merge_status(batch_id) or task),
+                },
+            )
+        merge_status = status.set_merge_status(batch_id, task["task_id"], status.QUEUED)
+        try:
+            with tracer.start_as_current_span(
+                "enqueue merge_cards",
+                kind=SpanKind.PRODUCER,
+                attributes={"batch_id": batch_id, "celery.task_id": task["task_id"]},
+            ):
+                merge_cards_task.apply_async(
+                    kwargs=task_kwargs,
+                    task_id=task["task_id"],
+                    queue=get_merge_queue(batch_size),
+                )
+        except Exception:
+            release_merge_task(batch_id=batch_id, task_id=task["task_id"])
+            raise
 
         return Response(
             status=200,
             data={
                 "message": "We are merging the cards. This process will automatically "
-                "update the batch record with the merged card pdf."
+                "update the batch record with the merged card pdf.",
+                **merge_status,
             },
         )
+
+    @action(
+        methods=["get"],
+        detail=True,
+        url_path=r"openspp/merge-cards/(?P<batch_id>[0-9]+)",
+        url_name="merge-cards-status",
+    )
+    def merge_cards_status(self, request, batch_id, **kwargs):
+        """
+        Get the status of the latest merge of a batch queue. The status is one of `queued`, `running`,
+        `retrying`, `not_found`, `no_cards`, `merged` or `error`. Once the task started, `progress` reports the
+        records fetched, pages merged, bytes written, elapsed time and ETA in seconds.
+        :param request: Request object
+        :param batch_id: ID of the batch queue
+        :param kwargs: Unrequired keyword arguments that may be passed to this function
+        :return: Response object with the status of the merge
+        """
+        merge_status = status.get_merge_status(int(batch_id))
+        if not merge_status:
+            return Response(
+                status=404,
+                data={"message": f"No merge associated with Batch ID {batch_id}"},
+            )
+        return Response(status=200, data=merge_status)
@@ -1,6 +1,7 @@
 from django.urls import path
 from rest_framework.authtoken.views import obtain_auth_token
 
+from card_generator.api.v1.cards import async_views
 from card_generator.api.v1.cards.views import CardViewSet
 from card_generator.api.v1.users.views import UserViewSet
 from card_generator.lib.api.routers import DefaultRouter
@@ -11,4 +12,15 @@ router.register("cards", CardViewSet)
 router.add_path(path("auth-token/", obtain_auth_token))
 
 app_name = "api-v1"
-urlpatterns = router.urls
+urlpatterns = router.urls + [
+    path(
+        "cards/<uuid:uuid>/async/render/",
+        async_views.render,
+        name="card-render-async",
+    ),
+    path(
+        "cards/<uuid:uuid>/async/fields/",
+        async_views.fields,
+        name="card-fields-async",
+    ),
+]
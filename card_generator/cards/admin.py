@@ -1,11 +1,24 @@
 from django.contrib import admin
 
-from card_generator.cards.models import Card
+from card_generator.cards.models import Card, CardTemplateVersion
+
+
+class CardTemplateVersionInline(admin.TabularInline):
+    model = CardTemplateVersion
+    fields = ("digest", "created", "front_svg", "back_svg")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 class CardModelAdmin(admin.ModelAdmin):
     list_display = ("title", "uuid")
     search_fields = ("title", "uuid")
+    readonly_fields = ("current_version",)
+    inlines = (CardTemplateVersionInline,)
 
 
 admin.site.register(Card, CardModelAdmin)
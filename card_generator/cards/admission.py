@@ -0,0 +1,200 @@
+import asyncio
+import fcntl
+import math
+import os
+import random
+import tempfile
+import time
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+
+from card_generator.utils.metrics import (
+    RENDER_QUEUE_LENGTH,
+    RENDER_QUEUE_WAIT_SECONDS,
+    RENDER_REJECTED,
+    RENDERS_IN_PROGRESS,
+)
+
+MEGABYTE = 1024 * 1024
+
+
+class RenderRejected(Exception):
+    """Raise this exception when the host is saturated with renders."""
+
+    def __init__(self, status: int, retry_after: int, message: str):
+        """
+        :param status: 429 when the queue is full, 503 when the wait timed out
+        :param retry_after: Seconds the client should wait before retrying
+        """
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RenderSlots:
+    """
+    Limit the renders running at the same time on the host, across all the processes of the
+    web server. A render holds an exclusive lock on one of the `slots` files of `directory`,
+    the lock is released by the system even if the process dies. While all the slots are taken,
+    up to `queue_size` renders wait for a slot, the others are rejected right away.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        slots: int,
+        queue_size: int,
+        timeout: float,
+        retry_after: int,
+        poll_interval: float = 0.02,
+    ):
+        """
+        :param directory: Directory of the lock files, shared by all the processes
+        :param slots: Number of renders running at the same time
+        :param queue_size: Number of renders waiting for a slot
+        :param timeout: Seconds a render waits for a slot before it is rejected
+        :param retry_after: Seconds the rejected clients should wait before retrying
+        :param poll_interval: Seconds between two attempts to take a slot
+        """
+        self.directory = directory
+        self.slots = slots
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.poll_interval = poll_interval
+        os.makedirs(directory, exist_ok=True)
+
+    def _lock_any(self, prefix: str, count: int) -> int | None:
+        """Lock one of the files, starting from a random one to spread the attempts."""
+        start = random.randrange(count) if count else 0  # nosec
+        for offset in range(count):
+            path = os.path.join(self.directory, f"{prefix}-{(start + offset) % count}")
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return fd
+        return None
+
+    def _enter_queue(self) -> int:
+        ticket = self._lock_any("queue", self.queue_size)
+        if ticket is None:
+            RENDER_REJECTED.labels(reason="queue_full").inc()
+            raise RenderRejected(
+                429, self.retry_after, "Too many renders in progress, retry later."
+            )
+        RENDER_QUEUE_LENGTH.inc()
+        return ticket
+
+    def _leave_queue(self, ticket: int, start: float) -> None:
+        RENDER_QUEUE_LENGTH.dec()
+        os.close(ticket)
+        RENDER_QUEUE_WAIT_SECONDS.observe(time.monotonic() - start)
+
+    def _check_timeout(self, start: float) -> None:
+        if time.monotonic() - start >= self.timeout:
+            RENDER_REJECTED.labels(reason="timeout").inc()
+            raise RenderRejected(
+                503, self.retry_after, "Timed out waiting for a render slot."
+            )
+
+    @contextmanager
+    def _hold(self, slot: int):
+        RENDERS_IN_PROGRESS.inc()
+        try:
+            yield
+        finally:
+            RENDERS_IN_PROGRESS.dec()
+            os.close(slot)
+
+    @contextmanager
+    def acquire(self):
+        """
+        Hold a render slot, waiting for one if they are all taken.
+        :raises RenderRejected: The queue is full or the wait timed out
+        """
+        slot = self._lock_any("slot", self.slots)
+        if slot is None:
+            ticket = self._enter_queue()
+            start = time.monotonic()
+            try:
+                while slot is None:
+                    self._check_timeout(start)
+                    time.sleep(self.poll_interval)
+                    slot = self._lock_any("slot", self.slots)
+            finally:
+                self._leave_queue(ticket, start)
+        else:
+            RENDER_QUEUE_WAIT_SECONDS.observe(0)
+        with self._hold(slot):
+            yield
+
+    @asynccontextmanager
+    async def acquire_async(self):
+        """Same as `acquire`, without blocking the event loop while waiting."""
+        slot = self._lock_any("slot", self.slots)
+        if slot is None:
+            ticket = self._enter_queue()
+            start = time.monotonic()
+            try:
+                while slot is None:
+                    self._check_timeout(start)
+                    await asyncio.sleep(self.poll_interval)
+                    slot = self._lock_any("slot", self.slots)
+            finally:
+                self._leave_queue(ticket, start)
+        else:
+            RENDER_QUEUE_WAIT_SECONDS.observe(0)
+        with self._hold(slot):
+            yield
+
+
+def get_cpu_count() -> int:
+    """Get the number of CPUs this process can run on, e.g. in a container."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def get_memory_limit() -> int:
+    """Get the memory of the host in bytes, or the limit of its cgroup if it is lower."""
+    memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    try:
+        with open("/sys/fs/cgroup/memory.max") as f:
+            limit = f.read().strip()
+    except OSError:
+        return memory
+    if limit.isdigit():
+        return min(memory, int(limit))
+    return memory
+
+
+def get_default_slots() -> int:
+    """Run a render per CPU, as long as each of them has `OPENSPP_RENDER_SLOT_MEMORY_MB`."""
+    by_memory = get_memory_limit() // (
+        settings.OPENSPP_RENDER_SLOT_MEMORY_MB * MEGABYTE
+    )
+    return max(1, min(get_cpu_count(), by_memory))
+
+
+@lru_cache(maxsize=None)
+def get_render_slots() -> RenderSlots:
+    """Get the render slots of the host, sized with `OPENSPP_RENDER_*`."""
+    slots = settings.OPENSPP_RENDER_SLOTS or get_default_slots()
+    queue_size = settings.OPENSPP_RENDER_QUEUE_SIZE
+    if queue_size is None:
+        queue_size = slots * 4
+    directory = settings.OPENSPP_RENDER_SLOTS_DIR or os.path.join(
+        tempfile.gettempdir(), "card-generator-render-slots"
+    )
+    return RenderSlots(
+        directory,
+        slots,
+        queue_size,
+        timeout=settings.OPENSPP_RENDER_QUEUE_TIMEOUT,
+        retry_after=math.ceil(settings.OPENSPP_RENDER_QUEUE_TIMEOUT),
+    )
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class CardsConfig(AppConfig):
     name = "card_generator.cards"
+
+    def ready(self):
+        import card_generator.cards.cache  # noqa F401
+        import card_generator.utils.metrics  # noqa F401
+        import card_generator.utils.tracing  # noqa F401
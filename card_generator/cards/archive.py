@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+import tempfile
+import zipfile
+from contextlib import AbstractContextManager
+from typing import Iterable, Iterator
+
+from card_generator.cards.models import Card
+from card_generator.cards.pdf import CardRender
+
+log = logging.getLogger(__name__)
+
+
+class ZipStreamBuffer:
+    """
+    Write-only file object for `zipfile`, that keeps the written bytes until they are
+    streamed. The archive is not seekable, so `zipfile` writes the sizes after each file.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class HeldStream:
+    """
+    Stream the chunks of an iterator while holding a context, e.g. a render slot. The context
+    is released once the response is closed, even if the client left before the first chunk.
+    """
+
+    def __init__(self, chunks: Iterator[bytes], context: AbstractContextManager):
+        """
+        :param chunks: Iterator of the streamed bytes
+        :param context: Context already entered, exited when the stream is closed
+        """
+        self.chunks = chunks
+        self.context = context
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self.chunks
+
+    def close(self) -> None:
+        try:
+            close = getattr(self.chunks, "close", None)
+            if close:
+                close()
+        finally:
+            self.context.__exit__(None, None, None)
+
+
+def stream_cards_archive(
+    card: Card,
+    records: Iterable[dict],
+    create_qr_code: bool,
+    front_only: bool = False,
+    formats=("pdf", "png"),
+    name_field: str | None = None,
+) -> Iterator[bytes]:
+    """
+    Render the cards of the records one by one into a ZIP archive, yielding the archive
+    as each card completes. Only one card is held in memory or on disk at a time.
+    Records that fail to render are listed in `errors.json` at the end of the archive.
+    :param card: Card model instance
+    :param records: Dicts of data that will be supplied to the template card
+    :param create_qr_code: Bool to check if qrcode should be generated
+    :param front_only: Render the front of the cards only
+    :param formats: Formats to render for each card, `pdf` and/or `png`
+    :param name_field: Field used to name the files of a card, defaults to the record number.
+        A name already used is suffixed with the record number, e.g. `name-3`
+    :return: Iterator of the bytes of the archive
+    """
+    buffer = ZipStreamBuffer()
+    errors = []
+    names = set()
+    # The PDFs and PNGs are already compressed
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for index, fields in enumerate(records):
+            name = f"{index:08d}"
+            if name_field and fields.get(name_field):
+                name = os.path.basename(str(fields[name_field])) or name
+            # Unzip tools overwrite the duplicate entries of an archive
+            while name in names:
+                name = f"{name}-{index}"
+            names.add(name)
+            card_render = CardRender(
+                card, fields, create_qr_code, front_only=front_only
+            )
+            with tempfile.TemporaryDirectory() as temp_dir:
+                try:
+                    files = card_render.render_files(temp_dir, name, formats)
+                except Exception as e:  # noqa
+                    # Lets report the error and render the other cards
+                    log.warning(f"Card {name} of #{str(card.uuid)} failed. {str(e)}")
+                    errors.append({"record": index, "name": name, "error": str(e)})
+                    continue
+                for file in files:
+                    archive.write(file, arcname=os.path.basename(file))
+            yield buffer.pop()
+
+        if errors:
+            archive.writestr("errors.json", json.dumps(errors, indent=2))
+    yield buffer.pop()
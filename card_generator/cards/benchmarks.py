@@ -0,0 +1,216 @@
+import base64
+import json
+import math
+import os
+import shutil
+import tempfile
+import tracemalloc
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+
+from django.core.files.storage import FileSystemStorage
+
+from card_generator.cards.models import Card
+from card_generator.cards.pdf import CardRender
+from card_generator.cards.qrcode import create_qrcode_content
+from card_generator.cards.utils import convert_svgs
+
+# Templates and photo used when no card is given, shipped with the app for the warm-up of the
+# workers
+SAMPLES_DIR = Path(__file__).resolve().parent / "samples"
+SAMPLE_FIELDS = {
+    "given_name": "Jane",
+    "surname": "Doe",
+    "identification_no": "ID-0123456789",
+    "sex": "F",
+    "date_of_birth": "Jan 1, 1990",
+    "date_of_issue": "Jan 1, 2020",
+    "date_of_expiry": "Jan 30, 2030",
+    "nationality": "Sample",
+    "qrcode_svg_15": "ID-0123456789|Jane Doe|1990-01-01",
+}
+# Metrics compared against the baseline
+COMPARED_METRICS = ("p50", "p95", "peak_memory")
+
+
+def get_sample_card() -> Card:
+    """Get an unsaved card using the sample templates, so no database is needed."""
+    storage = FileSystemStorage(location=SAMPLES_DIR)
+    card = Card(title="Benchmark", front_svg="front_card.svg", back_svg="back_card.svg")
+    card.front_svg.storage = storage
+    card.back_svg.storage = storage
+    return card
+
+
+def get_sample_fields(with_photo: bool) -> dict:
+    fields = dict(SAMPLE_FIELDS)
+    if with_photo:
+        with open(SAMPLES_DIR / "sample_image.jpg", "rb") as f:
+            photo = base64.b64encode(f.read()).decode("utf-8")
+        fields["profile_svg_3"] = f"data:image/jpeg;base64,{photo}"
+    return fields
+
+
+def percentile(samples: list[float], percent: float) -> float:
+    """Get the percentile of the samples with the nearest-rank method."""
+    ordered = sorted(samples)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def measure(func: Callable, iterations: int = 20, warmup: int = 1) -> dict:
+    """
+    Measure the latency percentiles of a function in seconds and its peak memory in bytes.
+    The memory is traced in a separate run, so it does not slow down the timed runs.
+    Memory used by subprocesses, e.g. `rsvg-convert`, is not included.
+    """
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(iterations):
+        start = perf_counter()
+        func()
+        timings.append(perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "mean": sum(timings) / iterations,
+        "p50": percentile(timings, 50),
+        "p95": percentile(timings, 95),
+        "p99": percentile(timings, 99),
+        "max": max(timings),
+        "peak_memory": peak_memory,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Compare the results with a baseline.
+    :param results: Results of `measure` by benchmark name
+    :param baseline: Results of a previous run by benchmark name
+    :param threshold: Allowed increase, e.g. 0.2 for 20%
+    :return: Description of each metric that increased beyond the threshold
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in COMPARED_METRICS:
+            previous = baseline[name].get(metric)
+            if not previous:
+                continue
+            increase = result[metric] / previous - 1
+            if increase > threshold:
+                regressions.append(
+                    f"{name} {metric} increased by {increase:.0%} "
+                    f"({previous:.6g} to {result[metric]:.6g})"
+                )
+    return regressions
+
+
+def get_benchmarks(card: Card, temp_dir: str, with_rsvg: bool = True) -> dict:
+    """
+    Get the benchmarks of the render pipeline by name.
+    :param card: Card to render
+    :param temp_dir: Directory for the rendered files
+    :param with_rsvg: Include the benchmarks that need `rsvg-convert`
+    """
+    benchmarks = {
+        "create_qrcode_content": partial(
+            create_qrcode_content, SAMPLE_FIELDS["qrcode_svg_15"]
+        )
+    }
+
+    for with_photo in (False, True):
+        suffix = "photo" if with_photo else "no_photo"
+        fields = get_sample_fields(with_photo)
+        card_render = CardRender(card, fields, create_qr_code=True)
+        # Keep the QR codes of `apply_data` with the rendered files
+        shutil.rmtree(card_render.temp_dir)
+        card_render.temp_dir = tempfile.mkdtemp(dir=temp_dir)
+
+        benchmarks[f"apply_data[{suffix}]"] = partial(apply_data, card_render, fields)
+        if not with_rsvg:
+            continue
+
+        card_render.create_svg()
+        benchmarks[f"convert_svgs[pdf-{suffix}]"] = partial(
+            convert_svgs,
+            card_render.svg_files,
+            os.path.join(temp_dir, f"{suffix}.pdf"),
+            "pdf",
+        )
+        # PNGs are rendered per side
+        benchmarks[f"convert_svgs[png-{suffix}]"] = partial(
+            convert_svgs,
+            card_render.svg_files[:1],
+            os.path.join(temp_dir, f"{suffix}.png"),
+            "png",
+        )
+        benchmarks[f"render[{suffix}]"] = partial(render, card, fields)
+    return benchmarks
+
+
+def apply_data(card_render: CardRender, fields: dict) -> None:
+    card_render.apply_data(card_render.front_svg_path, fields)
+    card_render.apply_data(card_render.back_svg_path, fields)
+
+
+def render(card: Card, fields: dict) -> None:
+    CardRender(card, fields, create_qr_code=True).render()
+
+
+def load_test(
+    url: str, payload: dict, token: str, requests: int, concurrency: int
+) -> dict:
+    """
+    Send renders to a running server, `concurrency` of them at a time.
+    :param url: URL of the render endpoint
+    :param payload: Body of the render requests
+    :param token: Authentication token of the requests
+    :param requests: Number of requests to send
+    :param concurrency: Number of requests in flight
+    :return: The throughput of successful renders per second, their latency percentiles in
+        seconds and the number of responses of each status code
+    """
+    body = json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json", "Authorization": f"Token {token}"}
+
+    def send(_) -> tuple[float, int]:
+        request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+        start = perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:  # nosec
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        return perf_counter() - start, status
+
+    start = perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(send, range(requests)))
+    wall_time = perf_counter() - start
+
+    latencies = [latency for latency, status in results if status == 200] or [0.0]
+    return {
+        "throughput": sum(1 for _, status in results if status == 200) / wall_time,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "statuses": dict(Counter(str(status) for _, status in results)),
+    }
@@ -0,0 +1,57 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from card_generator.cards.models import Card
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "card-response"
+LIST_KEY = f"{KEY_PREFIX}:list"
+# Views of a card with a cached response
+CARD_VIEWS = ("retrieve", "fields")
+
+
+def get_card_key(card_uuid, view: str) -> str:
+    return f"{KEY_PREFIX}:{card_uuid}:{view}"
+
+
+def get_etag(*parts) -> str:
+    """Get a strong ETag from the parts identifying a representation."""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8"))
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def get_response(key: str) -> dict | None:
+    """
+    Get a cached response.
+    :return: The `data` of the response, with its `etag` and `last_modified` timestamp
+    """
+    return cache.get(key)
+
+
+def set_response(key: str, data, etag: str, last_modified: float) -> dict:
+    response = {"data": data, "etag": etag, "last_modified": last_modified}
+    cache.set(key, response, settings.OPENSPP_CARD_CACHE_TIMEOUT)
+    return response
+
+
+def invalidate_responses(card_uuid) -> None:
+    """Remove the cached responses of a card and of the list of cards."""
+    cache.delete_many(
+        [LIST_KEY, *(get_card_key(card_uuid, view) for view in CARD_VIEWS)]
+    )
+    logger.debug(f"Cached responses of card #{card_uuid} invalidated.")
+
+
+@receiver(post_save, sender=Card)
+@receiver(post_delete, sender=Card)
+def invalidate_card_responses(sender, instance: Card, **kwargs):
+    # Invalidated once committed, a concurrent request would cache the previous card otherwise
+    card_uuid = instance.uuid
+    transaction.on_commit(lambda: invalidate_responses(card_uuid))
@@ -4,6 +4,10 @@ import xmlrpc.client
 from typing import Any, Literal, Optional
 
 from django.conf import settings
+from opentelemetry.trace import SpanKind
+
+from card_generator.utils.metrics import OPENSPP_BYTES, OPENSPP_QUERY_SECONDS
+from card_generator.utils.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +16,74 @@ class OpenSPPAPIException(Exception):
     pass
 
 
+class TransferStats:
+    """Round trips and payload bytes on the wire of a client."""
+
+    def __init__(self):
+        self.round_trips = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "round_trips": self.round_trips,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+
+class CountingResponse:
+    """Wrap a HTTP response to count the bytes read from it."""
+
+    def __init__(self, response, stats: TransferStats):
+        self.response = response
+        self.stats = stats
+
+    def read(self, *args):
+        data = self.response.read(*args)
+        self.stats.bytes_received += len(data)
+        OPENSPP_BYTES.labels(direction="received").inc(len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+class CountingTransportMixin:
+    """
+    Count the round trips and payload bytes of the XML-RPC calls.
+    Requests larger than `encode_threshold` bytes are gzip encoded, if the server supports it.
+    """
+
+    def __init__(self, stats: TransferStats, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats
+        self.encode_threshold = settings.OPENSPP_XMLRPC_GZIP_THRESHOLD
+
+    def send_content(self, connection, request_body):
+        if self.encode_threshold is not None and self.encode_threshold < len(
+            request_body
+        ):
+            connection.putheader("Content-Encoding", "gzip")
+            request_body = xmlrpc.client.gzip_encode(request_body)
+        connection.putheader("Content-Length", str(len(request_body)))
+        connection.endheaders(request_body)
+        self.stats.round_trips += 1
+        self.stats.bytes_sent += len(request_body)
+        OPENSPP_BYTES.labels(direction="sent").inc(len(request_body))
+
+    def parse_response(self, response):
+        return super().parse_response(CountingResponse(response, self.stats))
+
+
+class CountingTransport(CountingTransportMixin, xmlrpc.client.Transport):
+    pass
+
+
+class CountingSafeTransport(CountingTransportMixin, xmlrpc.client.SafeTransport):
+    pass
+
+
 class OpenSPPClient:
     COMMON_ENDPOINT = "/xmlrpc/2/common"
     MODEL_ENDPOINT = "/xmlrpc/2/object"
@@ -30,15 +102,20 @@ class OpenSPPClient:
         self.username = username
         self.password = password
         self.db_name = db_name
+        self.transfer_stats = TransferStats()
+        self._fields_cache: dict[tuple, dict] = {}
         self.uid = self.login(username, password)
 
-    @staticmethod
-    def get_server_proxy(url):
-        context = None
-        if settings.OPENSPP_CUSTOM_TLS:
-            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-            context.load_verify_locations(settings.OPENSPP_CUSTOM_CERT_PATH)
-        return xmlrpc.client.ServerProxy(url, context=context)
+    def get_server_proxy(self, url):
+        if url.startswith("https"):
+            context = None
+            if settings.OPENSPP_CUSTOM_TLS:
+                context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+                context.load_verify_locations(settings.OPENSPP_CUSTOM_CERT_PATH)
+            transport = CountingSafeTransport(self.transfer_stats, context=context)
+        else:
+            transport = CountingTransport(self.transfer_stats)
+        return xmlrpc.client.ServerProxy(url, transport=transport)
 
     def login(self, username, password, kwargs: Optional[dict] = None):
         if not kwargs:
@@ -87,16 +164,19 @@ class OpenSPPClient:
         return response
 
     def _get_fields(self, model_name, attributes: list | None = None):
-        # TODO: It would be better if we can cache the results here for the same model
         if not attributes:
             attributes = []
 
-        return self._run_query(
-            model_name=model_name,
-            method_name="fields_get",
-            query_params=[[]],
-            result_params={"attributes": attributes},
-        )
+        # The fields of a model do not change during the lifetime of a client
+        cache_key = (model_name, tuple(attributes))
+        if cache_key not in self._fields_cache:
+            self._fields_cache[cache_key] = self._run_query(
+                model_name=model_name,
+                method_name="fields_get",
+                query_params=[[]],
+                result_params={"attributes": attributes},
+            )
+        return self._fields_cache[cache_key]
 
     def _sanitize_data(self, model_name: str, data: list, to_openspp: bool = False):
         """
@@ -272,7 +352,6 @@ class OpenSPPClient:
                 model_name=model_name,
                 method_name="write",
                 query_params=[item_ids, cleaned_data[0]],
-                result_params=result_params,
             )
         except xmlrpc.client.Fault as e:
             server_message = e.faultString
@@ -281,6 +360,8 @@ class OpenSPPClient:
             )
         if not result:
             raise OpenSPPAPIException("Updating data failed.")
+        if result_params and result_params.get("fields") == []:
+            return result
         return self._read(model_name, item_ids, result_params)
 
     def _run_query(
@@ -295,15 +376,24 @@ class OpenSPPClient:
             result_params = {}
         if query_params is None or query_params == []:
             query_params = [[]]
-        return server.execute_kw(
-            self.db_name,
-            self.uid,
-            self.password,
-            model_name,
-            method_name,
-            query_params,
-            result_params,
-        )
+        with tracer.start_as_current_span(
+            f"{model_name}.{method_name}",
+            kind=SpanKind.CLIENT,
+            attributes={
+                "rpc.system": "xmlrpc",
+                "rpc.service": model_name,
+                "rpc.method": method_name,
+            },
+        ), OPENSPP_QUERY_SECONDS.labels(model=model_name, method=method_name).time():
+            return server.execute_kw(
+                self.db_name,
+                self.uid,
+                self.password,
+                model_name,
+                method_name,
+                query_params,
+                result_params,
+            )
 
 
 class QueueCardsClient(OpenSPPClient):
@@ -318,8 +408,10 @@ class QueueCardsClient(OpenSPPClient):
             return
         return records[0]
 
-    def get_id_queue_pdfs(self, batch_record: dict):
-        id_queue_ids = batch_record.get("queued_ids", [])
+    def get_id_queue_pdfs(self, batch_record: dict, queue_ids: list[int] | None = None):
+        id_queue_ids = queue_ids
+        if id_queue_ids is None:
+            id_queue_ids = batch_record.get("queued_ids", [])
         if not id_queue_ids:
             logger.info(f"Batch ID {batch_record.get('id')} don't have queue IDs.")
             return []
@@ -331,11 +423,23 @@ class QueueCardsClient(OpenSPPClient):
             result_params={"fields": ["id_pdf"]},
         )
 
-    def update_queue_batch_record(self, batch_id: int, data: dict):
+    def update_queue_batch_record(
+        self, batch_id: int, data: dict, fields: list[str] | None = None
+    ):
+        """
+        :param batch_id: ID of Batch record
+        :param data: Values to write on the Batch record
+        :param fields: Fields of the updated record to read back. Use an empty list to skip
+            reading the record, e.g. to avoid downloading a PDF that was just uploaded.
+        """
+        result_params = None
+        if fields is not None:
+            result_params = {"fields": fields}
         return self.call_api(
             method_name="update",
             model_name=settings.OPENSPP_QUEUE_BATCH_MODEL,
             query_params=[[["id", "=", batch_id]]],
             item_ids=[batch_id],
             data=data,
+            result_params=result_params,
         )
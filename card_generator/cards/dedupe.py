@@ -0,0 +1,88 @@
+import hashlib
+import logging
+
+from PyPDF2 import PageObject
+from PyPDF2.generic import (
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    StreamObject,
+)
+
+logger = logging.getLogger(__name__)
+
+# Resources of a page that are usually shared by all cards of a template
+SHARED_RESOURCES = ("/Font", "/XObject", "/ExtGState")
+# Keys that do not change the content of an object
+IGNORED_KEYS = ("/Length", "/Parent")
+
+
+class SharedResources:
+    """
+    Detect identical fonts and XObjects across PDFs by content hash, so they are stored
+    once in the merged PDF.
+
+    Each font or XObject of a page is replaced by the first identical object found in the
+    previous pages. The writer then resolves all of them to a single object.
+    """
+
+    def __init__(self):
+        self.objects: dict[str, IndirectObject] = {}
+        self.digests: dict[tuple, str] = {}
+        self.deduplicated = 0
+
+    def dedupe_page(self, page: PageObject) -> None:
+        resources = page.get("/Resources")
+        if resources is None:
+            return
+        resources = resources.get_object()
+        for resource_type in SHARED_RESOURCES:
+            if resource_type not in resources:
+                continue
+            items = resources[resource_type].get_object()
+            for name, value in list(items.items()):
+                if not isinstance(value, IndirectObject):
+                    continue
+                digest = self.get_digest(value)
+                shared_object = self.objects.setdefault(digest, value)
+                if shared_object is not value:
+                    items[NameObject(name)] = shared_object
+                    self.deduplicated += 1
+
+    def get_digest(self, obj, visiting: set | None = None) -> str:
+        """Get a hash of the content of the object and the objects it refers to."""
+        if visiting is None:
+            visiting = set()
+
+        if isinstance(obj, IndirectObject):
+            key = (id(obj.pdf), obj.idnum, obj.generation)
+            if key in self.digests:
+                return self.digests[key]
+            if key in visiting:
+                # Circular reference, make it unique so it is never deduplicated
+                return f"cycle:{key}"
+            visiting.add(key)
+            digest = self.get_digest(obj.get_object(), visiting)
+            visiting.discard(key)
+            self.digests[key] = digest
+            return digest
+
+        content = hashlib.sha256(obj.__class__.__name__.encode("utf-8"))
+        if isinstance(obj, DictionaryObject):
+            for key in sorted(obj.keys()):
+                if key in IGNORED_KEYS:
+                    continue
+                content.update(key.encode("utf-8"))
+                content.update(self.get_digest(obj[key], visiting).encode("utf-8"))
+            if isinstance(obj, StreamObject):
+                data = obj._data
+                if isinstance(data, str):
+                    data = data.encode("latin-1")
+                content.update(data)
+        elif isinstance(obj, ArrayObject):
+            for item in obj:
+                content.update(self.get_digest(item, visiting).encode("utf-8"))
+        else:
+            content.update(repr(obj).encode("utf-8"))
+        return content.hexdigest()
@@ -5,3 +5,21 @@ class QRCodeCharLimitException(Exception):
     """
 
     pass
+
+
+class SVGOptimizationException(Exception):
+    """Raise this exception when a SVG template cannot be optimized, e.g. it is not valid XML."""
+
+    pass
+
+
+class ImpositionException(ValueError):
+    """Raise this exception when the pages of a PDF cannot be imposed with a layout."""
+
+    pass
+
+
+class ImmutableTemplateVersionException(Exception):
+    """Raise this exception when a saved version of the templates of a card is changed."""
+
+    pass
@@ -0,0 +1,230 @@
+import base64
+import multiprocessing
+import random
+import threading
+from socketserver import ThreadingMixIn
+from time import sleep
+from xmlrpc.server import (
+    MultiPathXMLRPCServer,
+    SimpleXMLRPCDispatcher,
+    SimpleXMLRPCRequestHandler,
+)
+
+from django.conf import settings
+
+from card_generator.cards.client import OpenSPPClient
+
+CARD_WIDTH = 242.65
+CARD_HEIGHT = 153.01
+
+BATCH_FIELDS = {
+    "id": {"type": "integer"},
+    "name": {"type": "char"},
+    "queued_ids": {"type": "one2many", "relation": settings.OPENSPP_ID_QUEUE_MODEL},
+    "id_pdf": {"type": "binary"},
+    "id_pdf_filename": {"type": "char"},
+    "merge_status": {"type": "selection"},
+    "date_merged": {"type": "date"},
+}
+ID_QUEUE_FIELDS = {
+    "id": {"type": "integer"},
+    "name": {"type": "char"},
+    "id_pdf": {"type": "binary"},
+}
+
+
+def build_card_pdf(seed: int, image_size: int) -> bytes:
+    """
+    Build a one page PDF with an image of `image_size` random bytes, so each card has
+    its own content like the photos of real cards.
+    """
+    image = random.Random(seed).randbytes(image_size)  # nosec
+    content = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (CARD_WIDTH, CARD_HEIGHT)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] "
+        b"/Resources << /XObject << /Im0 4 0 R >> >> /Contents 5 0 R >>"
+        % (CARD_WIDTH, CARD_HEIGHT),
+        b"<< /Type /XObject /Subtype /Image /Width %d /Height 1 /ColorSpace /DeviceGray "
+        b"/BitsPerComponent 8 /Length %d >>\nstream\n%s\nendstream"
+        % (image_size, image_size, image),
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+    xref_offset = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        pdf += b"%010d 00000 n \n" % offset
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref_offset,
+    )
+    return bytes(pdf)
+
+
+class FakeOpenSPP:
+    """
+    In-memory stand-in of the OpenSPP models used to merge cards. Each batch has `cards`
+    queue IDs, numbered from 1, and every call waits `latency` seconds.
+    """
+
+    def __init__(
+        self,
+        batches: dict[int, int],
+        latency: float = 0,
+        pdf_size: int | None = None,
+        sample_pdf: bytes | None = None,
+    ):
+        """
+        :param batches: Number of cards by batch ID
+        :param latency: Seconds to wait before answering each call
+        :param pdf_size: Size of the image of the generated card PDFs in bytes
+        :param sample_pdf: PDF returned for all cards instead of generated ones
+        """
+        self.latency = latency
+        self.pdf_size = pdf_size or 20_000
+        self.sample_pdf = None
+        if sample_pdf:
+            self.sample_pdf = base64.b64encode(sample_pdf).decode("utf-8")
+        self.batches = {}
+        next_queue_id = 1
+        for batch_id, cards in batches.items():
+            queued_ids = list(range(next_queue_id, next_queue_id + cards))
+            next_queue_id += cards
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "name": f"Batch {batch_id}",
+                "queued_ids": queued_ids,
+                "id_pdf": False,
+                "id_pdf_filename": False,
+                "merge_status": "pending",
+                "date_merged": False,
+            }
+        self.id_queue_count = next_queue_id - 1
+
+    def get_id_queue(self, queue_id: int) -> dict:
+        id_pdf = self.sample_pdf
+        if id_pdf is None:
+            id_pdf = base64.b64encode(build_card_pdf(queue_id, self.pdf_size)).decode(
+                "utf-8"
+            )
+        return {"id": queue_id, "name": f"ID {queue_id}", "id_pdf": id_pdf}
+
+    def authenticate(self, db_name, username, password, kwargs):
+        sleep(self.latency)
+        return 1
+
+    def execute_kw(self, db_name, uid, password, model, method, args, kwargs):
+        sleep(self.latency)
+        if model == settings.OPENSPP_QUEUE_BATCH_MODEL:
+            fields, ids, get_record = BATCH_FIELDS, self.batches, self.batches.get
+        elif model == settings.OPENSPP_ID_QUEUE_MODEL:
+            fields = ID_QUEUE_FIELDS
+            ids = range(1, self.id_queue_count + 1)
+            get_record = self.get_id_queue
+        else:
+            raise ValueError(f"Model `{model}` is not supported.")
+
+        if method == "fields_get":
+            attributes = kwargs.get("attributes") or ["type", "relation"]
+            return {
+                name: {key: value for key, value in field.items() if key in attributes}
+                for name, field in fields.items()
+            }
+        if method == "search_count":
+            return len(self.search(ids, args[0]))
+        if method == "search_read":
+            offset = kwargs.get("offset", 0)
+            limit = kwargs.get("limit") or None
+            found_ids = self.search(ids, args[0])[offset:][:limit]
+            return [self.read(get_record(i), kwargs.get("fields")) for i in found_ids]
+        if method == "read":
+            return [self.read(get_record(i), kwargs.get("fields")) for i in args[0]]
+        if method == "write":
+            for batch_id in args[0]:
+                self.batches[batch_id].update(args[1])
+            return True
+        raise ValueError(f"Method `{method}` is not supported.")
+
+    def search(self, ids, domain: list) -> list[int]:
+        """Search the IDs matching a domain, only `id` filters are supported."""
+        found_ids = None
+        for field, operator, value in domain:
+            if field != "id" or operator not in ("=", "in"):
+                raise ValueError(f"Domain `{field} {operator}` is not supported.")
+            values = set(value) if operator == "in" else {value}
+            found_ids = values if found_ids is None else found_ids & values
+        if found_ids is None:
+            return list(ids)
+        return sorted(i for i in found_ids if i in ids)
+
+    def read(self, record: dict, fields: list | None) -> dict:
+        if not fields:
+            return dict(record)
+        return {"id": record["id"], **{field: record[field] for field in fields}}
+
+
+class ThreadingXMLRPCServer(ThreadingMixIn, MultiPathXMLRPCServer):
+    daemon_threads = True
+
+
+class RequestHandler(SimpleXMLRPCRequestHandler):
+    rpc_paths = (OpenSPPClient.COMMON_ENDPOINT, OpenSPPClient.MODEL_ENDPOINT)
+
+
+class FakeOpenSPPServer:
+    """Serve a `FakeOpenSPP` on the XML-RPC endpoints of OpenSPP."""
+
+    def __init__(
+        self, fake_openspp: FakeOpenSPP, host: str = "127.0.0.1", port: int = 0
+    ):
+        self.server = ThreadingXMLRPCServer(
+            (host, port),
+            requestHandler=RequestHandler,
+            allow_none=True,
+            logRequests=False,
+        )
+        for path, method in (
+            (OpenSPPClient.COMMON_ENDPOINT, fake_openspp.authenticate),
+            (OpenSPPClient.MODEL_ENDPOINT, fake_openspp.execute_kw),
+        ):
+            dispatcher = SimpleXMLRPCDispatcher(allow_none=True)
+            dispatcher.register_function(method)
+            self.server.add_dispatcher(path, dispatcher)
+        self.process = None
+        self.thread = None
+
+    @property
+    def server_root(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, in_process: bool = False) -> None:
+        """
+        :param in_process: Serve from a thread of this process instead of a separate process.
+            A separate process does not compete with the client for the GIL.
+        """
+        if in_process:
+            self.thread = threading.Thread(
+                target=self.server.serve_forever, daemon=True
+            )
+            self.thread.start()
+            return
+        self.process = multiprocessing.get_context("fork").Process(
+            target=self.server.serve_forever, daemon=True
+        )
+        self.process.start()
+
+    def stop(self) -> None:
+        if self.process:
+            self.process.terminate()
+            self.process.join()
+        if self.thread:
+            self.server.shutdown()
+            self.thread.join()
+        self.server.server_close()
@@ -0,0 +1,212 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import subprocess  # nosec
+import tempfile
+from functools import lru_cache
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# `font-family` attributes and CSS properties: the property, the quote of the first family of
+# the list and the first family are captured
+FONT_FAMILY = re.compile(
+    r"""(font-family\s*(?:=\s*["']|:)\s*)(&quot;|["'])?([^,;}"'&]+?)(?=\s*(?:&quot;|["',;}]))"""
+)
+JINJA = re.compile(r"{{.*?}}|{%.*?%}|{#.*?#}", re.DOTALL)
+TEXT = re.compile(r">([^<]+)<")
+
+FONTS_CONFIG = """<?xml version="1.0"?>
+<!DOCTYPE fontconfig SYSTEM "fonts.dtd">
+<fontconfig>
+  <dir>{directory}</dir>
+  <cachedir>{directory}/cache</cachedir>
+  <include ignore_missing="yes">{system_config}</include>
+</fontconfig>
+"""
+
+
+def get_font_families(content: str) -> set:
+    return {match.group(3).strip() for match in FONT_FAMILY.finditer(content)}
+
+
+def get_template_text(content: str) -> set:
+    """Get the characters of the static text of a template, without its Jinja expressions."""
+    characters = set()
+    for text in TEXT.findall(JINJA.sub("", content)):
+        characters.update(text)
+    return {character for character in characters if not character.isspace()}
+
+
+@lru_cache(maxsize=None)
+def resolve_font(family: str) -> tuple[str, int] | None:
+    """
+    Find the font file of a family with fontconfig, like rsvg-convert does.
+    :return: The font file and the index of the font in the file
+    """
+    try:
+        result = subprocess.run(  # nosec
+            ["fc-match", "--format=%{file}|%{index}", family],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"Font `{family}` could not be resolved. {str(e)}")
+        return None
+    font_file, _, index = result.stdout.partition("|")
+    return font_file, int(index or 0)
+
+
+def subset_font(font_file: str, index: int, characters: set, family: str) -> bytes:
+    """
+    Keep the glyphs of the characters only and rename the font, so it cannot be mistaken
+    for the complete font.
+    """
+    from fontTools import subset
+
+    options = subset.Options()
+    options.font_number = index
+    options.name_IDs = ["*"]
+    options.notdef_outline = True
+    font = subset.load_font(font_file, options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(text="".join(sorted(characters)))
+    subsetter.subset(font)
+
+    names = font["name"]
+    for record in names.names:
+        if record.nameID in (1, 4, 16):
+            names.setName(
+                family,
+                record.nameID,
+                record.platformID,
+                record.platEncID,
+                record.langID,
+            )
+        elif record.nameID == 6:
+            names.setName(
+                family.replace(" ", "-"),
+                6,
+                record.platformID,
+                record.platEncID,
+                record.langID,
+            )
+    output = io.BytesIO()
+    font.save(output)
+    return output.getvalue()
+
+
+def write_file(path: str, content: bytes) -> None:
+    """Write the file atomically, so other processes never read a partial font."""
+    if os.path.exists(path):
+        return
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as f:
+        f.write(content)
+    os.replace(f.name, path)
+
+
+@lru_cache(maxsize=256)
+def _get_fonts(svg_paths: tuple, versions: tuple) -> dict | None:
+    """
+    Subset the fonts of the templates and write copies of the templates using the subsets.
+    `versions` of the files only invalidate the cache.
+    """
+    contents = []
+    for svg_path in svg_paths:
+        with open(svg_path) as svg_file:
+            contents.append(svg_file.read())
+    characters = set(settings.OPENSPP_FONT_CHARSET)
+    families = set()
+    for content in contents:
+        characters.update(get_template_text(content))
+        families.update(get_font_families(content))
+
+    fonts = {}
+    for family in sorted(families):
+        resolved = resolve_font(family)
+        if not resolved:
+            continue
+        font_file, index = resolved
+        digest = hashlib.sha256(
+            f"{font_file}|{index}|{os.stat(font_file).st_mtime_ns}|{sorted(characters)}".encode()
+        ).hexdigest()
+        fonts[family] = (font_file, index, f"card-{digest[:16]}")
+    if not fonts:
+        return None
+
+    directory = os.path.join(
+        settings.OPENSPP_FONTS_DIR
+        or os.path.join(tempfile.gettempdir(), "card-generator-fonts"),
+        hashlib.sha256(str(sorted(fonts.values())).encode()).hexdigest()[:16],
+    )
+    os.makedirs(directory, exist_ok=True)
+    for family, (font_file, index, subset_family) in fonts.items():
+        subset_file = os.path.join(directory, f"{subset_family}.ttf")
+        if os.path.exists(subset_file):
+            continue
+        content = subset_font(font_file, index, characters, subset_family)
+        write_file(subset_file, content)
+        logger.info(
+            f"Font `{family}` subset from {os.path.getsize(font_file) / 1024:.1f} KiB "
+            f"to {len(content) / 1024:.1f} KiB."
+        )
+    config = os.path.join(directory, "fonts.conf")
+    write_file(
+        config,
+        FONTS_CONFIG.format(
+            directory=directory,
+            system_config=os.environ.get("FONTCONFIG_FILE", "/etc/fonts/fonts.conf"),
+        ).encode("utf-8"),
+    )
+    families = {family: subset_family for family, (*_, subset_family) in fonts.items()}
+    templates = {}
+    for svg_path, content in zip(svg_paths, contents):
+        content = replace_font_families(content, families).encode("utf-8")
+        template = os.path.join(
+            directory, f"{hashlib.sha256(content).hexdigest()[:16]}.svg"
+        )
+        write_file(template, content)
+        templates[svg_path] = template
+    return {"config": config, "families": families, "templates": templates}
+
+
+def get_card_fonts(card) -> dict | None:
+    """
+    Get the fonts of the templates of a card, subset to the static text of the templates and
+    `OPENSPP_FONT_CHARSET`. The subsets are made once per version of the templates and shared
+    by the processes of the host in `OPENSPP_FONTS_DIR`.
+    :return: The fontconfig file exposing the subsets to rsvg-convert, the family of the
+        subset of each font and the copy of each template using the subsets, or None when
+        the fonts are not subset
+    """
+    from card_generator.cards.models import SIDES
+
+    if not settings.OPENSPP_FONT_SUBSETTING:
+        return None
+    svg_paths = tuple(card.get_render_path(side) for side in SIDES)
+    versions = tuple(os.stat(svg_path).st_mtime_ns for svg_path in svg_paths)
+    try:
+        return _get_fonts(svg_paths, versions)
+    except Exception:
+        logger.exception(f"Fonts of card #{card.uuid} could not be subset.")
+        return None
+
+
+def replace_font_families(content: str, families: dict) -> str:
+    """
+    Use the subset of each font in a template, before the font itself: the characters missing
+    from the subset, e.g. of a script the template does not contain, use the complete font.
+    """
+
+    def replace(match) -> str:
+        prefix, quote, family = match.groups()
+        subset_family = families.get(family.strip())
+        if not subset_family:
+            return match.group(0)
+        return f"{prefix}{subset_family}, {quote or ''}{family}"
+
+    return FONT_FAMILY.sub(replace, content)
@@ -0,0 +1,241 @@
+import logging
+from typing import TYPE_CHECKING
+
+from card_generator.cards.exceptions import ImpositionException
+
+# PyPDF2 is only imported to impose a PDF, the layout is validated without it
+if TYPE_CHECKING:
+    from PyPDF2 import PageObject, PdfWriter
+    from PyPDF2.generic import IndirectObject
+
+logger = logging.getLogger(__name__)
+
+MM_TO_PT = 72 / 25.4
+
+# Sheet sizes in points
+SHEET_SIZES = {
+    "a4": (595.28, 841.89),
+    "letter": (612.0, 792.0),
+}
+
+# ID-1 / CR80 card size in millimeters
+CR80_WIDTH = 85.6
+CR80_HEIGHT = 53.98
+
+
+class ImpositionLayout:
+    """Layout of the cards on a print sheet. Sizes are in millimeters."""
+
+    def __init__(
+        self,
+        sheet: str = "a4",
+        columns: int = 2,
+        rows: int = 5,
+        gap: float = 3,
+        card_width: float = CR80_WIDTH,
+        card_height: float = CR80_HEIGHT,
+        crop_marks: bool = True,
+        duplex: bool = False,
+    ):
+        """
+        :param sheet: Size of the sheet, one of `SHEET_SIZES`
+        :param columns: Number of cards per row
+        :param rows: Number of cards per column
+        :param gap: Space between the cards
+        :param card_width: Width of a card, defaults to CR80
+        :param card_height: Height of a card, defaults to CR80
+        :param crop_marks: Draw crop marks in the margins of the sheet
+        :param duplex: The pages alternate front and back of the cards. The backs are placed on
+            their own sheet, mirrored so they line up with the fronts when printed on both sides.
+        """
+        if sheet not in SHEET_SIZES:
+            raise ValueError(f"Sheet `{sheet}` is not supported.")
+        if columns < 1 or rows < 1:
+            raise ValueError("A sheet should have at least one column and one row.")
+
+        self.sheet_width, self.sheet_height = SHEET_SIZES[sheet]
+        self.columns = columns
+        self.rows = rows
+        self.gap = gap * MM_TO_PT
+        self.card_width = card_width * MM_TO_PT
+        self.card_height = card_height * MM_TO_PT
+        self.crop_marks = crop_marks
+        self.duplex = duplex
+
+        grid_width = columns * self.card_width + (columns - 1) * self.gap
+        grid_height = rows * self.card_height + (rows - 1) * self.gap
+        if grid_width > self.sheet_width or grid_height > self.sheet_height:
+            raise ValueError(f"{columns}x{rows} cards do not fit on a `{sheet}` sheet.")
+        # Center the grid so the backs line up with the fronts
+        self.margin_x = (self.sheet_width - grid_width) / 2
+        self.margin_y = (self.sheet_height - grid_height) / 2
+
+    @property
+    def cards_per_sheet(self) -> int:
+        return self.columns * self.rows
+
+    def get_cell(self, index: int, mirrored: bool = False) -> tuple[float, float]:
+        """Get the lower left corner of the card at the index, starting from the top left."""
+        row, column = divmod(index, self.columns)
+        if mirrored:
+            column = self.columns - 1 - column
+        x = self.margin_x + column * (self.card_width + self.gap)
+        y = (
+            self.sheet_height
+            - self.margin_y
+            - self.card_height
+            - row * (self.card_height + self.gap)
+        )
+        return x, y
+
+    def get_crop_marks(self) -> list[tuple[float, float, float, float]]:
+        """Get the crop marks as lines drawn in the margins, outside of the cards."""
+        length = min(5 * MM_TO_PT, self.margin_x, self.margin_y)
+        offset = length / 3
+        top = self.sheet_height - self.margin_y
+        bottom = self.margin_y
+        left = self.margin_x
+        right = self.sheet_width - self.margin_x
+
+        lines = []
+        for column in range(self.columns):
+            x, _ = self.get_cell(column)
+            for edge in (x, x + self.card_width):
+                lines.append((edge, top + offset, edge, top + length))
+                lines.append((edge, bottom - offset, edge, bottom - length))
+        for row in range(self.rows):
+            _, y = self.get_cell(row * self.columns)
+            for edge in (y, y + self.card_height):
+                lines.append((left - offset, edge, left - length, edge))
+                lines.append((right + offset, edge, right + length, edge))
+        return lines
+
+
+def get_page_content(page: "PageObject") -> bytes:
+    from PyPDF2.generic import ArrayObject
+
+    contents = page.get_contents()
+    if contents is None:
+        return b""
+    if isinstance(contents, ArrayObject):
+        return b"\n".join(item.get_object().get_data() for item in contents)
+    return contents.get_data()
+
+
+def page_to_xobject(writer: "PdfWriter", page: "PageObject") -> "IndirectObject":
+    """Convert a page into a form XObject, so it can be placed on a sheet as is."""
+    from PyPDF2.generic import (
+        ArrayObject,
+        DecodedStreamObject,
+        DictionaryObject,
+        FloatObject,
+        NameObject,
+    )
+
+    xobject = DecodedStreamObject()
+    xobject.set_data(get_page_content(page))
+    xobject.update(
+        {
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Form"),
+            NameObject("/BBox"): ArrayObject(
+                FloatObject(value) for value in page.mediabox
+            ),
+            NameObject("/Resources"): page.get("/Resources", DictionaryObject()),
+        }
+    )
+    return writer._add_object(xobject)
+
+
+def place_card(
+    writer: "PdfWriter",
+    page: "PageObject",
+    x: float,
+    y: float,
+    layout: ImpositionLayout,
+) -> tuple["IndirectObject", str]:
+    """
+    Place a card page in the cell at x and y, scaled to fit the card size.
+    :return: The form XObject of the card and the operators drawing it
+    """
+    xobject = page_to_xobject(writer, page)
+    left, bottom, right, top = (float(value) for value in page.mediabox)
+    scale = min(layout.card_width / (right - left), layout.card_height / (top - bottom))
+    # Center the card in the cell if its aspect ratio is different
+    x += (layout.card_width - (right - left) * scale) / 2
+    y += (layout.card_height - (top - bottom) * scale) / 2
+    translate_x = x - left * scale
+    translate_y = y - bottom * scale
+    operators = f"q {scale:.6f} 0 0 {scale:.6f} {translate_x:.4f} {translate_y:.4f} cm"
+    return xobject, operators
+
+
+def add_sheet(
+    writer: "PdfWriter",
+    pages: list["PageObject"],
+    layout: ImpositionLayout,
+    mirrored: bool = False,
+) -> None:
+    from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+    sheet = writer.add_blank_page(layout.sheet_width, layout.sheet_height)
+    xobjects = DictionaryObject()
+    operators = []
+    for index, page in enumerate(pages):
+        x, y = layout.get_cell(index, mirrored=mirrored)
+        xobject, placement = place_card(writer, page, x, y, layout)
+        name = f"/Card{index}"
+        xobjects[NameObject(name)] = xobject
+        operators.append(f"{placement} {name} Do Q")
+
+    if layout.crop_marks:
+        operators.append("q 0 G 0.25 w")
+        for x1, y1, x2, y2 in layout.get_crop_marks():
+            operators.append(f"{x1:.4f} {y1:.4f} m {x2:.4f} {y2:.4f} l S")
+        operators.append("Q")
+
+    content = DecodedStreamObject()
+    content.set_data("\n".join(operators).encode("utf-8"))
+    sheet[NameObject("/Contents")] = writer._add_object(content)
+    sheet[NameObject("/Resources")] = DictionaryObject(
+        {NameObject("/XObject"): xobjects}
+    )
+
+
+def impose_pdf(input_file: str, output_file: str, layout: ImpositionLayout) -> str:
+    """
+    Tile the card pages of a PDF onto print sheets. The pages are placed as form XObjects,
+    so the card content is never rasterized.
+    :param input_file: PDF with one card side per page
+    :param output_file: File name of the imposed PDF
+    :param layout: Layout of the cards on the sheets
+    :return: The file name of the imposed PDF
+    :raises ImpositionException: The pages of a duplex layout are not pairs of front and back
+    """
+    from PyPDF2 import PdfReader, PdfWriter
+
+    pages = list(PdfReader(input_file).pages)
+    if layout.duplex and len(pages) % 2:
+        raise ImpositionException(
+            f"Duplex imposition needs a front and a back page per card, the PDF has {len(pages)} pages."
+        )
+    writer = PdfWriter()
+    per_sheet = layout.cards_per_sheet
+    if layout.duplex:
+        fronts, backs = pages[0::2], pages[1::2]
+        for start in range(0, len(fronts), per_sheet):
+            end = start + per_sheet
+            add_sheet(writer, fronts[start:end], layout)
+            if backs[start:end]:
+                add_sheet(writer, backs[start:end], layout, mirrored=True)
+    else:
+        for start in range(0, len(pages), per_sheet):
+            end = start + per_sheet
+            add_sheet(writer, pages[start:end], layout)
+
+    with open(output_file, "wb") as f:
+        writer.write(f)
+    logger.info(
+        f"Imposed {len(pages)} pages on {len(writer.pages)} sheets of {per_sheet} cards."
+    )
+    return output_file
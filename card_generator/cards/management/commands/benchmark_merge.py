@@ -0,0 +1,104 @@
+import json
+import resource
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.core.cache import CacheHandler, caches
+from django.core.management.base import BaseCommand
+
+from card_generator.cards.client import QueueCardsClient
+from card_generator.cards.fake_openspp import FakeOpenSPP, FakeOpenSPPServer
+from card_generator.tasks.cards import perform_merging
+
+BATCH_ID = 1
+# Keep the checkpoints of the benchmark away from the cache of the deployment
+BENCHMARK_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark-merge",
+    }
+}
+
+
+@contextmanager
+def benchmark_cache():
+    """Use a cache of its own for the default cache of this thread, e.g. for the checkpoints."""
+    default_cache = caches["default"]
+    caches["default"] = CacheHandler(BENCHMARK_CACHES).create_connection("default")
+    try:
+        yield
+    finally:
+        caches["default"] = default_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge batches of cards end to end against a local fake OpenSPP server, and report "
+        "the wall time, XML-RPC round trips, bytes transferred and peak RSS of each size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cards",
+            type=int,
+            nargs="+",
+            default=[100, 1000, 10000],
+            help="Number of cards of each batch to merge",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.005,
+            help="Seconds the fake server waits before answering each call",
+        )
+        parser.add_argument(
+            "--pdf-size",
+            type=int,
+            default=20_000,
+            help="Size in bytes of the unique image of each card PDF",
+        )
+        parser.add_argument("--output", help="Save the results in this JSON file")
+
+    def handle(self, *args, **options):
+        results = {}
+        # The peak RSS of the process only grows, so the smallest batches are merged first
+        for cards in sorted(options["cards"]):
+            result = self.merge(cards, options["latency"], options["pdf_size"])
+            results[cards] = result
+            self.stdout.write(
+                f"{cards:>7} cards {result['status']:<9} "
+                f"{result['wall_time']:9.2f} s  "
+                f"{result['round_trips']:>6} calls  "
+                f"sent {result['bytes_sent'] / 1024 ** 2:9.2f} MiB  "
+                f"received {result['bytes_received'] / 1024 ** 2:9.2f} MiB  "
+                f"peak RSS {result['peak_rss'] / 1024 ** 2:9.1f} MiB"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+
+    def merge(self, cards: int, latency: float, pdf_size: int) -> dict:
+        server = FakeOpenSPPServer(FakeOpenSPP({BATCH_ID: cards}, latency, pdf_size))
+        server.start()
+        try:
+            with benchmark_cache():
+                start = perf_counter()
+                client = QueueCardsClient(
+                    server_root=server.server_root,
+                    username="benchmark",
+                    password="benchmark",
+                    db_name="benchmark",
+                )
+                merge_status = perform_merging(client, BATCH_ID)
+                wall_time = perf_counter() - start
+        finally:
+            server.stop()
+
+        return {
+            "status": merge_status,
+            "wall_time": wall_time,
+            **client.transfer_stats.as_dict(),
+            # Kilobytes on Linux
+            "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        }
@@ -0,0 +1,84 @@
+import json
+import shutil
+import tempfile
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from card_generator.cards import benchmarks
+from card_generator.cards.models import Card
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the latency percentiles and peak memory of the card render pipeline. "
+        "With --baseline, fail when a benchmark is slower or uses more memory than the "
+        "baseline beyond the threshold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--card",
+            help="UUID of the card template to render, defaults to the sample templates",
+        )
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument(
+            "-k",
+            dest="keyword",
+            help="Only run the benchmarks with this keyword in their name",
+        )
+        parser.add_argument("--output", help="Save the results in this JSON file")
+        parser.add_argument(
+            "--baseline", help="JSON file of a previous run to compare with"
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Allowed increase compared to the baseline, defaults to 20%%",
+        )
+
+    def handle(self, *args, **options):
+        if options["card"]:
+            try:
+                card = Card.objects.get(uuid=options["card"])
+            except (Card.DoesNotExist, ValidationError):
+                raise CommandError(f"Card `{options['card']}` does not exist.")
+        else:
+            card = benchmarks.get_sample_card()
+
+        with_rsvg = shutil.which("rsvg-convert") is not None
+        if not with_rsvg:
+            self.stderr.write(
+                "rsvg-convert is not installed, the conversion benchmarks are skipped."
+            )
+
+        results = {}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for name, func in benchmarks.get_benchmarks(
+                card, temp_dir, with_rsvg
+            ).items():
+                if options["keyword"] and options["keyword"] not in name:
+                    continue
+                result = benchmarks.measure(func, iterations=options["iterations"])
+                results[name] = result
+                self.stdout.write(
+                    f"{name:<32} p50 {result['p50'] * 1000:9.2f} ms  "
+                    f"p95 {result['p95'] * 1000:9.2f} ms  "
+                    f"p99 {result['p99'] * 1000:9.2f} ms  "
+                    f"peak {result['peak_memory'] / 1024:9.1f} KiB"
+                )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+            regressions = benchmarks.compare(results, baseline, options["threshold"])
+            if regressions:
+                raise CommandError(
+                    "Performance regressions:\n" + "\n".join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS("No performance regression."))
@@ -0,0 +1,72 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from card_generator.cards import benchmarks
+
+ENDPOINTS = {
+    "sync": "api-v1:card-render",
+    "async": "api-v1:card-render-async",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the render endpoints of a running server, and report the throughput "
+        "and latency percentiles of the sync and async endpoints at each concurrency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--card", required=True, help="UUID of the card to render")
+        parser.add_argument(
+            "--token", required=True, help="Authentication token of the requests"
+        )
+        parser.add_argument("--server", default="http://localhost:8000")
+        parser.add_argument(
+            "--endpoint",
+            dest="endpoints",
+            choices=ENDPOINTS,
+            nargs="+",
+            default=list(ENDPOINTS),
+        )
+        parser.add_argument("--requests", type=int, default=100)
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+        parser.add_argument(
+            "--with-photo", action="store_true", help="Render the sample photo"
+        )
+        parser.add_argument("--output", help="Save the results in this JSON file")
+
+    def handle(self, *args, **options):
+        payload = {
+            "fields": benchmarks.get_sample_fields(options["with_photo"]),
+            "create_qr_code": True,
+        }
+        results = {}
+        for endpoint in options["endpoints"]:
+            path = reverse(ENDPOINTS[endpoint], kwargs={"uuid": options["card"]})
+            url = options["server"].rstrip("/") + path
+            for concurrency in options["concurrency"]:
+                result = benchmarks.load_test(
+                    url,
+                    payload,
+                    options["token"],
+                    options["requests"],
+                    concurrency,
+                )
+                results[f"{endpoint}_{concurrency}"] = result
+                statuses = ", ".join(
+                    f"{status}: {count}" for status, count in result["statuses"].items()
+                )
+                self.stdout.write(
+                    f"{endpoint:<6} x{concurrency:<4} "
+                    f"{result['throughput']:8.2f} renders/s  "
+                    f"p50 {result['p50'] * 1000:9.2f} ms  "
+                    f"p95 {result['p95'] * 1000:9.2f} ms  "
+                    f"p99 {result['p99'] * 1000:9.2f} ms  "
+                    f"({statuses})"
+                )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
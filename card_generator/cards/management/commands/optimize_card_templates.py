@@ -0,0 +1,35 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from card_generator.cards.models import Card
+
+
+class Command(BaseCommand):
+    help = (
+        "Publish a version of the card templates with copies optimized for the renders, e.g. "
+        "for the cards uploaded before the optimization, and report the savings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--card", help="UUID of the card to optimize, defaults to all the cards"
+        )
+
+    def handle(self, *args, **options):
+        cards = Card.objects.order_by("pk")
+        if options["card"]:
+            try:
+                cards = [Card.objects.get(uuid=options["card"])]
+            except (Card.DoesNotExist, ValidationError):
+                raise CommandError(f"Card `{options['card']}` does not exist.")
+
+        for card in cards:
+            reports = card.publish_version(optimize=True).optimization_reports
+            for side, report in reports.items():
+                self.stdout.write(
+                    f"{card.uuid} {side:<5} "
+                    f"size {report['original_size'] / 1024:9.1f} KiB -> "
+                    f"{report['optimized_size'] / 1024:9.1f} KiB  "
+                    f"parse {report['original_parse_seconds'] * 1000:7.2f} ms -> "
+                    f"{report['optimized_parse_seconds'] * 1000:7.2f} ms"
+                )
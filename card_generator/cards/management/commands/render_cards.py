@@ -0,0 +1,340 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.text import get_valid_filename
+
+from card_generator.cards.imposition import SHEET_SIZES, ImpositionLayout, impose_pdf
+from card_generator.cards.models import Card
+from card_generator.cards.pdf import CardRender
+from card_generator.tasks.cards import merge_pdf
+
+PDF = "pdf"
+PNG = "png"
+MERGED = "merged"
+
+# State of the worker processes, set once by `init_worker`
+_worker = {}
+
+
+def init_worker(card_id: int, options: dict) -> None:
+    django.setup()
+    _worker["card"] = Card.objects.get(pk=card_id)
+    _worker["options"] = options
+
+
+def render_record(name: str, fields: dict) -> list:
+    """
+    Render the card of a record in the output directory of the command.
+    The files are rendered in a staging directory first, so an interrupted render never
+    leaves a partial file behind.
+    """
+    options = _worker["options"]
+    target_dir = options["target_dir"]
+    card_render = CardRender(
+        _worker["card"],
+        fields,
+        options["create_qr_code"],
+        front_only=options["front_only"],
+        imposition=options["imposition"],
+    )
+    staging_dir = tempfile.mkdtemp(dir=target_dir, prefix=".render-")
+    try:
+        files = card_render.render_files(staging_dir, name, options["formats"])
+        target_files = []
+        for file in files:
+            target_file = os.path.join(target_dir, os.path.basename(file))
+            os.replace(file, target_file)
+            target_files.append(target_file)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return target_files
+
+
+def render_inline(name: str, fields: dict) -> Future:
+    future = Future()
+    try:
+        future.set_result(render_record(name, fields))
+    except Exception as e:  # noqa Report the error like a worker process would
+        future.set_exception(e)
+    return future
+
+
+def read_records(input_file: str):
+    """Stream the field records of a CSV or JSONL file."""
+    extension = os.path.splitext(input_file)[1].lower()
+    with open(input_file, newline="") as f:
+        if extension == ".csv":
+            yield from csv.DictReader(f)
+        elif extension in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise CommandError(f"Unsupported input file `{input_file}`.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Render cards of a template from a CSV or JSONL file of field records. "
+        "Cards that are already rendered in the output directory are skipped, "
+        "so an interrupted run can be resumed by running the same command again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("card", help="UUID of the card template")
+        parser.add_argument("input_file", help="CSV or JSONL file, one record per card")
+        parser.add_argument("output_dir", help="Directory where to save the cards")
+        parser.add_argument(
+            "--format",
+            choices=(PDF, PNG, MERGED),
+            default=PDF,
+            help="A PDF or PNGs per card, or a single merged PDF",
+        )
+        parser.add_argument(
+            "--name-field",
+            help="Field used to name the files of a card, defaults to the record number",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of rendering processes, 1 renders in this process",
+        )
+        parser.add_argument(
+            "--no-qr-code",
+            dest="create_qr_code",
+            action="store_false",
+            help="Do not generate the QR codes, the fields already contain the images",
+        )
+        parser.add_argument("--front-only", action="store_true")
+        parser.add_argument(
+            "--impose",
+            action="store_true",
+            help="Tile the cards onto print sheets",
+        )
+        parser.add_argument("--sheet", choices=list(SHEET_SIZES), default="a4")
+        parser.add_argument("--columns", type=int, default=2)
+        parser.add_argument("--rows", type=int, default=5)
+        parser.add_argument("--no-crop-marks", dest="crop_marks", action="store_false")
+        parser.add_argument("--duplex", action="store_true")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.OPENSPP_MERGE_CHUNK_SIZE,
+            help="Number of cards merged at once, with the merged format",
+        )
+        parser.add_argument(
+            "--cards-per-file",
+            type=int,
+            default=10000,
+            help="Maximum number of cards of a merged PDF, in whole chunks. A merged PDF is "
+            "written from memory, the cards of the batch are split across more files",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            card = Card.objects.get(uuid=options["card"])
+        except (Card.DoesNotExist, ValidationError):
+            raise CommandError(f"Card `{options['card']}` does not exist.")
+
+        output_format = options["format"]
+        output_dir = options["output_dir"]
+        imposition = None
+        if options["impose"]:
+            if options["duplex"] and options["front_only"]:
+                raise CommandError(
+                    "Duplex imposition needs the back of the cards, it cannot be used with `--front-only`."
+                )
+            imposition = {
+                "sheet": options["sheet"],
+                "columns": options["columns"],
+                "rows": options["rows"],
+                "crop_marks": options["crop_marks"],
+                "duplex": options["duplex"],
+            }
+            try:
+                ImpositionLayout(**imposition)
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        target_dir = output_dir
+        if output_format == MERGED:
+            # The cards are kept until their chunk is merged, and the chunks until the merge is
+            # done, so it can be resumed
+            target_dir = os.path.join(output_dir, "parts")
+        os.makedirs(target_dir, exist_ok=True)
+        self.target_dir = target_dir
+        self.imposition = imposition if output_format == MERGED else None
+        chunk_size = max(options["chunk_size"], 1)
+        if self.imposition:
+            # The chunks are imposed one by one, on full sheets until the last one
+            per_sheet = ImpositionLayout(**imposition).cards_per_sheet
+            chunk_size = -(-chunk_size // per_sheet) * per_sheet
+        chunks_per_file = max(-(-options["cards_per_file"] // chunk_size), 1)
+
+        expected_suffixes = [".pdf"]
+        if output_format == PNG:
+            sides = 1 if options["front_only"] else 2
+            expected_suffixes = [f"_{side}.png" for side in range(sides)]
+        worker_options = {
+            "target_dir": target_dir,
+            "formats": (PNG,) if output_format == PNG else (PDF,),
+            "create_qr_code": options["create_qr_code"],
+            "front_only": options["front_only"],
+            # The merged chunks are imposed instead of the cards one by one
+            "imposition": imposition if output_format == PDF else None,
+        }
+
+        workers = max(options["workers"] or 1, 1)
+        if workers == 1:
+            init_worker(card.pk, worker_options)
+            executor = None
+            submit = render_inline
+        else:
+            # The forked processes must not share the connection of this process
+            connections.close_all()
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=init_worker,
+                initargs=(card.pk, worker_options),
+            )
+
+            def submit(name, fields):
+                return executor.submit(render_record, name, fields)
+
+        self.rendered = self.skipped = self.failed = 0
+        # Cards of the chunks of the merged format that are not merged yet
+        self.chunks = {}
+        chunk_count = 0
+        pending = {}
+        try:
+            for index, fields in enumerate(read_records(options["input_file"])):
+                name = f"{index:08d}"
+                if options["name_field"]:
+                    if not fields.get(options["name_field"]):
+                        raise CommandError(
+                            f"Record {index} has no `{options['name_field']}` field."
+                        )
+                    name = get_valid_filename(fields[options["name_field"]])
+                chunk = None
+                if output_format == MERGED:
+                    chunk = index // chunk_size
+                    if chunk == chunk_count:
+                        # The previous chunk has all its records
+                        self.merge_chunk(chunk - 1, complete=True)
+                        chunk_count += 1
+                    if os.path.exists(self.get_chunk_file(chunk)):
+                        self.skipped += 1
+                        continue
+                    self.chunks.setdefault(chunk, {"names": [], "pending": 0})
+                    self.chunks[chunk]["names"].append(name)
+
+                if all(
+                    os.path.exists(os.path.join(target_dir, f"{name}{suffix}"))
+                    for suffix in expected_suffixes
+                ):
+                    self.skipped += 1
+                    continue
+                pending[submit(name, fields)] = (name, chunk)
+                if chunk is not None:
+                    self.chunks[chunk]["pending"] += 1
+                # Keep a bounded number of records in flight so memory stays flat
+                if len(pending) >= workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    self.collect(done, pending)
+            self.collect(wait(pending).done, pending)
+            if chunk_count:
+                self.merge_chunk(chunk_count - 1, complete=True)
+        finally:
+            if executor:
+                executor.shutdown(cancel_futures=True)
+
+        self.stdout.write(
+            f"Rendered {self.rendered} cards, skipped {self.skipped} already rendered, "
+            f"{self.failed} failed."
+        )
+        if self.failed:
+            raise CommandError(
+                f"{self.failed} cards failed to render, run the command again to retry them."
+            )
+
+        if output_format == MERGED and chunk_count:
+            # The chunks are already deduplicated and imposed, they are only appended to the
+            # results. A result is written from memory, so its chunks are capped.
+            result_files = []
+            for start in range(0, chunk_count, chunks_per_file):
+                name = MERGED
+                if chunk_count > chunks_per_file:
+                    name = f"{MERGED}_{start // chunks_per_file:08d}"
+                chunk_files = [
+                    self.get_chunk_file(chunk)
+                    for chunk in range(start, min(start + chunks_per_file, chunk_count))
+                ]
+                result_files.append(
+                    merge_pdf(
+                        chunk_files, output_dir, name=name, dedupe_resources=False
+                    )
+                )
+            shutil.rmtree(target_dir)
+            self.stdout.write(
+                self.style.SUCCESS(f"Merged cards into {', '.join(result_files)}.")
+            )
+
+    def collect(self, done: set, pending: dict) -> None:
+        for future in done:
+            name, chunk = pending.pop(future)
+            try:
+                future.result()
+            except Exception as e:  # noqa Report the error and render the other cards
+                self.failed += 1
+                self.stderr.write(f"Card `{name}` failed to render. {str(e)}")
+            else:
+                self.rendered += 1
+                if self.rendered % 100 == 0:
+                    self.stdout.write(f"Rendered {self.rendered} cards.")
+                if chunk is not None:
+                    self.chunks[chunk]["pending"] -= 1
+                    self.merge_chunk(chunk)
+
+    def get_chunk_file(self, chunk: int) -> str:
+        return os.path.join(self.target_dir, f"chunk_{chunk:08d}.pdf")
+
+    def merge_chunk(self, chunk: int, complete: bool = False) -> None:
+        """
+        Merge the cards of a chunk as soon as they are all rendered and remove them, so the
+        cards on disk and the pages of a merge stay bounded by the chunk size.
+        :param chunk: Index of the chunk
+        :param complete: All the records of the chunk have been read
+        """
+        state = self.chunks.get(chunk)
+        if state is None:
+            return
+        state["complete"] = state.get("complete") or complete
+        if state["pending"] or not state["complete"]:
+            return
+        del self.chunks[chunk]
+        part_files = [
+            os.path.join(self.target_dir, f"{name}.pdf") for name in state["names"]
+        ]
+        # Written under a temporary name, so an interrupted merge is done again
+        merged_file = merge_pdf(part_files, self.target_dir, name=f".chunk_{chunk:08d}")
+        if self.imposition:
+            imposed_file = impose_pdf(
+                merged_file,
+                os.path.join(self.target_dir, f".chunk_{chunk:08d}_imposed.pdf"),
+                ImpositionLayout(**self.imposition),
+            )
+            os.remove(merged_file)
+            merged_file = imposed_file
+        os.replace(merged_file, self.get_chunk_file(chunk))
+        for part_file in set(part_files):
+            os.remove(part_file)
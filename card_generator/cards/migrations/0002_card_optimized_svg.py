@@ -0,0 +1,26 @@
+# Generated by Django 4.1.7 on 2026-10-19 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cards", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="card",
+            name="back_svg_optimized",
+            field=models.FileField(
+                blank=True, editable=False, upload_to="cards/optimized/"
+            ),
+        ),
+        migrations.AddField(
+            model_name="card",
+            name="front_svg_optimized",
+            field=models.FileField(
+                blank=True, editable=False, upload_to="cards/optimized/"
+            ),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 4.1.7 on 2026-10-19 17:43
+
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cards", "0002_card_optimized_svg"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CardTemplateVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                ("digest", models.CharField(editable=False, max_length=64)),
+                (
+                    "front_svg",
+                    models.FileField(editable=False, upload_to="cards/versions/"),
+                ),
+                (
+                    "back_svg",
+                    models.FileField(editable=False, upload_to="cards/versions/"),
+                ),
+                (
+                    "front_svg_optimized",
+                    models.FileField(
+                        blank=True, editable=False, upload_to="cards/versions/"
+                    ),
+                ),
+                (
+                    "back_svg_optimized",
+                    models.FileField(
+                        blank=True, editable=False, upload_to="cards/versions/"
+                    ),
+                ),
+                (
+                    "card",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="versions",
+                        to="cards.card",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-created",),
+                "get_latest_by": "created",
+            },
+        ),
+        migrations.AddField(
+            model_name="card",
+            name="current_version",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="cards.cardtemplateversion",
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.1.7 on 2026-10-19 17:43
+
+import hashlib
+
+from django.core.files.base import ContentFile
+from django.db import migrations
+
+# Copies of the functions of `card_generator.cards.versions` when the versions were added,
+# the migration must not change with the code of the app
+
+
+def store_content(storage, content: bytes) -> str:
+    name = f"cards/versions/{hashlib.sha256(content).hexdigest()}.svg"
+    if not storage.exists(name):
+        name = storage.save(name, ContentFile(content))
+    return name
+
+
+def get_version_digest(names) -> str:
+    return hashlib.sha256("|".join(names).encode("utf-8")).hexdigest()
+
+
+def publish_versions(apps, schema_editor):
+    """Publish the templates of the existing cards, with their optimized copies, as a version."""
+    Card = apps.get_model("cards", "Card")
+    CardTemplateVersion = apps.get_model("cards", "CardTemplateVersion")
+    storage = CardTemplateVersion._meta.get_field("front_svg").storage
+    for card in Card.objects.filter(current_version=None).order_by("pk"):
+        files = {}
+        try:
+            for field in (
+                "front_svg",
+                "back_svg",
+                "front_svg_optimized",
+                "back_svg_optimized",
+            ):
+                files[field] = ""
+                if getattr(card, field):
+                    with getattr(card, field).open("rb") as f:
+                        files[field] = store_content(storage, f.read())
+        except OSError:
+            # The renders of the card fail already, it is published on its next upload
+            continue
+        card.current_version = CardTemplateVersion.objects.create(
+            card=card, digest=get_version_digest(files.values()), **files
+        )
+        card.save(update_fields=["current_version"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cards", "0003_card_template_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(publish_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.1.7 on 2026-10-19 17:43
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cards", "0004_publish_card_template_versions"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="card",
+            name="back_svg_optimized",
+        ),
+        migrations.RemoveField(
+            model_name="card",
+            name="front_svg_optimized",
+        ),
+    ]
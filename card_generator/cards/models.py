@@ -1,12 +1,28 @@
+import logging
 import uuid
 from collections import OrderedDict
 
+from django.conf import settings
 from django.core.validators import FileExtensionValidator
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from model_utils.models import TimeStampedModel
 
+from card_generator.cards.exceptions import (
+    ImmutableTemplateVersionException,
+    SVGOptimizationException,
+)
+from card_generator.cards.storage import get_local_path
 from card_generator.cards.utils import get_svg_fields_from_tags, get_svg_variables
+from card_generator.cards.versions import (
+    VERSIONS_DIR,
+    get_version_digest,
+    store_content,
+)
+
+logger = logging.getLogger(__name__)
+
+SIDES = ("front", "back")
 
 
 class Card(TimeStampedModel):
@@ -17,20 +33,104 @@ class Card(TimeStampedModel):
     back_svg = models.FileField(
         upload_to="cards/", validators=[FileExtensionValidator(["svg"])]
     )
+    # Version of the templates used by the renders, see `publish_version`
+    current_version = models.ForeignKey(
+        "CardTemplateVersion",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+    )
     uuid = models.UUIDField(default=uuid.uuid4, db_index=True)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        uploaded = any(not getattr(self, f"{side}_svg")._committed for side in SIDES)
+        super().save(*args, **kwargs)
+        if uploaded:
+            self.publish_version()
+
+    def get_templates(self) -> "Card | CardTemplateVersion":
+        """Get the current version of the templates, or the card before it has one."""
+        return self.current_version or self
+
+    def get_render_svg(self, side: str):
+        """Get the template of a side used by the renders, the optimized copy when there is one."""
+        templates = self.get_templates()
+        return getattr(templates, f"{side}_svg_optimized", None) or getattr(
+            templates, f"{side}_svg"
+        )
+
+    def get_render_path(self, side: str) -> str:
+        """Get a local path of the template of a side used by the renders, see `get_local_path`."""
+        return get_local_path(self.get_render_svg(side))
+
+    def publish_version(self, optimize: bool | None = None) -> "CardTemplateVersion":
+        """
+        Store the templates of the card as a new immutable version and switch the renders to it.
+        The renders started before keep the files of the previous version, which are never
+        overwritten.
+        :param optimize: Store copies of the templates optimized for the renders with
+            `optimize_svg`, defaults to `OPENSPP_SVG_OPTIMIZATION`. A template that cannot be
+            optimized is rendered as is.
+        :return: The current version, with the size and parse time of each optimized side
+            before and after the optimization in `optimization_reports`
+        """
+        from card_generator.cards.svg import get_optimization_report, optimize_svg
+
+        if optimize is None:
+            optimize = settings.OPENSPP_SVG_OPTIMIZATION
+        storage = CardTemplateVersion._meta.get_field("front_svg").storage
+        files = {}
+        reports = {}
+        for side in SIDES:
+            with getattr(self, f"{side}_svg").open("rb") as f:
+                content = f.read()
+            files[f"{side}_svg"] = store_content(storage, content)
+            files[f"{side}_svg_optimized"] = ""
+            if not optimize:
+                continue
+            try:
+                optimized = optimize_svg(content, settings.OPENSPP_SVG_PRECISION)
+            except SVGOptimizationException as e:
+                logger.warning(f"{side} of card #{self.uuid} not optimized. {str(e)}")
+                continue
+            files[f"{side}_svg_optimized"] = store_content(storage, optimized)
+            reports[side] = get_optimization_report(content, optimized)
+            logger.info(
+                f"Optimized {side} of card #{self.uuid}.",
+                extra={"card": str(self.uuid), **reports[side]},
+            )
+
+        digest = get_version_digest(files.values())
+        if self.current_version and self.current_version.digest == digest:
+            version = self.current_version
+        else:
+            with transaction.atomic():
+                version = CardTemplateVersion.objects.create(
+                    card=self, digest=digest, **files
+                )
+                self.current_version = version
+                super().save(update_fields=["current_version"])
+            logger.info(f"Published version {digest} of card #{self.uuid}.")
+        version.optimization_reports = reports
+        return version
+
     def get_fields(self) -> list:
         """Get available fields the user can update."""
         # This gets the fields tagged in `data-variable`
-        front_svg_fields = get_svg_fields_from_tags(self.front_svg.path)
-        back_svg_fields = get_svg_fields_from_tags(self.back_svg.path)
+        templates = self.get_templates()
+        front_svg_path = get_local_path(templates.front_svg)
+        back_svg_path = get_local_path(templates.back_svg)
+        front_svg_fields = get_svg_fields_from_tags(front_svg_path)
+        back_svg_fields = get_svg_fields_from_tags(back_svg_path)
 
         # This gets the fields declared in `{{ }}`
-        front_svg_fields.extend(get_svg_variables(self.front_svg.path))
-        back_svg_fields.extend(get_svg_variables(self.back_svg.path))
+        front_svg_fields.extend(get_svg_variables(front_svg_path))
+        back_svg_fields.extend(get_svg_variables(back_svg_path))
         fields = front_svg_fields + back_svg_fields
 
         unique_fields = list(
@@ -38,3 +138,37 @@ class Card(TimeStampedModel):
         )
 
         return unique_fields
+
+
+class CardTemplateVersion(TimeStampedModel):
+    """
+    Immutable version of the templates of a card. Its files are named after the digest of
+    their content, so the caches of the renders can key on the version forever.
+    """
+
+    card = models.ForeignKey(Card, on_delete=models.CASCADE, related_name="versions")
+    # Digest of the files of the version
+    digest = models.CharField(max_length=64, editable=False)
+    front_svg = models.FileField(upload_to=VERSIONS_DIR, editable=False)
+    back_svg = models.FileField(upload_to=VERSIONS_DIR, editable=False)
+    # Copies of the templates optimized for the renders
+    front_svg_optimized = models.FileField(
+        upload_to=VERSIONS_DIR, blank=True, editable=False
+    )
+    back_svg_optimized = models.FileField(
+        upload_to=VERSIONS_DIR, blank=True, editable=False
+    )
+
+    class Meta:
+        ordering = ("-created",)
+        get_latest_by = "created"
+
+    def __str__(self):
+        return f"{self.card} {self.digest[:12]}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ImmutableTemplateVersionException(
+                f"Version {self.digest} of card #{self.card.uuid} cannot be changed."
+            )
+        super().save(*args, **kwargs)
@@ -4,25 +4,36 @@ import os
 import shutil
 import tempfile
 import uuid
-from time import time
-
-from bs4 import BeautifulSoup, Tag
-from jinja2 import Template
+from typing import TYPE_CHECKING
 
+from card_generator.cards.fonts import get_card_fonts
 from card_generator.cards.models import Card
-from card_generator.cards.qrcode import generate_qrcode
+from card_generator.cards.signals import card_rendered
 from card_generator.cards.utils import (
     convert_file_to_uri,
     convert_svgs,
+    get_template,
     svg_to_soup_object,
 )
+from card_generator.utils import profiling
+from card_generator.utils.timing import StageTimer
+
+# bs4, qrcode and PyPDF2 are imported by the first render, not by the API modules
+if TYPE_CHECKING:
+    from bs4 import Tag
 
 log = logging.getLogger(__name__)
 
 
 class CardRender:
     def __init__(
-        self, card: Card, data: dict, create_qr_code: bool, front_only: bool = False
+        self,
+        card: Card,
+        data: dict,
+        create_qr_code: bool,
+        front_only: bool = False,
+        imposition: dict | None = None,
+        profile: bool | None = None,
     ):
         """
         Render template card with real data
@@ -30,54 +41,125 @@ class CardRender:
         :arg data: Dict of data that will be supplied to the template card
         :arg create_qr_code: Bool to check if qrcode should be generated
         :arg front_only: Allow user to generate the front of card only
+        :arg imposition: Options of `ImpositionLayout` to place the card on a print sheet
+        :arg profile: Profile the render, defaults to profile a sample of the renders
         """
         self.temp_dir = tempfile.mkdtemp(suffix="card-temp-files")
         self.card = card
-        self.front_svg_path = card.front_svg.path
-        self.back_svg_path = card.back_svg.path
+        self.front_svg_path = card.get_render_path("front")
+        self.back_svg_path = card.get_render_path("back")
         self.svg_files = list()
         self.data = data
         self.create_qr_code = create_qr_code
         self.front_only = front_only
+        self.imposition = imposition
+        self.timer = StageTimer()
+        self.profile = profile
+        self.fonts = None
 
     def render(self):
-        start_render = time()
         log.info(f"Start rendering #{str(self.card.uuid)}")
-        self.create_svg()
-        try:
-            name = uuid.uuid4().hex
-            pdf_name = self.render_pdf(name)
-            png_files = self.render_pngs(name)
-        finally:
-            shutil.rmtree(self.temp_dir)
-        log.info(f"End of rendering {time() - start_render}")
+        with profiling.profile(f"render-{self.card.uuid}", self.profile):
+            self.create_svg()
+            try:
+                name = uuid.uuid4().hex
+                pdf_name = self.render_pdf(name)
+                png_files = self.render_pngs(name)
+            finally:
+                shutil.rmtree(self.temp_dir)
+        self.report_timings()
         return dict(pdf=pdf_name, png=png_files)
 
+    def report_timings(self):
+        """Log the duration of each stage of the render and send the `card_rendered` signal."""
+        self.timer.stop()
+        timings = self.timer.as_dict()
+        log.info(
+            f"End of rendering {self.timer.total}",
+            extra={"card": str(self.card.uuid), "timings": timings},
+        )
+        card_rendered.send(sender=self.__class__, card=self.card, timer=self.timer)
+
+    def render_files(self, target_dir: str, name: str, formats=("pdf", "png")) -> list:
+        """
+        Render the card into files instead of data URIs.
+        :arg target_dir: Directory where to save the files
+        :arg name: Name of the files without the extension
+        :arg formats: Formats to render, `pdf` and/or `png`
+        :return: List of the rendered files
+        """
+        with profiling.profile(f"render-{self.card.uuid}", self.profile):
+            self.create_svg()
+            files = {}
+            try:
+                if "pdf" in formats:
+                    files[f"{name}.pdf"] = self.render_pdf_file(name)
+                if "png" in formats:
+                    for png_file in self.render_png_files(name):
+                        files[os.path.basename(png_file)] = png_file
+                target_files = []
+                for file_name, file in files.items():
+                    target_file = os.path.join(target_dir, file_name)
+                    shutil.move(file, target_file)
+                    target_files.append(target_file)
+            finally:
+                shutil.rmtree(self.temp_dir)
+        self.report_timings()
+        return target_files
+
     def render_pngs(self, name: str) -> list:
         """Render card template for png."""
-
+        png_files = self.render_png_files(f"{name}_{uuid.uuid4().hex[:10]}")
+        with self.timer.stage("base64_encoding"):
+            return [
+                convert_file_to_uri("image/png", png_file) for png_file in png_files
+            ]
+
+    def render_png_files(self, name: str) -> list:
+        """Render card template to a png file per side."""
         png_files = []
-        for item in self.svg_files:
-            suffix = uuid.uuid4().hex[:10]
-            file_name = f"{name}_{suffix}.png"
-            rsvg_png = os.path.join(self.temp_dir, file_name)
-            convert_svgs([item], rsvg_png, "png")
-            png_file = convert_file_to_uri("image/png", rsvg_png)
-            png_files.append(png_file)
+        for index, item in enumerate(self.svg_files):
+            rsvg_png = os.path.join(self.temp_dir, f"{name}_{index}.png")
+            with self.timer.stage("png_conversion"):
+                convert_svgs([item], rsvg_png, "png", self.fonts_config)
+            png_files.append(rsvg_png)
 
         return png_files
 
     def render_pdf(self, name: str):
         """Render card template for pdf."""
-        file_name = f"{name}.pdf"
-        rsvg_pdf = os.path.join(self.temp_dir, file_name)
-        convert_svgs(self.svg_files, rsvg_pdf, "pdf")
-
-        final_pdf = os.path.join(self.temp_dir, file_name)
-        return convert_file_to_uri("application/pdf", final_pdf)
+        pdf_file = self.render_pdf_file(name)
+        with self.timer.stage("base64_encoding"):
+            return convert_file_to_uri("application/pdf", pdf_file)
+
+    def render_pdf_file(self, name: str) -> str:
+        """Render card template to a pdf file."""
+        rsvg_pdf = os.path.join(self.temp_dir, f"{name}.pdf")
+        with self.timer.stage("pdf_conversion"):
+            convert_svgs(self.svg_files, rsvg_pdf, "pdf", self.fonts_config)
+
+        if self.imposition:
+            from card_generator.cards.imposition import ImpositionLayout, impose_pdf
+
+            with self.timer.stage("imposition"):
+                return impose_pdf(
+                    rsvg_pdf,
+                    os.path.join(self.temp_dir, f"{name}_imposed.pdf"),
+                    ImpositionLayout(**self.imposition),
+                )
+        return rsvg_pdf
+
+    @property
+    def fonts_config(self) -> str | None:
+        return self.fonts["config"] if self.fonts else None
 
     def create_svg(self):
         """Create new svg with the applied data."""
+        with self.timer.stage("template_load"):
+            self.fonts = get_card_fonts(self.card)
+        if self.fonts:
+            self.front_svg_path = self.fonts["templates"][self.front_svg_path]
+            self.back_svg_path = self.fonts["templates"][self.back_svg_path]
         front_soup = self.apply_data(self.front_svg_path, self.data)
         self.save_svg(front_soup)
 
@@ -87,16 +169,20 @@ class CardRender:
 
     def save_svg(self, content):
         svg_file = os.path.join(self.temp_dir, f"{uuid.uuid4().hex}.svg")
-        with open(svg_file, "w+") as file:
+        with self.timer.stage("svg_write"), open(svg_file, "w+") as file:
             file.write(str(content))
             self.svg_files.append(svg_file)
 
     def apply_data(self, path: str, data: dict):
         """Apply data to template SVG."""
-        with open(path) as svg_file:
-            template = Template(svg_file.read())
+        from bs4 import BeautifulSoup
+
+        with self.timer.stage("template_load"):
+            template = get_template(path)
+        with self.timer.stage("jinja_render"):
             updated_svg = template.render(data)
 
+        with self.timer.stage("xml_substitution"):
             soup = BeautifulSoup(updated_svg, "xml")
             tags = soup.find_all(attrs={"data-variable": True})
 
@@ -121,10 +207,13 @@ class CardRender:
 
             return str(soup)
 
-    def process_qrcode(self, tag: Tag, qrcode_value):
+    def process_qrcode(self, tag: "Tag", qrcode_value):
         """Apply QR code in the svg template."""
         if self.create_qr_code:
-            svg_string = generate_qrcode(self.temp_dir, qrcode_value)
+            from card_generator.cards.qrcode import generate_qrcode
+
+            with self.timer.stage("qr_generation"):
+                svg_string = generate_qrcode(self.temp_dir, qrcode_value)
             tag.attrs["xlink:href"] = svg_string
             return
 
@@ -136,10 +225,10 @@ class CardRender:
         else:
             self.process_image(tag, qrcode_value)
 
-    def process_image(self, tag: Tag, image_url):
+    def process_image(self, tag: "Tag", image_url):
         tag.attrs["xlink:href"] = image_url
 
-    def get_tag_attributes(self, tag: Tag):
+    def get_tag_attributes(self, tag: "Tag"):
         return {
             "data-variable": tag.attrs.get("data-variable"),
             "height": tag.attrs.get("height"),
@@ -149,7 +238,7 @@ class CardRender:
             "id": tag.attrs.get("id"),
         }
 
-    def replace_tag(self, old_tag: Tag, new_tag: Tag):
+    def replace_tag(self, old_tag: "Tag", new_tag: "Tag"):
         new_tag_attrs = self.get_tag_attributes(old_tag)
         if new_tag_attrs:
             for key, value in new_tag_attrs.items():
@@ -0,0 +1,4 @@
+from django.dispatch import Signal
+
+# Sent after a card is rendered with the `card` and the `timer` of the stages of the render
+card_rendered = Signal()
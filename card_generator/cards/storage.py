@@ -0,0 +1,46 @@
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+
+from card_generator.utils.metrics import TEMPLATE_STORAGE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+def get_cache_dir() -> str:
+    return settings.OPENSPP_TEMPLATE_STORAGE_CACHE_DIR or os.path.join(
+        tempfile.gettempdir(), "card-generator-templates"
+    )
+
+
+def get_local_path(file) -> str:
+    """
+    Get a local path to read a template of a card, for the renders and rsvg-convert.
+    The files of a local storage are read in place. The files of the other storages, e.g. S3,
+    are downloaded once to `OPENSPP_TEMPLATE_STORAGE_CACHE_DIR` of the node and read from there
+    afterwards: the files of the versions are named after their content and never change.
+    :param file: File of a `FileField`
+    """
+    try:
+        return file.path
+    except NotImplementedError:
+        pass
+
+    path = os.path.join(get_cache_dir(), os.path.normpath(file.name).lstrip(os.sep))
+    if os.path.exists(path):
+        TEMPLATE_STORAGE_REQUESTS.labels(result="hit").inc()
+        return path
+
+    TEMPLATE_STORAGE_REQUESTS.labels(result="miss").inc()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written atomically, so other processes never read a partial template
+    with file.storage.open(file.name, "rb") as source, tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(path), delete=False
+    ) as target:
+        for chunk in source.chunks():
+            target.write(chunk)
+    os.replace(target.name, path)
+    logger.info(f"Template {file.name} downloaded to {path}.")
+    return path
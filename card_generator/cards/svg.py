@@ -0,0 +1,337 @@
+import copy
+import logging
+import re
+from time import perf_counter
+
+from card_generator.cards.exceptions import SVGOptimizationException
+
+logger = logging.getLogger(__name__)
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+
+# Namespaces of the elements and attributes only read by the editors
+EDITOR_NAMESPACES = {
+    "http://www.inkscape.org/namespaces/inkscape",
+    "http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd",
+    "http://www.bohemiancoding.com/sketch/ns",
+    "http://svg-edit.googlecode.com",
+    "http://ns.adobe.com/AdobeIllustrator/10.0/",
+    "http://ns.adobe.com/AdobeSVGViewerExtensions/3.0/",
+    "http://ns.adobe.com/Extensibility/1.0/",
+    "http://ns.adobe.com/Flows/1.0/",
+    "http://ns.adobe.com/GenericCustomNamespace/1.0/",
+    "http://ns.adobe.com/Graphs/1.0/",
+    "http://ns.adobe.com/ImageReplacement/1.0/",
+    "http://ns.adobe.com/SaveForWeb/1.0/",
+    "http://ns.adobe.com/Variables/1.0/",
+    "http://ns.adobe.com/xap/1.0/",
+}
+# SVG elements that are not drawn
+METADATA_ELEMENTS = {"metadata", "title", "desc"}
+# Definitions that are only used through a reference to their ID
+REFERENCED_DEFINITIONS = {
+    "clipPath",
+    "filter",
+    "linearGradient",
+    "marker",
+    "mask",
+    "pattern",
+    "radialGradient",
+    "symbol",
+}
+# Elements where whitespace is part of the content
+TEXT_ELEMENTS = {"text", "tspan", "textPath", "style", "script"}
+
+REFERENCE = re.compile(r"url\(\s*['\"]?#([^)'\"\s]+)")
+# IDs of the CSS selectors, e.g. `#logo path`, and hex colors that are kept as IDs too
+SELECTOR_ID = re.compile(r"#(-?[_a-zA-Z][\w-]*)")
+NUMBER = re.compile(r"-?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?")
+JINJA = re.compile(rb"{{.*?}}|{%.*?%}|{#.*?#}", re.DOTALL)
+# The Jinja code is replaced by placeholders while the template is parsed, so it is not escaped
+# as XML. They are made of characters of the private use area, which are valid XML but
+# never written by the editors.
+PLACEHOLDER_START = "\ue000"
+PLACEHOLDER_END = "\ue001"
+PLACEHOLDER = re.compile(f"{PLACEHOLDER_START}(\\d+){PLACEHOLDER_END}".encode("utf-8"))
+
+
+def hide_jinja(content: bytes) -> tuple[bytes, list[bytes]]:
+    """
+    Replace the Jinja expressions, statements and comments of a template by placeholders.
+    :return: The template with the placeholders, and the Jinja code of each placeholder
+    """
+    if PLACEHOLDER_START.encode("utf-8") in content:
+        raise SVGOptimizationException(
+            "The SVG contains characters of the placeholders."
+        )
+    codes = []
+
+    def hide(match) -> bytes:
+        codes.append(match.group(0))
+        return f"{PLACEHOLDER_START}{len(codes) - 1}{PLACEHOLDER_END}".encode("utf-8")
+
+    return JINJA.sub(hide, content), codes
+
+
+def restore_jinja(content: bytes, codes: list[bytes]) -> bytes:
+    return PLACEHOLDER.sub(lambda match: codes[int(match.group(1))], content)
+
+
+def is_dynamic(value: str | None) -> bool:
+    """Check if a value is written by the Jinja code of the template."""
+    return bool(value) and PLACEHOLDER_START in value
+
+
+def has_dynamic_references(root) -> bool:
+    """
+    Check if an element is referenced, or a definition identified, through Jinja code, e.g.
+    `fill="url(#{{ color }})"`. The definitions used by the renders are not known then.
+    """
+    return any(is_dynamic(reference) for reference in get_references(root)) or any(
+        is_dynamic(element.get("id")) for element in root.iter("{*}*")
+    )
+
+
+def local_name(element) -> str:
+    return element.tag.rsplit("}", 1)[-1]
+
+
+def namespace(name: str) -> str | None:
+    return name[1:].split("}", 1)[0] if name.startswith("{") else None
+
+
+def get_href(element) -> str | None:
+    return element.get(f"{{{XLINK_NS}}}href", element.get("href"))
+
+
+def remove_element(element) -> None:
+    """Remove the element, keeping the text that follows it, e.g. a Jinja statement."""
+    parent = element.getparent()
+    if element.tail and element.tail.strip():
+        previous = element.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + element.tail
+        else:
+            parent.text = (parent.text or "") + element.tail
+    parent.remove(element)
+
+
+def get_references(root) -> set:
+    """Get the IDs referenced with `url(#id)`, `href="#id"` or the `#id` selectors of the styles."""
+    references = set()
+    for element in root.iter("{*}*"):
+        for value in element.attrib.values():
+            references.update(REFERENCE.findall(value))
+        href = get_href(element)
+        if href and href.startswith("#"):
+            references.add(href[1:])
+    return references | get_selected_ids(root)
+
+
+def get_selected_ids(root) -> set:
+    """Get the IDs of the `#id` selectors of the styles."""
+    selected = set()
+    for style in root.iter("{*}style"):
+        selected.update(SELECTOR_ID.findall(style.text or ""))
+    return selected
+
+
+def strip_metadata(root) -> None:
+    for element in list(root.iter("{*}*")):
+        if namespace(element.tag) in EDITOR_NAMESPACES or (
+            namespace(element.tag) == SVG_NS
+            and local_name(element) in METADATA_ELEMENTS
+        ):
+            remove_element(element)
+            continue
+        for attribute in list(element.attrib):
+            if namespace(attribute) in EDITOR_NAMESPACES:
+                del element.attrib[attribute]
+
+
+def dedupe_definitions(root) -> None:
+    """Replace the definitions identical to a previous one by a reference to it."""
+    kept = {}
+    replaced = {}
+    selected = get_selected_ids(root)
+    for definition in root.iterfind(f".//{{{SVG_NS}}}defs/{{*}}*[@id]"):
+        # The styles of a definition selected by its ID would not apply to the other one
+        if definition.get("id") in selected:
+            continue
+        clone = copy.deepcopy(definition)
+        del clone.attrib["id"]
+        clone.tail = None
+        key = _serialize(clone)
+        if key in kept:
+            replaced[definition.get("id")] = kept[key]
+            remove_element(definition)
+        else:
+            kept[key] = definition.get("id")
+    if not replaced:
+        return
+
+    def replace_reference(match) -> str:
+        return match.group(0).replace(
+            match.group(1), replaced.get(match.group(1), match.group(1))
+        )
+
+    for element in root.iter("{*}*"):
+        for attribute, value in element.attrib.items():
+            if "#" not in value:
+                continue
+            if attribute in (f"{{{XLINK_NS}}}href", "href") and value[1:] in replaced:
+                element.set(attribute, f"#{replaced[value[1:]]}")
+            else:
+                element.set(attribute, REFERENCE.sub(replace_reference, value))
+        if local_name(element) == "style" and element.text:
+            element.text = REFERENCE.sub(replace_reference, element.text)
+
+
+def remove_unused_definitions(root) -> None:
+    removed = True
+    while removed:
+        references = get_references(root)
+        removed = False
+        for definition in root.iterfind(f".//{{{SVG_NS}}}defs/{{*}}*"):
+            if (
+                local_name(definition) in REFERENCED_DEFINITIONS
+                and definition.get("id") not in references
+            ):
+                remove_element(definition)
+                removed = True
+    for defs in root.iterfind(f".//{{{SVG_NS}}}defs"):
+        if len(defs) == 0 and not (defs.text or "").strip():
+            remove_element(defs)
+
+
+def collapse_groups(root) -> None:
+    """Move the content of the groups without attributes into their parent."""
+    references = get_references(root)
+    dynamic_references = has_dynamic_references(root)
+    for group in reversed(list(root.iter(f"{{{SVG_NS}}}g"))):
+        attributes = set(group.attrib) - {"id"}
+        if attributes or group.get("id") in references:
+            continue
+        if dynamic_references and group.get("id"):
+            continue
+        if (group.text or "").strip():
+            continue
+        parent = group.getparent()
+        index = parent.index(group)
+        children = list(group)
+        if children:
+            last = children[-1]
+            last.tail = (last.tail or "") + (group.tail or "")
+            for offset, child in enumerate(children):
+                parent.insert(index + offset, child)
+            parent.remove(group)
+        else:
+            remove_element(group)
+
+
+def round_number(match, precision: int) -> str:
+    value = f"{float(match.group(0)):.{precision}f}"
+    if "." in value:
+        value = value.rstrip("0").rstrip(".")
+    if value == "-0":
+        value = "0"
+    elif value.startswith(("0.", "-0.")):
+        value = value.replace("0.", ".", 1)
+    # `1.5.5` is `1.5 .5`, the next number must not become the decimals of this one
+    if "." not in value and match.string.startswith(".", match.end()):
+        value += ".0"
+    return value
+
+
+def round_coordinates(root, precision: int) -> None:
+    """Round the coordinates of the paths and polygons, written by editors with 5 or more decimals."""
+    for element in root.iter("{*}*"):
+        for attribute in ("d", "points"):
+            value = element.get(attribute)
+            # Keep the values written by the template as is
+            if not value or is_dynamic(value):
+                continue
+            element.set(
+                attribute, NUMBER.sub(lambda m: round_number(m, precision), value)
+            )
+
+
+def strip_whitespace(element) -> None:
+    """
+    Remove the whitespace between elements, except in the text elements. The text between
+    elements, e.g. Jinja statements, is not drawn, so the whitespace around it is removed too.
+    """
+    if local_name(element) in TEXT_ELEMENTS:
+        return
+    if element.get("{http://www.w3.org/XML/1998/namespace}space") == "preserve":
+        return
+    element.text = (element.text or "").strip() or None
+    for child in element.iterchildren("{*}*"):
+        child.tail = (child.tail or "").strip() or None
+        strip_whitespace(child)
+
+
+def _serialize(element) -> bytes:
+    from lxml import etree
+
+    return etree.tostring(element)
+
+
+def parse(content: bytes):
+    from lxml import etree
+
+    # Entities are kept as is, so the template cannot include files of the server
+    parser = etree.XMLParser(
+        remove_comments=True, resolve_entities=False, no_network=True, huge_tree=True
+    )
+    try:
+        return etree.fromstring(content, parser).getroottree()
+    except etree.XMLSyntaxError as e:
+        raise SVGOptimizationException(f"The SVG is not valid XML. {str(e)}")
+
+
+def optimize_svg(content: bytes, precision: int = 3) -> bytes:
+    """
+    Optimize a SVG template for the renders: strip the editor metadata, dedupe and remove the
+    unused definitions, collapse the groups without attributes, round the coordinates to
+    `precision` decimals and remove the whitespace between elements.
+    The Jinja code of the template is kept as is. The definitions are kept when they are
+    referenced through Jinja code.
+    :raises SVGOptimizationException: The template is not valid XML, e.g. a Jinja statement
+        is inside a tag
+    """
+    from lxml import etree
+
+    content, codes = hide_jinja(content)
+    tree = parse(content)
+    root = tree.getroot()
+    strip_metadata(root)
+    if not has_dynamic_references(root):
+        dedupe_definitions(root)
+        remove_unused_definitions(root)
+    collapse_groups(root)
+    round_coordinates(root, precision)
+    strip_whitespace(root)
+    etree.cleanup_namespaces(tree)
+    return restore_jinja(etree.tostring(tree, encoding="utf-8"), codes)
+
+
+def get_parse_time(content: bytes, repeat: int = 5) -> float:
+    """Get the best time in seconds to parse the SVG with libxml2, the parser of rsvg."""
+    content, _ = hide_jinja(content)
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        parse(content)
+        timings.append(perf_counter() - start)
+    return min(timings)
+
+
+def get_optimization_report(original: bytes, optimized: bytes) -> dict:
+    return {
+        "original_size": len(original),
+        "optimized_size": len(optimized),
+        "original_parse_seconds": get_parse_time(original),
+        "optimized_parse_seconds": get_parse_time(optimized),
+    }
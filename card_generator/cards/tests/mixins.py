@@ -1,4 +1,5 @@
 import base64
+import shutil
 
 from django.conf import settings
 from django.utils.functional import cached_property
@@ -6,6 +7,15 @@ from django.utils.functional import cached_property
 SAMPLE_PDF = "card_generator/api/tests/v1/cards/samples/sample.pdf"
 
 
+def fake_convert_svgs(svg_files, output_filename, output_format, fonts_config=None):
+    """Stand in for rsvg-convert, writing the sample PDF or a placeholder PNG."""
+    if output_format == "pdf":
+        shutil.copy(SAMPLE_PDF, output_filename)
+    else:
+        with open(output_filename, "wb") as f:
+            f.write(b"png")
+
+
 class OpenSPPClientTestMixin:
     @cached_property
     def sample_pdf(self):
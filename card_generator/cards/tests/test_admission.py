@@ -0,0 +1,113 @@
+import asyncio
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from prometheus_client import REGISTRY
+
+from card_generator.cards import admission
+from card_generator.cards.admission import RenderRejected, RenderSlots
+
+
+class TestRenderSlots(SimpleTestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = temp_dir.name
+
+    def get_slots(self, slots=1, queue_size=1, timeout=0.1) -> RenderSlots:
+        return RenderSlots(self.directory, slots, queue_size, timeout, retry_after=3)
+
+    def get_rejected(self, reason: str) -> float:
+        return (
+            REGISTRY.get_sample_value(
+                "card_generator_render_rejected_total", {"reason": reason}
+            )
+            or 0
+        )
+
+    def test_acquire(self):
+        slots = self.get_slots(slots=2)
+        with slots.acquire(), slots.acquire():
+            pass
+        # The slots are released
+        with slots.acquire(), slots.acquire():
+            pass
+
+    def test_queue_full(self):
+        slots = self.get_slots(queue_size=0)
+        rejected = self.get_rejected("queue_full")
+        with slots.acquire():
+            with self.assertRaises(RenderRejected) as context:
+                with slots.acquire():
+                    pass
+        self.assertEqual(429, context.exception.status)
+        self.assertEqual(3, context.exception.retry_after)
+        self.assertEqual(rejected + 1, self.get_rejected("queue_full"))
+
+    def test_timeout(self):
+        slots = self.get_slots(timeout=0.05)
+        rejected = self.get_rejected("timeout")
+        with slots.acquire():
+            with self.assertRaises(RenderRejected) as context:
+                with slots.acquire():
+                    pass
+        self.assertEqual(503, context.exception.status)
+        self.assertEqual(rejected + 1, self.get_rejected("timeout"))
+
+    def test_wait_for_slot(self):
+        slots = self.get_slots(timeout=5)
+        held = threading.Event()
+
+        def hold_slot():
+            with slots.acquire():
+                held.set()
+                time.sleep(0.05)
+
+        thread = threading.Thread(target=hold_slot)
+        thread.start()
+        held.wait()
+        queue_length = []
+        with mock.patch.object(
+            admission.RENDER_QUEUE_LENGTH,
+            "inc",
+            side_effect=lambda: queue_length.append(1),
+        ):
+            with slots.acquire():
+                pass
+        thread.join()
+        self.assertEqual([1], queue_length)
+
+    def test_acquire_async(self):
+        slots = self.get_slots(queue_size=0)
+
+        async def render():
+            async with slots.acquire_async():
+                with self.assertRaises(RenderRejected):
+                    async with slots.acquire_async():
+                        pass
+
+        asyncio.run(render())
+        with slots.acquire():
+            pass
+
+    @override_settings(OPENSPP_RENDER_SLOT_MEMORY_MB=512)
+    def test_default_slots(self):
+        with mock.patch.object(
+            admission, "get_cpu_count", return_value=8
+        ), mock.patch.object(
+            admission, "get_memory_limit", return_value=2048 * 1024**2
+        ):
+            self.assertEqual(4, admission.get_default_slots())
+        with mock.patch.object(
+            admission, "get_cpu_count", return_value=2
+        ), mock.patch.object(
+            admission, "get_memory_limit", return_value=2048 * 1024**2
+        ):
+            self.assertEqual(2, admission.get_default_slots())
+        with mock.patch.object(
+            admission, "get_cpu_count", return_value=2
+        ), mock.patch.object(admission, "get_memory_limit", return_value=0):
+            self.assertEqual(1, admission.get_default_slots())
@@ -0,0 +1,125 @@
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from card_generator.cards import benchmarks
+from card_generator.utils.tests.test_import_time import get_imports
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    """Accept every other render."""
+
+    count = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        RenderHandler.count += 1
+        self.send_response(200 if RenderHandler.count % 2 else 503)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestBenchmarks(SimpleTestCase):
+    def test_percentile(self):
+        samples = [float(value) for value in range(1, 101)]
+        self.assertEqual(50, benchmarks.percentile(samples, 50))
+        self.assertEqual(95, benchmarks.percentile(samples, 95))
+        self.assertEqual(1, benchmarks.percentile([1.0], 99))
+
+    def test_measure(self):
+        result = benchmarks.measure(lambda: bytearray(1024 * 1024), iterations=5)
+        self.assertEqual(5, result["iterations"])
+        self.assertLessEqual(result["p50"], result["p95"])
+        self.assertGreaterEqual(result["peak_memory"], 1024 * 1024)
+
+    def test_compare(self):
+        baseline = {"render": {"p50": 1.0, "p95": 2.0, "peak_memory": 1000}}
+        results = {"render": {"p50": 1.1, "p95": 3.0, "peak_memory": 1000}}
+        regressions = benchmarks.compare(results, baseline, threshold=0.2)
+        self.assertEqual(1, len(regressions))
+        self.assertIn("render p95", regressions[0])
+
+    def test_benchmark_render_command(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output = os.path.join(temp_dir, "results.json")
+            call_command(
+                "benchmark_render",
+                "-k",
+                "apply_data",
+                "--iterations=2",
+                f"--output={output}",
+                stdout=open(os.devnull, "w"),
+                stderr=open(os.devnull, "w"),
+            )
+            with open(output) as f:
+                results = json.load(f)
+            self.assertEqual(
+                ["apply_data[no_photo]", "apply_data[photo]"], sorted(results)
+            )
+
+            # A baseline ten times faster is a regression
+            for result in results.values():
+                result["p50"] /= 10
+            with open(output, "w") as f:
+                json.dump(results, f)
+            with self.assertRaises(CommandError):
+                call_command(
+                    "benchmark_render",
+                    "-k",
+                    "apply_data",
+                    "--iterations=2",
+                    f"--baseline={output}",
+                    stdout=open(os.devnull, "w"),
+                    stderr=open(os.devnull, "w"),
+                )
+
+    def test_benchmark_merge_command(self):
+        default_cache = caches["default"]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output = os.path.join(temp_dir, "results.json")
+            call_command(
+                "benchmark_merge",
+                "--cards=3",
+                "--latency=0",
+                "--pdf-size=100",
+                f"--output={output}",
+                stdout=open(os.devnull, "w"),
+            )
+            with open(output) as f:
+                results = json.load(f)
+        self.assertEqual("merged", results["3"]["status"])
+        # The benchmark used a cache of its own
+        self.assertIs(default_cache, caches["default"])
+
+    def test_load_test(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), RenderHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        host, port = server.server_address
+
+        result = benchmarks.load_test(
+            f"http://{host}:{port}/render/", {"fields": {}}, "token", 10, 2
+        )
+        self.assertEqual({"200": 5, "503": 5}, result["statuses"])
+        self.assertGreater(result["throughput"], 0)
+        self.assertLessEqual(result["p50"], result["p99"])
+
+    def test_commands_without_test_code(self):
+        commands = ("benchmark_merge", "benchmark_render", "load_test_render")
+        imports = get_imports(
+            "import django; django.setup(); "
+            + "; ".join(
+                f"import card_generator.cards.management.commands.{command}"
+                for command in commands
+            )
+        )
+        self.assertEqual([], [name for *_, name in imports if ".tests" in f".{name}"])
@@ -0,0 +1,53 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase
+
+from card_generator.cards.client import QueueCardsClient
+from card_generator.cards.tests.mixins import OpenSPPClientTestMixin
+
+
+class TestQueueCardsClient(OpenSPPClientTestMixin, TestCase):
+    def setUp(self):
+        patcher = mock.patch("card_generator.cards.client.xmlrpc.client.ServerProxy")
+        self.mock_server_proxy = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.execute_kw = self.mock_server_proxy.return_value.execute_kw
+        self.execute_kw.side_effect = self.server_proxy_execute_kw_side_effects
+        self.mock_server_proxy.return_value.authenticate.return_value = (
+            self.login_user_uid
+        )
+        self.client = QueueCardsClient(
+            server_root=settings.OPENSPP_SERVER_ROOT,
+            username=settings.OPENSPP_USERNAME,
+            password=settings.OPENSPP_API_TOKEN,
+            db_name=settings.OPENSPP_DB_NAME,
+        )
+
+    def get_called_methods(self):
+        return [call.args[4] for call in self.execute_kw.call_args_list]
+
+    def test_update_queue_batch_record_selected_fields(self):
+        self.client.update_queue_batch_record(
+            batch_id=5, data={"merge_status": "merged"}, fields=["merge_status"]
+        )
+        self.assertEqual(["fields_get", "write", "read"], self.get_called_methods())
+        write_call, read_call = self.execute_kw.call_args_list[1:]
+        # The update values are not sent back as read parameters
+        self.assertEqual({}, write_call.args[6])
+        self.assertEqual({"fields": ["merge_status"]}, read_call.args[6])
+
+    def test_update_queue_batch_record_without_read(self):
+        result = self.client.update_queue_batch_record(
+            batch_id=5, data={"merge_status": "merged"}, fields=[]
+        )
+        self.assertTrue(result)
+        self.assertEqual(["fields_get", "write"], self.get_called_methods())
+
+    def test_fields_are_fetched_once_per_model(self):
+        self.client.get_queue_batch(5)
+        fields_get_count = self.get_called_methods().count("fields_get")
+        self.client.get_queue_batch(5)
+        self.assertEqual(
+            fields_get_count, self.get_called_methods().count("fields_get")
+        )
@@ -0,0 +1,167 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files import File
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from PyPDF2 import PdfReader
+
+from card_generator.cards.models import Card
+from card_generator.cards.tests.mixins import SAMPLE_PDF, fake_convert_svgs
+
+FRONT_SVG_FILE = "card_generator/cards/samples/front_card.svg"
+BACK_SVG_FILE = "card_generator/cards/samples/back_card.svg"
+
+
+@mock.patch("card_generator.cards.pdf.convert_svgs", side_effect=fake_convert_svgs)
+class TestRenderCardsCommand(TestCase):
+    def setUp(self):
+        self.card = Card(title="Sample Title")
+        with open(FRONT_SVG_FILE, "rb") as front_svg, open(
+            BACK_SVG_FILE, "rb"
+        ) as back_svg:
+            self.card.front_svg.save("front_card.svg", File(front_svg), save=False)
+            self.card.back_svg.save("back_card.svg", File(back_svg), save=False)
+        self.card.save()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.output_dir = os.path.join(self.temp_dir, "output")
+
+    def write_records(self, records: list, extension: str = "jsonl") -> str:
+        input_file = os.path.join(self.temp_dir, f"records.{extension}")
+        with open(input_file, "w") as f:
+            if extension == "csv":
+                f.write("name,id\n")
+                f.writelines(f"{record['name']},{record['id']}\n" for record in records)
+            else:
+                f.writelines(f"{json.dumps(record)}\n" for record in records)
+        return input_file
+
+    def render_cards(self, input_file: str, *args):
+        call_command(
+            "render_cards",
+            str(self.card.uuid),
+            input_file,
+            self.output_dir,
+            "--workers=1",
+            *args,
+            stdout=open(os.devnull, "w"),
+        )
+
+    def test_render_cards_pdf(self, mock_convert_svgs):
+        records = [{"name": f"Name {index}", "id": f"id-{index}"} for index in range(3)]
+        self.render_cards(self.write_records(records, "csv"), "--name-field=id")
+        self.assertEqual(
+            ["id-0.pdf", "id-1.pdf", "id-2.pdf"], sorted(os.listdir(self.output_dir))
+        )
+
+    def test_render_cards_png(self, mock_convert_svgs):
+        self.render_cards(self.write_records([{"name": "Name"}]), "--format=png")
+        self.assertEqual(
+            ["00000000_0.png", "00000000_1.png"], sorted(os.listdir(self.output_dir))
+        )
+
+    def test_render_cards_resume(self, mock_convert_svgs):
+        input_file = self.write_records(
+            [{"name": f"Name {index}"} for index in range(3)]
+        )
+        self.render_cards(input_file)
+        os.remove(os.path.join(self.output_dir, "00000001.pdf"))
+        mock_convert_svgs.reset_mock()
+
+        self.render_cards(input_file)
+        self.assertEqual(1, mock_convert_svgs.call_count)
+        self.assertEqual(3, len(os.listdir(self.output_dir)))
+
+    def test_render_cards_merged_imposed(self, mock_convert_svgs):
+        input_file = self.write_records(
+            [{"name": f"Name {index}"} for index in range(12)]
+        )
+        self.render_cards(input_file, "--format=merged", "--impose")
+        self.assertEqual(["merged.pdf"], os.listdir(self.output_dir))
+        reader = PdfReader(os.path.join(self.output_dir, "merged.pdf"))
+        self.assertEqual(2, len(reader.pages))
+
+    def test_render_cards_merged_chunks(self, mock_convert_svgs):
+        input_file = self.write_records(
+            [{"name": f"Name {index}"} for index in range(5)]
+        )
+        pages = len(PdfReader(SAMPLE_PDF).pages)
+
+        def fail_last_card(
+            svg_files, output_filename, output_format, fonts_config=None
+        ):
+            if "00000004" in output_filename:
+                raise ValueError("Render failed")
+            fake_convert_svgs(svg_files, output_filename, output_format)
+
+        mock_convert_svgs.side_effect = fail_last_card
+        with self.assertRaises(CommandError):
+            self.render_cards(input_file, "--format=merged", "--chunk-size=2")
+        # The complete chunks are merged, and only the failed card is left to render
+        self.assertEqual(
+            ["chunk_00000000.pdf", "chunk_00000001.pdf"],
+            sorted(os.listdir(os.path.join(self.output_dir, "parts"))),
+        )
+
+        mock_convert_svgs.reset_mock()
+        mock_convert_svgs.side_effect = fake_convert_svgs
+        self.render_cards(input_file, "--format=merged", "--chunk-size=2")
+        self.assertEqual(1, mock_convert_svgs.call_count)
+        self.assertEqual(["merged.pdf"], os.listdir(self.output_dir))
+        reader = PdfReader(os.path.join(self.output_dir, "merged.pdf"))
+        self.assertEqual(5 * pages, len(reader.pages))
+
+    def test_render_cards_merged_imposed_chunks(self, mock_convert_svgs):
+        input_file = self.write_records(
+            [{"name": f"Name {index}"} for index in range(6)]
+        )
+        # The chunks of 3 cards are rounded to full sheets of 2 cards
+        self.render_cards(
+            input_file,
+            "--format=merged",
+            "--impose",
+            "--columns=1",
+            "--rows=2",
+            "--chunk-size=3",
+        )
+        reader = PdfReader(os.path.join(self.output_dir, "merged.pdf"))
+        self.assertEqual(3, len(reader.pages))
+
+    def test_render_cards_merged_cards_per_file(self, mock_convert_svgs):
+        input_file = self.write_records(
+            [{"name": f"Name {index}"} for index in range(5)]
+        )
+        self.render_cards(
+            input_file, "--format=merged", "--chunk-size=2", "--cards-per-file=3"
+        )
+        # The files have whole chunks
+        self.assertEqual(
+            ["merged_00000000.pdf", "merged_00000001.pdf"],
+            sorted(os.listdir(self.output_dir)),
+        )
+        self.assertEqual(
+            [4, 1],
+            [
+                len(PdfReader(os.path.join(self.output_dir, name)).pages)
+                for name in ("merged_00000000.pdf", "merged_00000001.pdf")
+            ],
+        )
+
+    def test_render_cards_duplex_front_only(self, mock_convert_svgs):
+        input_file = self.write_records([{"name": "Name"}])
+        with self.assertRaises(CommandError):
+            self.render_cards(input_file, "--impose", "--duplex", "--front-only")
+        mock_convert_svgs.assert_not_called()
+
+    def test_render_cards_unknown_card(self, mock_convert_svgs):
+        with self.assertRaises(CommandError):
+            call_command(
+                "render_cards",
+                "00000000-0000-0000-0000-000000000000",
+                self.write_records([]),
+                self.output_dir,
+            )
@@ -0,0 +1,40 @@
+import base64
+import io
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from PyPDF2 import PdfReader
+
+from card_generator.cards.client import QueueCardsClient
+from card_generator.cards.fake_openspp import FakeOpenSPP, FakeOpenSPPServer
+from card_generator.tasks.cards import perform_merging
+
+
+class TestFakeOpenSPP(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fake_openspp = FakeOpenSPP({5: 12, 6: 3}, pdf_size=1000)
+        server = FakeOpenSPPServer(self.fake_openspp)
+        server.start(in_process=True)
+        self.addCleanup(server.stop)
+        self.client = QueueCardsClient(
+            server_root=server.server_root,
+            username="admin",
+            password="password",
+            db_name="devel",
+        )
+
+    def test_get_queue_batch(self):
+        batch = self.client.get_queue_batch(6)
+        self.assertEqual([13, 14, 15], batch["queued_ids"])
+        self.assertIsNone(self.client.get_queue_batch(7))
+
+    @override_settings(OPENSPP_MERGE_CHUNK_SIZE=5)
+    def test_perform_merging(self):
+        self.assertEqual("merged", perform_merging(self.client, 5))
+
+        batch = self.fake_openspp.batches[5]
+        self.assertEqual("merged", batch["merge_status"])
+        merged_pdf = PdfReader(io.BytesIO(base64.b64decode(batch["id_pdf"])))
+        self.assertEqual(12, len(merged_pdf.pages))
+        self.assertGreater(self.client.transfer_stats.round_trips, 0)
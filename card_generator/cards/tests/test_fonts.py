@@ -0,0 +1,165 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from card_generator.cards import fonts
+from card_generator.cards.models import Card
+from card_generator.cards.pdf import CardRender
+
+TEMPLATE = """<svg xmlns="http://www.w3.org/2000/svg">
+  <text font-family="Sample Sans, sans-serif">ID {{ name }}</text>
+  <text style="font-size:8px;font-family:'Sample Sans'">Card</text>
+</svg>
+"""
+
+
+def build_font(path: str, family: str = "Sample Sans") -> None:
+    from fontTools.fontBuilder import FontBuilder
+    from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+    characters = "ACDIabcdrxyz"
+    glyph_order = [".notdef", *characters]
+    pen = TTGlyphPen(None)
+    pen.moveTo((0, 0))
+    pen.lineTo((0, 500))
+    pen.lineTo((500, 500))
+    pen.closePath()
+    glyph = pen.glyph()
+
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(glyph_order)
+    builder.setupCharacterMap({ord(character): character for character in characters})
+    builder.setupGlyf({name: glyph for name in glyph_order})
+    builder.setupHorizontalMetrics({name: (500, 0) for name in glyph_order})
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupNameTable({"familyName": family, "styleName": "Regular"})
+    builder.setupOS2()
+    builder.setupPost()
+    builder.save(path)
+
+
+class TestFontFamilies(SimpleTestCase):
+    def test_get_font_families(self):
+        self.assertEqual({"Sample Sans"}, fonts.get_font_families(TEMPLATE))
+        self.assertEqual(
+            {"Serif Font"},
+            fonts.get_font_families(
+                '<text style="font-family:&quot;Serif Font&quot;">'
+            ),
+        )
+
+    def test_get_template_text(self):
+        self.assertEqual(set("IDCard"), fonts.get_template_text(TEMPLATE))
+
+    def test_replace_font_families(self):
+        replaced = fonts.replace_font_families(TEMPLATE, {"Sample Sans": "card-1234"})
+        self.assertIn('font-family="card-1234, Sample Sans, sans-serif"', replaced)
+        self.assertIn("font-family:card-1234, 'Sample Sans'", replaced)
+        self.assertEqual(
+            'font-family="Other"',
+            fonts.replace_font_families(
+                'font-family="Other"', {"Sample Sans": "card-1234"}
+            ),
+        )
+
+
+class TestCardFonts(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.font_file = os.path.join(self.temp_dir.name, "sample.ttf")
+        build_font(self.font_file)
+        self.fonts_dir = os.path.join(self.temp_dir.name, "fonts")
+        settings_override = override_settings(
+            OPENSPP_FONT_SUBSETTING=True,
+            OPENSPP_FONTS_DIR=self.fonts_dir,
+            OPENSPP_FONT_CHARSET="xyz",
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = mock.patch.object(
+            fonts,
+            "resolve_font",
+            side_effect=lambda family: (self.font_file, 0)
+            if family == "Sample Sans"
+            else None,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        fonts._get_fonts.cache_clear()
+        self.addCleanup(fonts._get_fonts.cache_clear)
+        self.card = Card.objects.create(
+            title="Sample Title",
+            front_svg=SimpleUploadedFile("front_card.svg", TEMPLATE.encode("utf-8")),
+            back_svg=SimpleUploadedFile("back_card.svg", TEMPLATE.encode("utf-8")),
+        )
+
+    def test_subset(self):
+        from fontTools.ttLib import TTFont
+
+        card_fonts = fonts.get_card_fonts(self.card)
+
+        subset_family = card_fonts["families"]["Sample Sans"]
+        self.assertTrue(subset_family.startswith("card-"))
+        self.assertTrue(card_fonts["config"].startswith(self.fonts_dir))
+        with open(card_fonts["config"]) as config:
+            self.assertIn("<include ignore_missing", config.read())
+        subset_file = os.path.join(
+            os.path.dirname(card_fonts["config"]), f"{subset_family}.ttf"
+        )
+        font = TTFont(subset_file)
+        # The static text of the templates and the charset, not the other glyphs of the font
+        self.assertEqual(set("CDIadrxyz"), {chr(code) for code in font.getBestCmap()})
+        self.assertEqual(subset_family, font["name"].getDebugName(1))
+        self.assertLess(os.path.getsize(subset_file), os.path.getsize(self.font_file))
+
+    def test_templates(self):
+        card_fonts = fonts.get_card_fonts(self.card)
+        subset_family = card_fonts["families"]["Sample Sans"]
+        card_render = CardRender(
+            self.card, {"name": "font-family:'Sample Sans'"}, create_qr_code=False
+        )
+        card_render.create_svg()
+
+        template = card_fonts["templates"][self.card.get_render_path("front")]
+        self.assertEqual(template, card_render.front_svg_path)
+        with open(card_render.svg_files[0]) as svg_file:
+            content = svg_file.read()
+        self.assertIn(
+            f'font-family="{subset_family}, Sample Sans, sans-serif"', content
+        )
+        # The values of the fields are kept as is
+        self.assertIn("ID font-family:'Sample Sans'</text>", content)
+
+    def test_subset_cache(self):
+        card_fonts = fonts.get_card_fonts(self.card)
+        with mock.patch.object(fonts, "subset_font") as subset_font:
+            self.assertEqual(card_fonts, fonts.get_card_fonts(self.card))
+            fonts._get_fonts.cache_clear()
+            # The subsets on disk are shared by the processes
+            self.assertEqual(card_fonts, fonts.get_card_fonts(self.card))
+        subset_font.assert_not_called()
+
+    def test_font_not_resolved(self):
+        card = Card.objects.create(
+            title="Sample Title",
+            front_svg=SimpleUploadedFile(
+                "front_card.svg", b'<svg font-family="Other"/>'
+            ),
+            back_svg=SimpleUploadedFile("back_card.svg", b'<svg font-family="Other"/>'),
+        )
+        self.assertIsNone(fonts.get_card_fonts(card))
+
+    def test_subset_error(self):
+        with mock.patch.object(
+            fonts, "subset_font", side_effect=ValueError("Invalid font")
+        ):
+            with self.assertLogs("card_generator.cards.fonts", level="ERROR"):
+                self.assertIsNone(fonts.get_card_fonts(self.card))
+
+    @override_settings(OPENSPP_FONT_SUBSETTING=False)
+    def test_subsetting_disabled(self):
+        self.assertIsNone(fonts.get_card_fonts(self.card))
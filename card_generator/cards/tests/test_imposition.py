@@ -0,0 +1,57 @@
+import tempfile
+
+from django.test import TestCase
+from PyPDF2 import PdfReader
+
+from card_generator.cards.imposition import SHEET_SIZES, ImpositionLayout, impose_pdf
+from card_generator.cards.tests.mixins import SAMPLE_PDF
+from card_generator.tasks.cards import merge_pdf
+
+
+class TestImposition(TestCase):
+    def impose(self, pages: int, layout: ImpositionLayout) -> PdfReader:
+        temp_dir = tempfile.mkdtemp()
+        merged_pdf = merge_pdf([SAMPLE_PDF] * pages, temp_dir)
+        return PdfReader(impose_pdf(merged_pdf, f"{temp_dir}/imposed.pdf", layout))
+
+    def test_impose_pdf(self):
+        reader = self.impose(12, ImpositionLayout(sheet="a4", columns=2, rows=5))
+        self.assertEqual(2, len(reader.pages))
+        width, height = SHEET_SIZES["a4"]
+        self.assertAlmostEqual(width, float(reader.pages[0].mediabox.width), places=1)
+        self.assertAlmostEqual(height, float(reader.pages[0].mediabox.height), places=1)
+        # The cards are placed as form XObjects, not rasterized
+        xobjects = reader.pages[0]["/Resources"]["/XObject"]
+        self.assertEqual(10, len(xobjects))
+        self.assertEqual("/Form", xobjects["/Card0"]["/Subtype"])
+        self.assertEqual(2, len(reader.pages[1]["/Resources"]["/XObject"]))
+
+    def test_impose_pdf_duplex(self):
+        layout = ImpositionLayout(columns=2, rows=5, duplex=True)
+        reader = self.impose(24, layout)
+        # 12 fronts and 12 backs, each on their own sheets
+        self.assertEqual(4, len(reader.pages))
+
+        front_x, _ = layout.get_cell(0)
+        back_x, _ = layout.get_cell(0, mirrored=True)
+        self.assertEqual(layout.get_cell(1)[0], back_x)
+        self.assertAlmostEqual(layout.sheet_width, front_x + back_x + layout.card_width)
+
+    def test_impose_pdf_duplex_unpaired_pages(self):
+        with self.assertRaisesRegex(ValueError, "front and a back page"):
+            self.impose(3, ImpositionLayout(duplex=True))
+
+    def test_crop_marks_outside_cards(self):
+        layout = ImpositionLayout(columns=2, rows=5)
+        for x1, y1, x2, y2 in layout.get_crop_marks():
+            for x, y in ((x1, y1), (x2, y2)):
+                self.assertTrue(
+                    x < layout.margin_x
+                    or x > layout.sheet_width - layout.margin_x
+                    or y < layout.margin_y
+                    or y > layout.sheet_height - layout.margin_y
+                )
+
+    def test_layout_does_not_fit(self):
+        with self.assertRaises(ValueError):
+            ImpositionLayout(sheet="a4", columns=3, rows=5)
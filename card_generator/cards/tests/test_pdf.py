@@ -0,0 +1,55 @@
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from card_generator.cards.benchmarks import get_sample_card, get_sample_fields
+from card_generator.cards.pdf import CardRender
+from card_generator.cards.signals import card_rendered
+from card_generator.cards.tests.mixins import fake_convert_svgs
+
+
+@mock.patch("card_generator.cards.pdf.convert_svgs", side_effect=fake_convert_svgs)
+class TestCardRenderTimings(SimpleTestCase):
+    def test_render_stage_timings(self, mock_convert_svgs):
+        receiver = mock.Mock()
+        card_rendered.connect(receiver)
+        self.addCleanup(card_rendered.disconnect, receiver)
+
+        card_render = CardRender(
+            get_sample_card(), get_sample_fields(with_photo=True), create_qr_code=True
+        )
+        with self.assertLogs("card_generator.cards.pdf", level="INFO") as logs:
+            card_render.render()
+
+        timings = card_render.timer.as_dict()
+        self.assertEqual(
+            {
+                "template_load",
+                "jinja_render",
+                "xml_substitution",
+                "qr_generation",
+                "svg_write",
+                "pdf_conversion",
+                "png_conversion",
+                "base64_encoding",
+            },
+            set(timings),
+        )
+        self.assertEqual(2, len(card_render.timer.durations["png_conversion"]))
+        self.assertEqual(timings, logs.records[-1].timings)
+        receiver.assert_called_once_with(
+            signal=card_rendered,
+            sender=CardRender,
+            card=card_render.card,
+            timer=card_render.timer,
+        )
+
+    def test_render_files_stage_timings(self, mock_convert_svgs):
+        card_render = CardRender(
+            get_sample_card(), get_sample_fields(with_photo=False), create_qr_code=True
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            card_render.render_files(temp_dir, "card", formats=("pdf",))
+        self.assertNotIn("base64_encoding", card_render.timer.as_dict())
+        self.assertIn("pdf_conversion", card_render.timer.as_dict())
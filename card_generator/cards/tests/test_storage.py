@@ -0,0 +1,135 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from card_generator.cards.models import Card, CardTemplateVersion
+from card_generator.cards.pdf import CardRender
+from card_generator.cards.storage import get_local_path
+
+FRONT_SVG = b'<svg xmlns="http://www.w3.org/2000/svg"><text>{{ name }}</text></svg>'
+BACK_SVG = b'<svg xmlns="http://www.w3.org/2000/svg"><text data-variable="id"/></svg>'
+
+
+class RemoteStorage(Storage):
+    """Storage without local paths, like S3, keeping the files in memory."""
+
+    def __init__(self):
+        self.files = {}
+        self.opened = []
+
+    def _open(self, name, mode="rb"):
+        self.opened.append(name)
+        return ContentFile(self.files[name], name=name)
+
+    def _save(self, name, content):
+        self.files[name] = content.read()
+        return name
+
+    def exists(self, name):
+        return name in self.files
+
+    def url(self, name):
+        return f"https://bucket.example.com/{name}"
+
+
+class TestTemplateStorage(TestCase):
+    def setUp(self):
+        self.storage = RemoteStorage()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        settings_override = override_settings(
+            OPENSPP_SVG_OPTIMIZATION=False,
+            OPENSPP_TEMPLATE_STORAGE_CACHE_DIR=self.cache_dir.name,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for model in (Card, CardTemplateVersion):
+            for field in ("front_svg", "back_svg"):
+                patcher = mock.patch.object(
+                    model._meta.get_field(field), "storage", self.storage
+                )
+                patcher.start()
+                self.addCleanup(patcher.stop)
+        self.card = Card.objects.create(
+            title="Sample Title",
+            front_svg=SimpleUploadedFile("front_card.svg", FRONT_SVG),
+            back_svg=SimpleUploadedFile("back_card.svg", BACK_SVG),
+        )
+
+    def test_read_through_cache(self):
+        version = self.card.current_version
+        self.storage.opened.clear()
+
+        card_render = CardRender(self.card, {}, create_qr_code=False)
+        self.assertEqual(
+            os.path.join(self.cache_dir.name, version.front_svg.name),
+            card_render.front_svg_path,
+        )
+        with open(card_render.front_svg_path, "rb") as f:
+            self.assertEqual(FRONT_SVG, f.read())
+        self.assertEqual(
+            [{"tag": "text", "name": "name"}, {"tag": "text", "name": "id"}],
+            self.card.get_fields(),
+        )
+        CardRender(self.card, {}, create_qr_code=False)
+
+        # Each template is fetched once from the storage
+        self.assertEqual(
+            sorted([version.front_svg.name, version.back_svg.name]),
+            sorted(self.storage.opened),
+        )
+
+    def test_local_storage(self):
+        with tempfile.TemporaryDirectory() as location:
+            storage = FileSystemStorage(location=location)
+            name = storage.save("front_card.svg", ContentFile(FRONT_SVG))
+            card = Card(front_svg=name)
+            card.front_svg.storage = storage
+            self.assertEqual(
+                os.path.join(location, name), get_local_path(card.front_svg)
+            )
+        self.assertEqual([], os.listdir(self.cache_dir.name))
+
+    def test_s3_storage(self):
+        storage = S3Boto3Storage(
+            bucket_name="cards",
+            access_key="access-key",
+            secret_key="secret-key",
+            region_name="us-east-1",
+            use_threads=False,
+        )
+        name = "cards/versions/front.svg"
+        card = Card(front_svg=name)
+        card.front_svg.storage = storage
+        expected_params = {"Bucket": "cards", "Key": name}
+        head = {"ContentLength": len(FRONT_SVG), "ETag": '"front"'}
+        with Stubber(storage.connection.meta.client) as stubber:
+            # S3Boto3StorageFile checks the object exists, then it is downloaded
+            stubber.add_response("head_object", head, expected_params)
+            stubber.add_response("head_object", head, expected_params)
+            stubber.add_response(
+                "get_object",
+                {
+                    "Body": StreamingBody(io.BytesIO(FRONT_SVG), len(FRONT_SVG)),
+                    "ContentLength": len(FRONT_SVG),
+                },
+                expected_params,
+            )
+            path = get_local_path(card.front_svg)
+            stubber.assert_no_pending_responses()
+
+            # The next reads hit the disk cache, the stubber would reject a request
+            self.assertEqual(path, get_local_path(card.front_svg))
+
+        self.assertEqual(os.path.join(self.cache_dir.name, name), path)
+        with open(path, "rb") as f:
+            self.assertEqual(FRONT_SVG, f.read())
@@ -0,0 +1,183 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from jinja2 import Template
+
+from card_generator.cards.exceptions import SVGOptimizationException
+from card_generator.cards.models import Card
+from card_generator.cards.pdf import CardRender
+from card_generator.cards.svg import optimize_svg
+
+FRONT_SVG_FILE = "card_generator/cards/samples/front_card.svg"
+BACK_SVG_FILE = "card_generator/cards/samples/back_card.svg"
+
+EDITOR_SVG = b"""<?xml version="1.0" encoding="UTF-8"?>
+<!-- Created with Inkscape -->
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"
+     xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+     xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd"
+     width="100" height="60">
+  <metadata><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"/></metadata>
+  <sodipodi:namedview inkscape:zoom="1.5"/>
+  <defs>
+    <linearGradient id="blue"><stop offset="0" stop-color="#00f"/></linearGradient>
+    <linearGradient id="blue-copy"><stop offset="0" stop-color="#00f"/></linearGradient>
+    <linearGradient id="unused"><stop offset="0" stop-color="#f00"/></linearGradient>
+  </defs>
+  <g id="layer1" inkscape:label="Layer 1">
+    <title>Layer 1</title>
+    <rect fill="url(#blue-copy)" width="10.123456" height="10"/>
+    <path d="m1.2345678,2.0001.5 l-0.00001,3"/>
+    {% if photo %}<image data-variable="photo" xlink:href="{{ photo }}"/>{% endif %}
+    <text xml:space="preserve"> {{ name }} </text>
+  </g>
+</svg>
+"""
+
+
+JINJA_SVG = b"""<svg xmlns="http://www.w3.org/2000/svg">
+  <defs>
+    <linearGradient id="blue"><stop offset="0" stop-color="#00f"/></linearGradient>
+    <linearGradient id="red"><stop offset="0" stop-color="#f00"/></linearGradient>
+  </defs>
+  <g>
+    <rect fill="url(#{{ color }})" data-label='{{ nickname|default("n/a") }}'/>
+    <text>{% if age > 18 %}Adult{% elif age < 3 and name %}Infant {{ "&amp;" }} {{ name }}{% endif %}</text>
+    {# Age & name < 3 #}
+  </g>
+</svg>
+"""
+
+
+class TestOptimizeSVG(SimpleTestCase):
+    def setUp(self):
+        self.optimized = optimize_svg(EDITOR_SVG).decode("utf-8")
+
+    def test_strip_metadata(self):
+        for removed in ("Inkscape", "inkscape", "sodipodi", "metadata", "<title>"):
+            self.assertNotIn(removed, self.optimized)
+
+    def test_dedupe_definitions(self):
+        self.assertIn('<linearGradient id="blue">', self.optimized)
+        self.assertIn('fill="url(#blue)"', self.optimized)
+        self.assertNotIn("blue-copy", self.optimized)
+        self.assertNotIn("unused", self.optimized)
+
+    def test_collapse_groups(self):
+        self.assertNotIn("<g", self.optimized)
+        self.assertIn(
+            '{% if photo %}<image data-variable="photo" xlink:href="{{ photo }}"/>'
+            "{% endif %}",
+            self.optimized,
+        )
+
+    def test_round_coordinates(self):
+        self.assertIn('d="m1.235,2.0.5 l0,3"', self.optimized)
+        self.assertEqual(
+            b'<svg><path d="M.5,-.25 1,0"/></svg>',
+            optimize_svg(b'<svg><path d="M0.5,-0.25 1.0004,-0.0001"/></svg>'),
+        )
+        # Only the coordinates of the paths are rounded
+        self.assertIn('width="10.123456"', self.optimized)
+
+    def test_strip_whitespace(self):
+        self.assertNotIn("\n", self.optimized)
+        self.assertIn('<text xml:space="preserve"> {{ name }} </text>', self.optimized)
+
+    def test_jinja_code_kept(self):
+        contexts = [
+            {"age": 20, "name": "Ana", "color": "blue"},
+            {"age": 2, "name": "Bo", "nickname": "B", "color": "red"},
+        ]
+        optimized = optimize_svg(JINJA_SVG).decode("utf-8")
+
+        self.assertIn("{% if age > 18 %}", optimized)
+        self.assertIn('{{ nickname|default("n/a") }}', optimized)
+        self.assertIn('{{ "&amp;" }}', optimized)
+        for context in contexts:
+            # The renders of the optimized template and of the original are the same SVG
+            rendered = Template(optimized).render(context).encode("utf-8")
+            original = Template(JINJA_SVG.decode("utf-8")).render(context)
+            self.assertEqual(
+                optimize_svg(original.encode("utf-8")), optimize_svg(rendered)
+            )
+
+    def test_dynamic_references(self):
+        optimized = optimize_svg(JINJA_SVG).decode("utf-8")
+        self.assertIn('<linearGradient id="blue">', optimized)
+        self.assertIn('<linearGradient id="red">', optimized)
+        self.assertIn('fill="url(#{{ color }})"', optimized)
+
+    def test_style_selectors(self):
+        optimized = optimize_svg(
+            b"""<svg xmlns="http://www.w3.org/2000/svg">
+  <style>#logo { fill: #00f; } #shade stop { stop-color: #f00; }</style>
+  <defs>
+    <linearGradient id="shade"><stop offset="0"/></linearGradient>
+    <linearGradient id="shade-copy"><stop offset="0"/></linearGradient>
+  </defs>
+  <g id="logo"><rect width="10" height="10" fill="url(#shade-copy)"/></g>
+</svg>"""
+        ).decode("utf-8")
+        # The IDs selected by the styles are kept
+        self.assertIn('<g id="logo">', optimized)
+        self.assertIn('<linearGradient id="shade">', optimized)
+        self.assertIn('fill="url(#shade-copy)"', optimized)
+
+    def test_invalid_xml(self):
+        with self.assertRaises(SVGOptimizationException):
+            optimize_svg(b'<svg {% if dark %}fill="#000"{% endif %}></svg>')
+
+
+class TestCardTemplateOptimization(TestCase):
+    def create_card(self, front_svg: bytes) -> Card:
+        with open(BACK_SVG_FILE, "rb") as back_svg:
+            return Card.objects.create(
+                title="Sample Title",
+                front_svg=SimpleUploadedFile("front_card.svg", front_svg),
+                back_svg=SimpleUploadedFile("back_card.svg", back_svg.read()),
+            )
+
+    def test_upload(self):
+        with open(FRONT_SVG_FILE, "rb") as front_svg:
+            card = self.create_card(front_svg.read())
+
+        card.refresh_from_db()
+        version = card.current_version
+        self.assertTrue(version.front_svg_optimized.name.startswith("cards/versions/"))
+        self.assertLess(version.front_svg_optimized.size, card.front_svg.size)
+        self.assertLess(version.back_svg_optimized.size, card.back_svg.size)
+        card_render = CardRender(card, {}, create_qr_code=False)
+        self.assertEqual(version.front_svg_optimized.path, card_render.front_svg_path)
+        self.assertEqual(version.back_svg_optimized.path, card_render.back_svg_path)
+
+    def test_upload_invalid_xml(self):
+        with self.assertLogs("card_generator.cards.models", level="WARNING"):
+            card = self.create_card(
+                b"<svg>{% if dark %}<g fill='#000'>{% endif %}</svg>"
+            )
+
+        self.assertFalse(card.current_version.front_svg_optimized)
+        self.assertTrue(card.current_version.back_svg_optimized)
+        self.assertEqual(
+            card.current_version.front_svg.path, card.get_render_svg("front").path
+        )
+
+    @override_settings(OPENSPP_SVG_OPTIMIZATION=False)
+    def test_upload_optimization_disabled(self):
+        with open(FRONT_SVG_FILE, "rb") as front_svg:
+            card = self.create_card(front_svg.read())
+        self.assertFalse(card.current_version.front_svg_optimized)
+        self.assertFalse(card.current_version.back_svg_optimized)
+
+    @override_settings(OPENSPP_SVG_OPTIMIZATION=False)
+    def test_optimize_card_templates_command(self):
+        with open(FRONT_SVG_FILE, "rb") as front_svg:
+            card = self.create_card(front_svg.read())
+
+        with self.settings(OPENSPP_SVG_OPTIMIZATION=True):
+            call_command("optimize_card_templates", card=str(card.uuid))
+        card.refresh_from_db()
+        self.assertTrue(card.current_version.front_svg_optimized)
+        self.assertTrue(card.current_version.back_svg_optimized)
+        self.assertEqual(2, card.versions.count())
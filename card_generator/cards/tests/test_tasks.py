@@ -1,14 +1,34 @@
+import os
+import tempfile
 from unittest import mock
 
 from django.conf import settings
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from PyPDF2 import PdfReader
 
 from card_generator.cards.client import QueueCardsClient
-from card_generator.cards.tests.mixins import OpenSPPClientTestMixin
-from card_generator.tasks.cards import perform_merging
+from card_generator.cards.tests.mixins import SAMPLE_PDF, OpenSPPClientTestMixin
+from card_generator.tasks.cards import merge_cards, merge_pdf, perform_merging
+from card_generator.tasks.checkpoints import MergeCheckpoint
+from card_generator.tasks.queues import get_merge_queue
+from card_generator.tasks.registry import (
+    claim_merge_task,
+    get_merge_task,
+    register_merge_task,
+)
+from card_generator.tasks.status import MergeProgress, get_merge_status
 
 
 class TestMergeCardTask(OpenSPPClientTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_dir.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=self.media_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
     @mock.patch("card_generator.cards.client.QueueCardsClient.login")
     @mock.patch(
         "card_generator.cards.client.QueueCardsClient.update_queue_batch_record"
@@ -35,7 +55,50 @@ class TestMergeCardTask(OpenSPPClientTestMixin, TestCase):
             password=settings.OPENSPP_API_TOKEN,
             db_name=settings.OPENSPP_DB_NAME,
         )
-        perform_merging(client, 1)
+        progress = MergeProgress(1, "merge-task")
+        perform_merging(client, 1, progress=progress)
+
+        merge_progress = get_merge_status(1)["progress"]
+        self.assertEqual(4, merge_progress["records_total"])
+        self.assertEqual(4, merge_progress["records_fetched"])
+        self.assertEqual(2, merge_progress["pages_merged"])
+        self.assertTrue(merge_progress["chunk_bytes"])
+        self.assertTrue(merge_progress["result_bytes"])
+        self.assertEqual(0, merge_progress["eta"])
+
+    @override_settings(OPENSPP_MERGE_CHUNK_SIZE=2)
+    @mock.patch("card_generator.cards.client.QueueCardsClient.login")
+    @mock.patch(
+        "card_generator.cards.client.QueueCardsClient.update_queue_batch_record"
+    )
+    @mock.patch("card_generator.cards.client.QueueCardsClient.get_id_queue_pdfs")
+    @mock.patch("card_generator.cards.client.QueueCardsClient.get_queue_batch")
+    def test_merge_card_progress_chunk_without_cards(
+        self,
+        mock_get_queue_batch,
+        mock_get_id_queue_pdfs,
+        mock_update_queue_batch_record,
+        mock_login,
+    ):
+        mock_login.return_value = 1
+        mock_get_queue_batch.return_value = self.sample_queue_batch
+        mock_get_id_queue_pdfs.side_effect = [[], [self.sample_id_queue]]
+        mock_update_queue_batch_record.return_value = [self.sample_queue_batch]
+        client = QueueCardsClient(
+            server_root=settings.OPENSPP_SERVER_ROOT,
+            username=settings.OPENSPP_USERNAME,
+            password=settings.OPENSPP_API_TOKEN,
+            db_name=settings.OPENSPP_DB_NAME,
+        )
+        progress = MergeProgress(1, "merge-task")
+        perform_merging(client, 1, progress=progress)
+
+        merge_progress = get_merge_status(1)["progress"]
+        self.assertEqual(4, merge_progress["records_fetched"])
+        self.assertEqual(1, merge_progress["pages_merged"])
+        self.assertEqual(0, merge_progress["eta"])
+        self.assertTrue(merge_progress["chunk_bytes"])
+        self.assertTrue(merge_progress["result_bytes"])
 
     @mock.patch("card_generator.cards.client.QueueCardsClient.login")
     @mock.patch("card_generator.cards.client.logger")
@@ -70,3 +133,199 @@ class TestMergeCardTask(OpenSPPClientTestMixin, TestCase):
         )
         perform_merging(client, 1)
         mock_logger.info.assert_called_with("Batch ID 1 has an empty record.")
+
+    @override_settings(OPENSPP_MERGE_CHUNK_SIZE=2)
+    @mock.patch("card_generator.cards.client.QueueCardsClient.login")
+    @mock.patch(
+        "card_generator.cards.client.QueueCardsClient.update_queue_batch_record"
+    )
+    @mock.patch("card_generator.cards.client.QueueCardsClient.get_id_queue_pdfs")
+    @mock.patch("card_generator.cards.client.QueueCardsClient.get_queue_batch")
+    def test_merge_card_resume_from_checkpoint(
+        self,
+        mock_get_queue_batch,
+        mock_get_id_queue_pdfs,
+        mock_update_queue_batch_record,
+        mock_login,
+    ):
+        mock_login.return_value = 1
+        mock_get_queue_batch.return_value = self.sample_queue_batch
+        mock_get_id_queue_pdfs.return_value = [self.sample_id_queue]
+        mock_update_queue_batch_record.side_effect = [
+            Exception("Connection lost"),
+            [self.sample_queue_batch],
+        ]
+        client = QueueCardsClient(
+            server_root=settings.OPENSPP_SERVER_ROOT,
+            username=settings.OPENSPP_USERNAME,
+            password=settings.OPENSPP_API_TOKEN,
+            db_name=settings.OPENSPP_DB_NAME,
+        )
+        with self.assertRaises(Exception):
+            perform_merging(client, 5)
+        # Both chunks of the batch are fetched once and checkpointed
+        self.assertEqual(2, mock_get_id_queue_pdfs.call_count)
+        checkpoint = MergeCheckpoint(5, self.sample_queue_batch["queued_ids"])
+        self.assertEqual({0: [16, 17], 1: [18, 19]}, checkpoint.get_fetched_ids())
+        # The merged chunks are stored as files, only their names are in the cache
+        chunks_dir = os.path.join(self.media_dir.name, checkpoint.path)
+        self.assertEqual(["chunk_0.pdf", "chunk_1.pdf"], sorted(os.listdir(chunks_dir)))
+        self.assertNotIn(b"%PDF", repr(cache.get(checkpoint.key)).encode("utf-8"))
+
+        perform_merging(client, 5)
+        self.assertEqual(2, mock_get_id_queue_pdfs.call_count)
+        self.assertEqual(2, mock_update_queue_batch_record.call_count)
+        self.assertEqual({}, checkpoint.get_fetched_ids())
+        self.assertEqual([], os.listdir(chunks_dir))
+
+    def test_checkpoint_cache_failure(self):
+        checkpoint = MergeCheckpoint(5, [16, 17])
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as chunk_file, open(
+            SAMPLE_PDF, "rb"
+        ) as f:
+            chunk_file.write(f.read())
+            chunk_file.flush()
+            # A cache ignoring its errors drops the writes
+            with mock.patch(
+                "card_generator.tasks.checkpoints.cache.set"
+            ), self.assertLogs("card_generator.tasks.checkpoints", "ERROR"):
+                checkpoint.save_chunk(0, [16, 17], chunk_file.name)
+            self.assertEqual({}, checkpoint.get_fetched_ids())
+            self.assertFalse(checkpoint.load_chunk(0, chunk_file.name))
+        self.assertEqual(
+            [], os.listdir(os.path.join(self.media_dir.name, checkpoint.path))
+        )
+
+    @mock.patch("card_generator.cards.client.QueueCardsClient.login")
+    @mock.patch("card_generator.tasks.cards.perform_merging")
+    def test_merge_cards_task_skips_duplicate(self, mock_perform_merging, mock_login):
+        mock_login.return_value = 1
+        mock_perform_merging.return_value = "merged"
+        task, _ = register_merge_task(5)
+
+        merge_cards.apply(kwargs={"batch_id": 5}, task_id="duplicate-task")
+        mock_perform_merging.assert_not_called()
+        self.assertEqual(task, get_merge_task(5))
+
+        merge_cards.apply(kwargs={"batch_id": 5}, task_id=task["task_id"])
+        mock_perform_merging.assert_called_once()
+        # The batch is released once the registered task is done
+        self.assertIsNone(get_merge_task(5))
+
+    @mock.patch("card_generator.tasks.registry.cache")
+    def test_merge_registry_unavailable(self, mock_cache):
+        # A cache ignoring its errors neither adds nor gets the tasks
+        mock_cache.add.return_value = False
+        mock_cache.get.return_value = None
+        with self.assertLogs("card_generator.tasks.registry", "WARNING"):
+            first_task, first_created = register_merge_task(5)
+            second_task, second_created = register_merge_task(5)
+        self.assertTrue(first_created)
+        self.assertTrue(second_created)
+        self.assertNotEqual(first_task, second_task)
+        self.assertTrue(claim_merge_task(5, first_task["task_id"]))
+
+    @mock.patch("card_generator.cards.client.QueueCardsClient.login")
+    @mock.patch("card_generator.cards.client.QueueCardsClient.get_queue_batch")
+    def test_merge_cards_task_reports_missing_batch(
+        self, mock_get_queue_batch, mock_login
+    ):
+        mock_login.return_value = 1
+        mock_get_queue_batch.return_value = None
+
+        merge_cards.apply(kwargs={"batch_id": 5}, task_id="merge-task")
+        merge_status = get_merge_status(5)
+        self.assertEqual("merge-task", merge_status["task_id"])
+        self.assertEqual("not_found", merge_status["status"])
+
+    @override_settings(OPENSPP_BULK_MERGE_THRESHOLD=1)
+    @mock.patch("card_generator.cards.client.QueueCardsClient.login")
+    @mock.patch("card_generator.cards.client.QueueCardsClient.get_id_queue_pdfs")
+    @mock.patch("card_generator.cards.client.QueueCardsClient.get_queue_batch")
+    @mock.patch("card_generator.tasks.cards.merge_cards.apply_async")
+    def test_merge_cards_task_moves_to_bulk_merges(
+        self, mock_apply_async, mock_get_queue_batch, mock_get_id_queue_pdfs, mock_login
+    ):
+        mock_login.return_value = 1
+        mock_get_queue_batch.return_value = self.sample_queue_batch
+        task, _ = register_merge_task(5)
+
+        merge_cards.apply(
+            kwargs={"batch_id": 5}, task_id=task["task_id"], routing_key="merges"
+        )
+        mock_get_id_queue_pdfs.assert_not_called()
+        mock_apply_async.assert_called_once_with(
+            kwargs={"batch_id": 5}, task_id=task["task_id"], queue="bulk_merges"
+        )
+        # The moved task keeps the Batch
+        self.assertEqual(task, get_merge_task(5))
+        merge_status = get_merge_status(5)
+        self.assertEqual("queued", merge_status["status"])
+        self.assertEqual("bulk_merges", merge_status["queue"])
+
+    @mock.patch("card_generator.cards.client.QueueCardsClient.login")
+    @mock.patch(
+        "card_generator.cards.client.QueueCardsClient.update_queue_batch_record"
+    )
+    @mock.patch("card_generator.cards.client.QueueCardsClient.get_id_queue_pdfs")
+    @mock.patch("card_generator.cards.client.QueueCardsClient.get_queue_batch")
+    def test_merge_cards_task_duplex_unpaired_pages(
+        self,
+        mock_get_queue_batch,
+        mock_get_id_queue_pdfs,
+        mock_update_queue_batch_record,
+        mock_login,
+    ):
+        mock_login.return_value = 1
+        mock_get_queue_batch.return_value = self.sample_queue_batch
+        # A single page, without its back
+        mock_get_id_queue_pdfs.return_value = [self.sample_id_queue]
+
+        # Celery logs the failure with a traceback of billiard, that the log capture of pytest
+        # cannot format on Python 3.11
+        with mock.patch("celery.app.trace.logger"):
+            merge_cards.apply(
+                kwargs={"batch_id": 5, "imposition": {"duplex": True}},
+                task_id="merge-task",
+            )
+        # The merge is not retried
+        mock_get_queue_batch.assert_called_once()
+        merge_status = get_merge_status(5)
+        self.assertEqual("error", merge_status["status"])
+        self.assertIn("front and a back page", merge_status["message"])
+        mock_update_queue_batch_record.assert_called_once_with(
+            batch_id=5, data={"merge_status": "error_merging"}
+        )
+
+    @override_settings(OPENSPP_BULK_MERGE_THRESHOLD=1)
+    @mock.patch("card_generator.cards.client.QueueCardsClient.login")
+    @mock.patch("card_generator.tasks.cards.perform_merging")
+    def test_merge_cards_task_on_bulk_merges(self, mock_perform_merging, mock_login):
+        mock_login.return_value = 1
+        mock_perform_merging.return_value = "merged"
+        merge_cards.apply(
+            kwargs={"batch_id": 5}, task_id="merge-task", routing_key="bulk_merges"
+        )
+        self.assertEqual("bulk_merges", mock_perform_merging.call_args.kwargs["queue"])
+        self.assertEqual("merged", get_merge_status(5)["status"])
+
+    def test_merge_pdf_dedupe_resources(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            merged_pdf = merge_pdf(
+                [SAMPLE_PDF] * 5, temp_dir, name="merged", dedupe_resources=False
+            )
+            deduped_pdf = merge_pdf(
+                [SAMPLE_PDF] * 5, temp_dir, name="deduped", dedupe_resources=True
+            )
+            self.assertLess(os.path.getsize(deduped_pdf), os.path.getsize(merged_pdf))
+
+            pages = PdfReader(deduped_pdf).pages
+            self.assertEqual(5, len(pages))
+            fonts = {page["/Resources"]["/Font"].raw_get("/F4").idnum for page in pages}
+            self.assertEqual(1, len(fonts))
+
+    @override_settings(OPENSPP_BULK_MERGE_THRESHOLD=100)
+    def test_get_merge_queue(self):
+        self.assertEqual("merges", get_merge_queue(None))
+        self.assertEqual("merges", get_merge_queue(100))
+        self.assertEqual("bulk_merges", get_merge_queue(101))
@@ -0,0 +1,66 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from card_generator.api.tests.v1.cards.factories import CardFactory
+from card_generator.cards.exceptions import ImmutableTemplateVersionException
+from card_generator.cards.models import Card
+from card_generator.cards.pdf import CardRender
+
+FRONT_SVG = b'<svg xmlns="http://www.w3.org/2000/svg"><text>{{ name }}</text></svg>'
+BACK_SVG = b'<svg xmlns="http://www.w3.org/2000/svg"><text data-variable="id"/></svg>'
+
+
+@override_settings(OPENSPP_SVG_OPTIMIZATION=False)
+class TestCardTemplateVersion(TestCase):
+    def setUp(self):
+        self.card = Card.objects.create(
+            title="Sample Title",
+            front_svg=SimpleUploadedFile("front_card.svg", FRONT_SVG),
+            back_svg=SimpleUploadedFile("back_card.svg", BACK_SVG),
+        )
+
+    def test_upload(self):
+        version = self.card.current_version
+        self.assertEqual(64, len(version.digest))
+        self.assertRegex(version.front_svg.name, r"^cards/versions/[0-9a-f]{64}\.svg$")
+        with version.front_svg.open("rb") as f:
+            self.assertEqual(FRONT_SVG, f.read())
+        self.assertEqual(version.front_svg.path, self.card.get_render_svg("front").path)
+        self.assertEqual(
+            [{"tag": "text", "name": "name"}, {"tag": "text", "name": "id"}],
+            self.card.get_fields(),
+        )
+
+    def test_publish_new_layout(self):
+        version = self.card.current_version
+        card_render = CardRender(self.card, {}, create_qr_code=False)
+
+        card = Card.objects.get(pk=self.card.pk)
+        card.front_svg = SimpleUploadedFile("front_card.svg", b"<svg><text/></svg>")
+        card.save()
+
+        card.refresh_from_db()
+        self.assertNotEqual(version, card.current_version)
+        self.assertNotEqual(version.digest, card.current_version.digest)
+        # The back did not change, its file is shared by both versions
+        self.assertEqual(version.back_svg.name, card.current_version.back_svg.name)
+        # The renders started before the switch keep the files of their version
+        self.assertEqual(version.front_svg.path, card_render.front_svg_path)
+        with open(card_render.front_svg_path, "rb") as f:
+            self.assertEqual(FRONT_SVG, f.read())
+
+    def test_publish_same_templates(self):
+        version = self.card.current_version
+        self.assertEqual(version, self.card.publish_version())
+        self.assertEqual(1, self.card.versions.count())
+
+    def test_immutable(self):
+        version = self.card.current_version
+        version.digest = "0" * 64
+        with self.assertRaises(ImmutableTemplateVersionException):
+            version.save()
+
+    def test_card_without_version(self):
+        card = CardFactory(front_svg="front_card.svg", back_svg="back_card.svg")
+        self.assertIsNone(card.current_version)
+        self.assertEqual(card.front_svg, card.get_render_svg("front"))
@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from prometheus_client import REGISTRY
+
+from card_generator.api.tests.v1.cards.factories import CardFactory
+from card_generator.cards import warmup
+from card_generator.cards.benchmarks import SAMPLES_DIR, get_sample_card
+from card_generator.cards.signals import card_rendered
+from card_generator.cards.tests.mixins import fake_convert_svgs
+from card_generator.cards.utils import clear_template_cache, get_template
+
+
+def get_cache_requests(result: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "card_generator_template_cache_requests_total", {"result": result}
+        )
+        or 0
+    )
+
+
+class TestTemplateCache(SimpleTestCase):
+    def setUp(self):
+        clear_template_cache()
+        self.addCleanup(clear_template_cache)
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+
+    def write_template(self, name: str, content: str) -> str:
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_get_template(self):
+        path = self.write_template("card.svg", "<svg>{{ name }}</svg>")
+        hits, misses = get_cache_requests("hit"), get_cache_requests("miss")
+
+        template = get_template(path)
+        self.assertIs(template, get_template(path))
+        self.assertEqual("<svg>Jane</svg>", template.render(name="Jane"))
+        self.assertEqual(1, get_cache_requests("hit") - hits)
+        self.assertEqual(1, get_cache_requests("miss") - misses)
+
+    def test_get_template_file_changed(self):
+        path = self.write_template("card.svg", "<svg>{{ name }}</svg>")
+        get_template(path)
+        self.write_template("card.svg", "<svg>{{ surname }}</svg>")
+        self.assertEqual("<svg>Doe</svg>", get_template(path).render(surname="Doe"))
+
+    @override_settings(OPENSPP_TEMPLATE_CACHE_SIZE=1)
+    def test_get_template_cache_size(self):
+        front = self.write_template("front.svg", "<svg>front</svg>")
+        back = self.write_template("back.svg", "<svg>back</svg>")
+        template = get_template(front)
+        get_template(back)
+        self.assertIsNot(template, get_template(front))
+
+
+class TestWarmUp(TestCase):
+    def setUp(self):
+        clear_template_cache()
+        self.addCleanup(clear_template_cache)
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=temp_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for name in ("front_card.svg", "back_card.svg"):
+            shutil.copy(SAMPLES_DIR / name, temp_dir.name)
+
+    def test_preload_templates(self):
+        CardFactory(front_svg="front_card.svg", back_svg="back_card.svg")
+        misses = get_cache_requests("miss")
+        self.assertEqual(2, warmup.preload_templates(10))
+        self.assertEqual(2, get_cache_requests("miss") - misses)
+
+    def test_preload_templates_limit(self):
+        CardFactory(front_svg="front_card.svg", back_svg="back_card.svg")
+        CardFactory(front_svg="missing.svg", back_svg="missing.svg")
+        with self.assertLogs("card_generator.cards.warmup", level="WARNING") as logs:
+            self.assertEqual(0, warmup.preload_templates(1))
+        self.assertEqual(2, len(logs.records))
+
+    @mock.patch("card_generator.cards.pdf.convert_svgs", side_effect=fake_convert_svgs)
+    def test_render_sample_card(self, mock_convert_svgs):
+        receiver = mock.Mock()
+        card_rendered.connect(receiver)
+        self.addCleanup(card_rendered.disconnect, receiver)
+
+        warmup.render_sample_card()
+        self.assertEqual(
+            ["pdf", "png", "png"],
+            [call.args[2] for call in mock_convert_svgs.call_args_list],
+        )
+        receiver.assert_not_called()
+
+    def test_sample_card_outside_tests(self):
+        # The images of the workers leave the test trees out
+        card = get_sample_card()
+        for path in (card.front_svg.path, card.back_svg.path):
+            self.assertTrue(os.path.exists(path))
+            self.assertNotIn("tests", Path(path).parts)
+
+    @override_settings(OPENSPP_WARMUP_TEMPLATES=10, OPENSPP_WARMUP_RENDER=True)
+    @mock.patch("card_generator.cards.warmup.render_sample_card")
+    @mock.patch("card_generator.cards.warmup.preload_templates")
+    def test_warm_up(self, mock_preload_templates, mock_render_sample_card):
+        mock_render_sample_card.side_effect = OSError("rsvg-convert not found")
+        with self.assertLogs("card_generator.cards.warmup") as logs:
+            warmup.warm_up("celery")
+        mock_preload_templates.assert_called_once_with(10)
+        self.assertIn("Warm-up step `render` of celery failed.", logs.output[0])
+        self.assertEqual(
+            {"imports", "templates", "render"}, set(logs.records[-1].timings)
+        )
+
+    @override_settings(OPENSPP_WARMUP=False)
+    @mock.patch("card_generator.cards.warmup.import_modules")
+    def test_warm_up_disabled(self, mock_import_modules):
+        warmup.warm_up("gunicorn")
+        mock_import_modules.assert_not_called()
@@ -2,15 +2,28 @@ import base64
 import codecs
 import os  # nosec
 import subprocess  # nosec
+import threading
 import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING
 
-from bs4 import BeautifulSoup
 from django.conf import settings
-from jinja2 import Environment, meta
+
+from card_generator.utils.metrics import RASTERIZER_SECONDS, TEMPLATE_CACHE_REQUESTS
+
+# bs4 and jinja2 are imported on first use, so loading the models does not import them
+if TYPE_CHECKING:
+    from jinja2 import Template
+
+# Compiled templates by path, with the modification time and size of the file they were read from
+_templates: OrderedDict[str, tuple[tuple, "Template"]] = OrderedDict()
+_templates_lock = threading.Lock()
 
 
 def get_svg_fields_from_tags(svg_path: str, variable_tag="data-variable"):
     """Extracts the field name from a svg file based on tag."""
+    from bs4 import BeautifulSoup
+
     extracted_fields = []
     with open(svg_path) as svg:
         soup = BeautifulSoup(svg.read(), "xml")
@@ -25,6 +38,8 @@ def get_svg_fields_from_tags(svg_path: str, variable_tag="data-variable"):
 
 def get_svg_variables(svg_path: str) -> list:
     """Extracts the field name from a svg file based on brackets."""
+    from jinja2 import Environment, meta
+
     with open(svg_path) as svg_file:
         env = Environment(autoescape=True)
         template_str = svg_file.read()
@@ -33,19 +48,66 @@ def get_svg_variables(svg_path: str) -> list:
         return [{"tag": "text", "name": variable} for variable in variables]
 
 
+def get_template(svg_path: str) -> "Template":
+    """
+    Get the compiled template of a SVG file. The last `OPENSPP_TEMPLATE_CACHE_SIZE` templates
+    are kept in memory, and compiled again when their file changes.
+    """
+    stat = os.stat(svg_path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _templates_lock:
+        cached = _templates.get(svg_path)
+        if cached and cached[0] == version:
+            _templates.move_to_end(svg_path)
+            TEMPLATE_CACHE_REQUESTS.labels(result="hit").inc()
+            return cached[1]
+
+    from jinja2 import Template
+
+    TEMPLATE_CACHE_REQUESTS.labels(result="miss").inc()
+    with open(svg_path) as svg_file:
+        template = Template(svg_file.read())
+    with _templates_lock:
+        _templates[svg_path] = (version, template)
+        _templates.move_to_end(svg_path)
+        while len(_templates) > settings.OPENSPP_TEMPLATE_CACHE_SIZE:
+            _templates.popitem(last=False)
+    return template
+
+
+def clear_template_cache() -> None:
+    with _templates_lock:
+        _templates.clear()
+
+
 def svg_to_soup_object(svg_string):
     """Create beautiful soup object from svg."""
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(svg_string, "xml")
     element = soup.find("svg")
     return element
 
 
-def convert_svgs(svg_files: list, output_filename: str, output_format: str):
-    """Converts svg files to other format."""
+def convert_svgs(
+    svg_files: list,
+    output_filename: str,
+    output_format: str,
+    fonts_config: str | None = None,
+):
+    """
+    Converts svg files to other format.
+    :param fonts_config: Fontconfig file of the fonts to render the files with
+    """
     if not svg_files:
         raise ValueError("No SVG to render.")
+    env = None
+    if fonts_config:
+        env = {**os.environ, "FONTCONFIG_FILE": fonts_config}
 
-    with open(os.devnull, "wb") as devnull:
+    with open(os.devnull, "wb") as devnull, RASTERIZER_SECONDS.labels(
+        format=output_format
+    ).time():
         subprocess.check_call(  # nosec
             [
                 "rsvg-convert",
@@ -60,6 +122,7 @@ def convert_svgs(svg_files: list, output_filename: str, output_format: str):
             ]
             + svg_files,
             stdout=devnull,
+            env=env,
         )
 
 
@@ -0,0 +1,23 @@
+import hashlib
+
+from django.core.files.base import ContentFile
+
+# Files of the template versions, named after the digest of their content
+VERSIONS_DIR = "cards/versions/"
+
+
+def store_content(storage, content: bytes) -> str:
+    """
+    Store the content of a template under its digest. A stored file is never overwritten,
+    and the same content is stored once for all the versions.
+    :return: The name of the file in the storage
+    """
+    name = f"{VERSIONS_DIR}{hashlib.sha256(content).hexdigest()}.svg"
+    if not storage.exists(name):
+        name = storage.save(name, ContentFile(content))
+    return name
+
+
+def get_version_digest(names) -> str:
+    """Get the digest of a version from the names of its files, which hold their digests."""
+    return hashlib.sha256("|".join(names).encode("utf-8")).hexdigest()
@@ -0,0 +1,98 @@
+import importlib
+import logging
+import shutil
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Modules of the render and merge paths that are slow to import
+HEAVY_MODULES = (
+    "bs4",
+    "lxml.etree",
+    "jinja2",
+    "qrcode",
+    "PIL.Image",
+    "PyPDF2",
+    "card_generator.cards.pdf",
+    "card_generator.tasks.cards",
+)
+
+
+def import_modules() -> None:
+    for module in HEAVY_MODULES:
+        importlib.import_module(module)
+
+
+def preload_templates(limit: int) -> int:
+    """
+    Compile the templates of the last modified cards into the template cache.
+    :param limit: Maximum number of cards
+    :return: The number of templates loaded
+    """
+    from card_generator.cards.models import SIDES, Card
+    from card_generator.cards.utils import get_template
+
+    loaded = 0
+    for card in Card.objects.order_by("-modified")[:limit]:
+        for side in SIDES:
+            try:
+                get_template(card.get_render_path(side))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Template of card #{card.uuid} not loaded. {str(e)}")
+                continue
+            loaded += 1
+    return loaded
+
+
+def render_sample_card() -> None:
+    """
+    Render the sample card through every stage of a render, without reporting it as a render.
+    """
+    from card_generator.cards.benchmarks import get_sample_card, get_sample_fields
+    from card_generator.cards.pdf import CardRender
+
+    card_render = CardRender(
+        get_sample_card(),
+        get_sample_fields(with_photo=True),
+        create_qr_code=True,
+        profile=False,
+    )
+    try:
+        card_render.create_svg()
+        card_render.render_pdf_file("warmup")
+        card_render.render_png_files("warmup")
+    finally:
+        shutil.rmtree(card_render.temp_dir)
+
+
+def warm_up(process: str) -> None:
+    """
+    Prepare a new worker process for its first render, with `OPENSPP_WARMUP_*`.
+    Each step only logs its failure, so a worker always starts.
+    :param process: Name of the process in the logs, e.g. `gunicorn` or `celery`
+    """
+    if not settings.OPENSPP_WARMUP:
+        return
+
+    steps = [("imports", import_modules)]
+    if settings.OPENSPP_WARMUP_TEMPLATES:
+        steps.append(
+            ("templates", lambda: preload_templates(settings.OPENSPP_WARMUP_TEMPLATES))
+        )
+    if settings.OPENSPP_WARMUP_RENDER:
+        steps.append(("render", render_sample_card))
+
+    timings = {}
+    for name, step in steps:
+        start = perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception(f"Warm-up step `{name}` of {process} failed.")
+        timings[name] = perf_counter() - start
+    # Do not keep the connection of the warm-up open in a worker waiting for requests
+    connections.close_all()
+    logger.info(f"Warm-up of {process} done.", extra={"timings": timings})
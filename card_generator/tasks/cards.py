@@ -1,23 +1,43 @@
 import logging
+import os
 import tempfile
 import xmlrpc.client
+from itertools import islice
 
 from celery import Task, shared_task
 from django.conf import settings
 from django.utils.timezone import now
-from PyPDF2 import PdfMerger
 
 from card_generator.cards.client import QueueCardsClient
+from card_generator.cards.exceptions import ImpositionException
+from card_generator.cards.imposition import ImpositionLayout, impose_pdf
 from card_generator.cards.utils import convert_file_to_uri, data_uri_to_file
+from card_generator.tasks import queues, status
+from card_generator.tasks.checkpoints import MergeCheckpoint
+from card_generator.tasks.registry import claim_merge_task, release_merge_task
+from card_generator.utils import profiling
+from card_generator.utils.metrics import MERGE_BATCH_SIZE, MERGE_SECONDS
+from card_generator.utils.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
 
 class OPENSPPCeleryTask(Task):
     max_retries = settings.CELERY_MAX_RETRIES
+    # Merges resume from their checkpoints, so they can be redelivered safely, even when
+    # their worker process is killed, e.g. out of memory
+    acks_late = True
+    reject_on_worker_lost = True
+
+    def on_success(self, retval, task_id, args, kwargs):
+        # A merge moved to another queue keeps the Batch until it is done
+        if retval != status.QUEUED:
+            release_merge_task(kwargs["batch_id"], task_id)
 
     def on_failure(self, exc, task_id, args, kwargs, einfo):
-        batch_id = args[1]["batch_id"]
+        batch_id = kwargs["batch_id"]
+        release_merge_task(batch_id, task_id)
+        status.set_merge_status(batch_id, task_id, status.ERROR, message=str(exc))
         data = {"merge_status": "error_merging"}
         try:
             client = QueueCardsClient(
@@ -45,17 +65,20 @@ class OPENSPPCeleryTask(Task):
         logger.info(f"Batch #{batch_id} have been updated with failed status.")
 
 
-def get_pdfs(client: QueueCardsClient, batch_record: dict) -> list:
+def get_pdfs(
+    client: QueueCardsClient, batch_record: dict, queue_ids: list[int] | None = None
+) -> list:
     """
     Get the cards from OpenSPP
     :param client: The client to use when communicating to OpenSPP API
     :param batch_record: ID of Batch record
+    :param queue_ids: Only get the cards of these queue IDs, defaults to all queue IDs of the batch
     :return: List of PDFs to be merged
     """
     if not batch_record:
         return []
 
-    raw_pdfs = client.get_id_queue_pdfs(batch_record=batch_record)
+    raw_pdfs = client.get_id_queue_pdfs(batch_record=batch_record, queue_ids=queue_ids)
     return [item["id_pdf"] for item in raw_pdfs]
 
 
@@ -75,64 +98,227 @@ def save_pdf_to_openspp(
         "id_pdf_filename": filename,
         "date_merged": now().date().isoformat(),
     }
-    client.update_queue_batch_record(batch_id=batch_id, data=data)
+    # Only read back the status, the PDF that was just uploaded is not downloaded again
+    client.update_queue_batch_record(
+        batch_id=batch_id, data=data, fields=["merge_status"]
+    )
 
 
-def merge_pdf(list_of_pdf: list, target_dir: str) -> str:
+def merge_pdf(
+    list_of_pdf: list,
+    target_dir: str,
+    name: str = "result",
+    dedupe_resources: bool | None = None,
+) -> str:
     """
     Merge the list of PDFs
     :param list_of_pdf: Lists of PDFs to be merged
     :param target_dir: Target directory where to save the merged PDF
+    :param name: Name of the merged PDF without the extension
+    :param dedupe_resources: Store identical fonts and images of the PDFs only once and compress
+        the page contents, defaults to `OPENSPP_MERGE_DEDUPE_RESOURCES`
     :return: The file name of the merged PDF
     """
-    file_name = f"{target_dir}/result.pdf"
-    with PdfMerger() as merger:
-        for item in list_of_pdf:
-            merger.append(item)
-        merger.write(file_name)
+    from PyPDF2 import PdfMerger, PdfReader, PdfWriter
+
+    from card_generator.cards.dedupe import SharedResources
+
+    if dedupe_resources is None:
+        dedupe_resources = settings.OPENSPP_MERGE_DEDUPE_RESOURCES
+    file_name = f"{target_dir}/{name}.pdf"
+    if not dedupe_resources:
+        with PdfMerger() as merger:
+            for item in list_of_pdf:
+                merger.append(item)
+            merger.write(file_name)
+        return file_name
+
+    writer = PdfWriter()
+    shared_resources = SharedResources()
+    for item in list_of_pdf:
+        for page in PdfReader(item).pages:
+            shared_resources.dedupe_page(page)
+            page.compress_content_streams()
+            writer.add_page(page)
+    with open(file_name, "wb") as f:
+        writer.write(f)
 
+    input_size = sum(os.path.getsize(item) for item in list_of_pdf)
+    output_size = os.path.getsize(file_name)
+    reduction = (1 - output_size / input_size) * 100 if input_size else 0
+    logger.info(
+        f"Merged {len(list_of_pdf)} PDFs from {input_size} to {output_size} bytes "
+        f"({reduction:.1f}% smaller), {shared_resources.deduplicated} shared resources deduplicated.",
+        extra={
+            "input_size": input_size,
+            "output_size": output_size,
+            "deduplicated": shared_resources.deduplicated,
+        },
+    )
     return file_name
 
 
-def perform_merging(client: QueueCardsClient, batch_id: int) -> None:
+def chunk_queue_ids(queue_ids: list[int], chunk_size: int) -> list[list[int]]:
+    """
+    Split the queue IDs into chunks.
+    A batch without queue IDs gives a single empty chunk, so it is still reported.
+    """
+    iterator = iter(queue_ids)
+    chunks = list(iter(lambda: list(islice(iterator, chunk_size)), []))
+    return chunks or [[]]
+
+
+def merge_chunk(
+    client: QueueCardsClient,
+    batch_record: dict,
+    queue_ids: list[int],
+    target_dir: str,
+    name: str,
+) -> str | None:
+    """
+    Get and merge the cards of a chunk of queue IDs.
+    :param client: The client to use when communicating to OpenSPP API
+    :param batch_record: Batch record
+    :param queue_ids: Queue IDs of the chunk
+    :param target_dir: Target directory where to save the merged PDF
+    :param name: Name of the merged PDF without the extension
+    :return: The file name of the merged PDF or None if the chunk has no cards
+    """
+    with tracer.start_as_current_span("fetch_pdfs"):
+        list_of_files = get_pdfs(
+            client=client, batch_record=batch_record, queue_ids=queue_ids
+        )
+    if not list_of_files:
+        return None
+
+    with tempfile.TemporaryDirectory(dir=target_dir) as chunk_dir:
+        with tracer.start_as_current_span("decode_pdfs"):
+            file_list = data_uri_to_file(list_of_files, chunk_dir)
+        with tracer.start_as_current_span("merge_pdf"):
+            return merge_pdf(file_list, target_dir, name=name)
+
+
+def perform_merging(
+    client: QueueCardsClient,
+    batch_id: int,
+    progress: status.MergeProgress | None = None,
+    imposition: dict | None = None,
+    profile: bool | None = None,
+    queue: str | None = None,
+) -> str:
     """
     Do the actual process of merging the cards.
+    The queue IDs are processed in chunks of `OPENSPP_MERGE_CHUNK_SIZE`. Each merged chunk is
+    checkpointed, so a retry only fetches and merges the chunks that are not done yet.
     :param client: The client to use when communicating to OpenSPP API
     :param batch_id: ID of Batch record
+    :param progress: Progress of the merge task to update after each chunk
+    :param imposition: Options of `ImpositionLayout` to tile the merged cards onto print sheets
+    :param profile: Profile the merge, defaults to profile a sample of the merges
+    :param queue: Queue the merge is running on
+    :return: The resulting merge status, `queued` if the batch belongs to the bulk merges queue
     """
-    with tempfile.TemporaryDirectory() as temp_dir:
-        batch_record = client.get_queue_batch(batch_id)
+    from PyPDF2 import PdfReader
+
+    with profiling.profile(
+        f"merge-{batch_id}", profile
+    ), tempfile.TemporaryDirectory() as temp_dir:
+        with tracer.start_as_current_span("fetch_batch"):
+            batch_record = client.get_queue_batch(batch_id)
         if not batch_record:
             logger.info(f"Batch ID {batch_id} has an empty record.")
-            return
+            return status.NOT_FOUND
+
+        queue_ids = batch_record.get("queued_ids", [])
+        if (
+            queue == queues.MERGES
+            and queues.get_merge_queue(len(queue_ids)) == queues.BULK_MERGES
+        ):
+            logger.info(
+                f"Batch ID #{batch_id} has {len(queue_ids)} cards, moving it to the bulk merges."
+            )
+            return status.QUEUED
+        if progress:
+            progress.set_total(len(queue_ids))
+        chunk_size = settings.OPENSPP_MERGE_CHUNK_SIZE
+        checkpoint = MergeCheckpoint(batch_id, queue_ids)
+        chunk_files = []
+        for index, chunk_ids in enumerate(chunk_queue_ids(queue_ids, chunk_size)):
+            chunk_name = f"chunk_{index}"
+            with tracer.start_as_current_span(
+                "merge_chunk", attributes={"chunk": index, "cards": len(chunk_ids)}
+            ) as span:
+                chunk_file = f"{temp_dir}/{chunk_name}.pdf"
+                resumed = checkpoint.load_chunk(index, chunk_file)
+                span.set_attribute("resumed", resumed)
+                if resumed:
+                    logger.info(f"Batch ID #{batch_id} resuming from chunk {index}.")
+                else:
+                    chunk_file = merge_chunk(
+                        client, batch_record, chunk_ids, temp_dir, chunk_name
+                    )
+                    if chunk_file:
+                        checkpoint.save_chunk(index, chunk_ids, chunk_file)
+            if chunk_file:
+                chunk_files.append(chunk_file)
+            if progress:
+                # The chunks without cards count too, so the ETA reaches 0
+                progress.update(
+                    records_fetched=len(chunk_ids),
+                    pages_merged=len(PdfReader(chunk_file).pages) if chunk_file else 0,
+                    chunk_bytes=os.path.getsize(chunk_file) if chunk_file else 0,
+                )
 
-        list_of_files = get_pdfs(client=client, batch_record=batch_record)
-        if not list_of_files:
+        if not chunk_files:
             logger.info(f"Batch ID #{batch_id} have no cards available.")
-            return
-        file_list = data_uri_to_file(list_of_files, temp_dir)
-
-        result_pdf = merge_pdf(file_list, temp_dir)
-        _, base64_pdf = convert_file_to_uri("application/pdf", result_pdf).split(",")
-        save_pdf_to_openspp(
-            client=client,
-            batch_id=batch_id,
-            pdf_uri=base64_pdf,
-            filename=batch_record.get("name"),
-        )
+            return status.NO_CARDS
+
+        with tracer.start_as_current_span("merge_chunks"):
+            result_pdf = merge_pdf(chunk_files, temp_dir)
+        if imposition:
+            with tracer.start_as_current_span("imposition"):
+                result_pdf = impose_pdf(
+                    result_pdf,
+                    f"{temp_dir}/imposed.pdf",
+                    ImpositionLayout(**imposition),
+                )
+        if progress:
+            progress.set_result_size(os.path.getsize(result_pdf))
+        with tracer.start_as_current_span("upload_pdf"):
+            _, base64_pdf = convert_file_to_uri("application/pdf", result_pdf).split(
+                ","
+            )
+            save_pdf_to_openspp(
+                client=client,
+                batch_id=batch_id,
+                pdf_uri=base64_pdf,
+                filename=batch_record.get("name"),
+            )
+        checkpoint.clear()
+        return status.MERGED
 
 
 @shared_task(bind=True, base=OPENSPPCeleryTask)
-def merge_cards(self, batch_id: int) -> None:
+def merge_cards(
+    self, batch_id: int, imposition: dict | None = None, profile: bool | None = None
+) -> None:
     """
     Merge cards of a Batch Queue from OpenSPP server.
     Process flow:
-        - get the batch record to capture the name and queue IDs
+        - get the batch record to capture the name and queue IDs, report `not_found` if it does not exist
         - get the PDFs of cards for each queue ID records
-        - merge the PDFs into 1 PDF
+        - merge the PDFs into 1 PDF, imposed onto print sheets if requested
         - push the merged PDF to Batch record's id_pdf field, update merge_status and add filename also
     :param batch_id: ID of Batch record
+    :param imposition: Options of `ImpositionLayout` to tile the merged cards onto print sheets
+    :param profile: Profile the merge, defaults to profile a sample of the merges
+    :return: The merge status
     """
+    task_id = self.request.id
+    if not claim_merge_task(batch_id, task_id):
+        return
+    progress = status.MergeProgress(batch_id, task_id)
+    progress.publish()
     try:
         client = QueueCardsClient(
             server_root=settings.OPENSPP_SERVER_ROOT,
@@ -142,14 +328,49 @@ def merge_cards(self, batch_id: int) -> None:
         )
     except Exception as e:  # noqa Lets catch all errors error for debugging and retry
         logger.info(f"Error raised on client. {str(e)}")
+        progress.publish(status.RETRYING, message=str(e))
         raise self.retry(exc=e, countdown=settings.CELERY_RETRY_COUNTDOWN)
     try:
-        perform_merging(client, batch_id)
+        merge_status = perform_merging(
+            client,
+            batch_id,
+            progress=progress,
+            imposition=imposition,
+            profile=profile,
+            queue=(self.request.delivery_info or {}).get("routing_key"),
+        )
+    except ImpositionException as e:
+        # The merged pages are the same on a retry, the merge fails with its error status
+        logger.info(f"Batch #{batch_id} cannot be imposed. {str(e)}")
+        raise
     except (
         xmlrpc.client.ProtocolError,
         xmlrpc.client.Fault,
         Exception,
     ) as e:  # noqa Lets catch all errors error for debugging and retry
         logger.info(f"Error raised while performing merge. {str(e)}")
+        progress.publish(status.RETRYING, message=str(e))
         raise self.retry(countdown=settings.CELERY_RETRY_COUNTDOWN)
-    logger.info(f"Batch #{batch_id} have been updated with merged cards.")
+    if merge_status == status.QUEUED:
+        # The batch size was not known when the merge was requested, the same task and
+        # its registration move to the bulk merges queue
+        progress.publish(status.QUEUED, queue=queues.BULK_MERGES)
+        self.apply_async(
+            kwargs=self.request.kwargs, task_id=task_id, queue=queues.BULK_MERGES
+        )
+        return merge_status
+    transfer = client.transfer_stats.as_dict()
+    merge_progress = progress.publish(merge_status, transfer=transfer)["progress"]
+    MERGE_SECONDS.labels(status=merge_status).observe(merge_progress["elapsed"])
+    logger.info(
+        f"Batch #{batch_id} transferred {transfer['bytes_sent']} bytes sent and "
+        f"{transfer['bytes_received']} bytes received in {transfer['round_trips']} calls.",
+        extra={"batch_id": batch_id, **transfer},
+    )
+    if merge_status == status.MERGED:
+        MERGE_BATCH_SIZE.observe(merge_progress["records_total"])
+        logger.info(
+            f"Batch #{batch_id} have been updated with merged cards.",
+            extra={"batch_id": batch_id, **merge_progress},
+        )
+    return merge_status
@@ -0,0 +1,100 @@
+import hashlib
+import logging
+import shutil
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+
+class MergeCheckpoint:
+    """
+    Keep track of the merged chunks of a Batch so a retry can resume where it stopped.
+
+    The merged PDFs of the chunks are stored in the default storage, under
+    `OPENSPP_MERGE_CHECKPOINT_PATH`, so any worker can resume the merge. The Django cache only
+    keeps the queue IDs and the file of each chunk, and expires automatically after
+    `OPENSPP_MERGE_CHECKPOINT_TIMEOUT` seconds. The key includes a digest of the queue IDs,
+    so a checkpoint is ignored once the content of the batch changes.
+    """
+
+    KEY_PREFIX = "card-merge-checkpoint"
+
+    def __init__(
+        self, batch_id: int, queued_ids: list[int], timeout: int | None = None
+    ):
+        """
+        :param batch_id: ID of Batch record
+        :param queued_ids: Queue IDs of the Batch record
+        :param timeout: Seconds before the checkpoint expires
+        """
+        self.batch_id = batch_id
+        self.timeout = timeout or settings.OPENSPP_MERGE_CHECKPOINT_TIMEOUT
+        digest = hashlib.sha1(  # nosec
+            ",".join(str(idx) for idx in queued_ids).encode("utf-8")
+        ).hexdigest()
+        self.key = f"{self.KEY_PREFIX}:{batch_id}:{digest}"
+        self.path = f"{settings.OPENSPP_MERGE_CHECKPOINT_PATH}/{batch_id}/{digest}"
+
+    def _get_chunks(self) -> dict:
+        """Return the queue IDs and the stored file of the merged chunks, by chunk index."""
+        return cache.get(self.key, {})
+
+    def get_fetched_ids(self) -> dict:
+        """Return the queue IDs that have been fetched and merged, grouped by chunk index."""
+        return {
+            index: chunk["queue_ids"] for index, chunk in self._get_chunks().items()
+        }
+
+    def load_chunk(self, index: int, chunk_file: str) -> bool:
+        """
+        Copy the merged PDF of a chunk to a local file if it has been completed.
+        :param index: Index of the chunk
+        :param chunk_file: Path of the local file
+        :return: Whether the chunk has been completed
+        """
+        chunk = self._get_chunks().get(index)
+        if not chunk:
+            return False
+        try:
+            with default_storage.open(chunk["name"], "rb") as source, open(
+                chunk_file, "wb"
+            ) as target:
+                shutil.copyfileobj(source, target)
+        except OSError as e:
+            logger.warning(
+                f"Batch #{self.batch_id} checkpoint of chunk {index} unreadable. {str(e)}"
+            )
+            return False
+        return True
+
+    def save_chunk(self, index: int, queue_ids: list[int], chunk_file: str) -> None:
+        """
+        Store the merged PDF of a chunk and mark its queue IDs as fetched.
+        :param index: Index of the chunk
+        :param queue_ids: Queue IDs of the chunk
+        :param chunk_file: Path of the merged PDF of the chunk
+        """
+        with open(chunk_file, "rb") as f:
+            name = default_storage.save(f"{self.path}/chunk_{index}.pdf", File(f))
+        chunks = self._get_chunks()
+        chunks[index] = {"queue_ids": queue_ids, "name": name}
+        cache.set(self.key, chunks, self.timeout)
+        # The cache ignores its errors in production, a checkpoint that cannot be read back
+        # would only leave its file behind
+        if cache.get(self.key) != chunks:
+            default_storage.delete(name)
+            logger.error(
+                f"Batch #{self.batch_id} checkpoint of chunk {index} could not be saved, "
+                f"a retry will merge it again."
+            )
+            return
+        logger.info(f"Batch #{self.batch_id} checkpoint saved for chunk {index}.")
+
+    def clear(self) -> None:
+        for chunk in self._get_chunks().values():
+            default_storage.delete(chunk["name"])
+        cache.delete(self.key)
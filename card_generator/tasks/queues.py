@@ -0,0 +1,18 @@
+from django.conf import settings
+
+# Interactive renders
+RENDERS = "renders"
+# Merges of small batches
+MERGES = "merges"
+# Merges of batches of more than `OPENSPP_BULK_MERGE_THRESHOLD` cards
+BULK_MERGES = "bulk_merges"
+
+
+def get_merge_queue(batch_size: int | None) -> str:
+    """
+    Get the queue of a merge, so large batches do not hold back the small ones.
+    :param batch_size: Number of cards of the batch, if known
+    """
+    if batch_size is not None and batch_size > settings.OPENSPP_BULK_MERGE_THRESHOLD:
+        return BULK_MERGES
+    return MERGES
@@ -0,0 +1,80 @@
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "card-merge-task"
+
+
+def get_registry_key(batch_id: int) -> str:
+    return f"{KEY_PREFIX}:{batch_id}"
+
+
+def get_merge_task(batch_id: int) -> dict | None:
+    """
+    Get the in-flight merge task of a Batch.
+    :param batch_id: ID of Batch record
+    :return: Dict with the `task_id` of the task or None if there is none
+    """
+    return cache.get(get_registry_key(batch_id))
+
+
+def register_merge_task(batch_id: int) -> tuple[dict, bool]:
+    """
+    Reserve a task ID for merging a Batch. Only one merge task can be registered per Batch,
+    duplicate requests get the task that is already in-flight. When the cache is unavailable,
+    the task is created without deduplicating the requests.
+    :param batch_id: ID of Batch record
+    :return: Tuple of the registered task and a bool if it was created by this call
+    """
+    task = {"task_id": uuid.uuid4().hex}
+    key = get_registry_key(batch_id)
+    if cache.add(key, task, settings.OPENSPP_MERGE_LOCK_TIMEOUT):
+        return task, True
+
+    existing_task = cache.get(key)
+    if existing_task is None:
+        # The in-flight task has been released in between, retry once
+        if cache.add(key, task, settings.OPENSPP_MERGE_LOCK_TIMEOUT):
+            return task, True
+        existing_task = cache.get(key)
+        if existing_task is None:
+            # The cache ignores its errors in production, it neither adds nor gets the task
+            logger.warning(
+                f"Merge registry unavailable, Batch #{batch_id} is merged without deduplication."
+            )
+            return task, True
+    return existing_task, False
+
+
+def claim_merge_task(batch_id: int, task_id: str) -> bool:
+    """
+    Check that the task is the registered merge task of the Batch before doing any work.
+    Tasks that are not registered, e.g. enqueued outside the API, claim the Batch if it is free.
+    :param batch_id: ID of Batch record
+    :param task_id: ID of the celery task
+    :return: True if the task can merge the Batch
+    """
+    task = {"task_id": task_id}
+    key = get_registry_key(batch_id)
+    if cache.add(key, task, settings.OPENSPP_MERGE_LOCK_TIMEOUT):
+        return True
+
+    registered_task = cache.get(key)
+    if registered_task and registered_task["task_id"] != task_id:
+        logger.info(
+            f"Batch #{batch_id} is already merged by task {registered_task['task_id']}."
+        )
+        return False
+    return True
+
+
+def release_merge_task(batch_id: int, task_id: str) -> None:
+    """Release the Batch if the task is its registered merge task."""
+    key = get_registry_key(batch_id)
+    registered_task = cache.get(key)
+    if registered_task and registered_task["task_id"] == task_id:
+        cache.delete(key)
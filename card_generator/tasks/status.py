@@ -0,0 +1,111 @@
+from time import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.timezone import now
+
+KEY_PREFIX = "card-merge-status"
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+NOT_FOUND = "not_found"
+NO_CARDS = "no_cards"
+MERGED = "merged"
+ERROR = "error"
+
+
+def get_status_key(batch_id: int) -> str:
+    return f"{KEY_PREFIX}:{batch_id}"
+
+
+def get_merge_status(batch_id: int) -> dict | None:
+    """
+    Get the status of the latest merge task of a Batch.
+    :param batch_id: ID of Batch record
+    :return: Dict with the `task_id`, `status`, `updated` date and `progress` of the task
+    """
+    return cache.get(get_status_key(batch_id))
+
+
+def set_merge_status(batch_id: int, task_id: str, status: str, **extra) -> dict:
+    """
+    Record the status of the merge task of a Batch. The status is kept for
+    `OPENSPP_MERGE_STATUS_TIMEOUT` seconds after the last update.
+    :param batch_id: ID of Batch record
+    :param task_id: ID of the celery task
+    :param status: One of the status constants of this module
+    :param extra: Additional values to report, e.g. a message
+    """
+    merge_status = {
+        "task_id": task_id,
+        "status": status,
+        "updated": now().isoformat(),
+        **extra,
+    }
+    cache.set(
+        get_status_key(batch_id), merge_status, settings.OPENSPP_MERGE_STATUS_TIMEOUT
+    )
+    return merge_status
+
+
+class MergeProgress:
+    """Track the progress of a merge task and publish it with the merge status."""
+
+    def __init__(self, batch_id: int, task_id: str):
+        """
+        :param batch_id: ID of Batch record
+        :param task_id: ID of the celery task
+        """
+        self.batch_id = batch_id
+        self.task_id = task_id
+        self.started = time()
+        self.records_total = 0
+        self.records_fetched = 0
+        self.pages_merged = 0
+        self.chunk_bytes = 0
+        self.result_bytes = None
+
+    def set_total(self, records_total: int) -> None:
+        self.records_total = records_total
+        self.publish()
+
+    def update(
+        self, records_fetched: int = 0, pages_merged: int = 0, chunk_bytes: int = 0
+    ) -> None:
+        """
+        Add the work done since the last update and publish the progress.
+        :param records_fetched: Queue IDs requested, including the ones without a card
+        :param pages_merged: Pages of the merged chunks
+        :param chunk_bytes: Size of the merged chunks
+        """
+        self.records_fetched += records_fetched
+        self.pages_merged += pages_merged
+        self.chunk_bytes += chunk_bytes
+        self.publish()
+
+    def set_result_size(self, result_bytes: int) -> None:
+        """Publish the size of the final PDF, once merged and imposed."""
+        self.result_bytes = result_bytes
+        self.publish()
+
+    def as_dict(self) -> dict:
+        elapsed = time() - self.started
+        eta = None
+        if self.records_fetched and self.records_total:
+            remaining = max(self.records_total - self.records_fetched, 0)
+            eta = round(elapsed / self.records_fetched * remaining, 2)
+        return {
+            "records_total": self.records_total,
+            "records_fetched": self.records_fetched,
+            "pages_merged": self.pages_merged,
+            "chunk_bytes": self.chunk_bytes,
+            "result_bytes": self.result_bytes,
+            "elapsed": round(elapsed, 2),
+            "eta": eta,
+        }
+
+    def publish(self, status: str = RUNNING, **extra) -> dict:
+        return set_merge_status(
+            self.batch_id, self.task_id, status, progress=self.as_dict(), **extra
+        )
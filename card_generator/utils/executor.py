@@ -0,0 +1,63 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+
+
+class ExecutorFull(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """
+    Run blocking calls from async views on a pool of threads. Calls wait in a queue of
+    `max_queued` calls when all the threads are busy, and are refused when it is full.
+    """
+
+    def __init__(self, max_workers: int, max_queued: int, name: str = "executor"):
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix=name)
+        self.max_pending = max_workers + max_queued
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    async def run(self, func, *args):
+        """
+        :raises ExecutorFull: The threads are busy and the queue is full
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise ExecutorFull()
+            self.pending += 1
+
+        def call():
+            try:
+                return context.run(func, *args)
+            finally:
+                self._release()
+
+        # The call keeps the trace and other context variables of the request
+        context = contextvars.copy_context()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, call)
+        except BaseException:
+            self._release()
+            raise
+        return await future
+
+    def _release(self) -> None:
+        with self._lock:
+            self.pending -= 1
+
+
+@lru_cache(maxsize=None)
+def get_render_executor() -> BoundedExecutor:
+    """Get the executor of the async renders, sized with `OPENSPP_ASYNC_RENDER_*`."""
+    workers = settings.OPENSPP_ASYNC_RENDER_WORKERS or os.cpu_count() or 1
+    queue_size = settings.OPENSPP_ASYNC_RENDER_QUEUE_SIZE
+    if queue_size is None:
+        queue_size = workers * 4
+    return BoundedExecutor(workers, queue_size, name="render")
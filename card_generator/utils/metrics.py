@@ -0,0 +1,196 @@
+import ipaddress
+import logging
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from card_generator.cards.signals import card_rendered
+
+logger = logging.getLogger(__name__)
+
+RENDER_SECONDS = Histogram(
+    "card_generator_render_seconds",
+    "Latency of the render endpoint.",
+    ["status"],
+)
+RENDERS_IN_PROGRESS = Gauge(
+    "card_generator_renders_in_progress",
+    "Number of renders holding a render slot.",
+    multiprocess_mode="livesum",
+)
+RENDER_QUEUE_LENGTH = Gauge(
+    "card_generator_render_queue_length",
+    "Number of renders waiting for a render slot.",
+    multiprocess_mode="livesum",
+)
+RENDER_QUEUE_WAIT_SECONDS = Histogram(
+    "card_generator_render_queue_wait_seconds",
+    "Time the renders waited for a render slot.",
+)
+RENDER_REJECTED = Counter(
+    "card_generator_render_rejected",
+    "Renders rejected because the render slots were saturated.",
+    ["reason"],
+)
+RENDER_STAGE_SECONDS = Histogram(
+    "card_generator_render_stage_seconds",
+    "Duration of each stage of a card render.",
+    ["stage"],
+)
+TEMPLATE_CACHE_REQUESTS = Counter(
+    "card_generator_template_cache_requests",
+    "Lookups of compiled card templates, by `hit` or `miss` of the cache.",
+    ["result"],
+)
+TEMPLATE_STORAGE_REQUESTS = Counter(
+    "card_generator_template_storage_requests",
+    "Reads of card templates from a remote storage, by `hit` or `miss` of the disk cache.",
+    ["result"],
+)
+RASTERIZER_SECONDS = Histogram(
+    "card_generator_rasterizer_seconds",
+    "Duration of the rsvg-convert subprocess.",
+    ["format"],
+)
+MERGE_SECONDS = Histogram(
+    "card_generator_merge_seconds",
+    "Duration of the merge of a batch.",
+    ["status"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, float("inf")),
+)
+MERGE_BATCH_SIZE = Histogram(
+    "card_generator_merge_batch_size",
+    "Number of cards of the merged batches.",
+    buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, float("inf")),
+)
+OPENSPP_QUERY_SECONDS = Histogram(
+    "card_generator_openspp_query_seconds",
+    "Latency of the XML-RPC queries to OpenSPP.",
+    ["model", "method"],
+)
+OPENSPP_BYTES = Counter(
+    "card_generator_openspp_bytes",
+    "Bytes transferred with OpenSPP.",
+    ["direction"],
+)
+
+
+QUEUE_DEPTH_KEY = "metrics:celery-queue-depth"
+
+
+class CeleryQueueDepthCollector:
+    """
+    Report the number of messages waiting in the Celery queues when scraped. The depths are
+    cached for `OPENSPP_METRICS_QUEUE_DEPTH_TIMEOUT` seconds, so the scrapes of all the processes
+    do not each open a connection to the broker.
+    """
+
+    def collect(self):
+        depths = cache.get(QUEUE_DEPTH_KEY)
+        if depths is None:
+            try:
+                depths = get_celery_queue_depths()
+            except Exception as e:  # noqa A broken broker should not break the scrape
+                logger.warning(f"Celery queue depth is not available. {str(e)}")
+                return
+            cache.set(
+                QUEUE_DEPTH_KEY, depths, settings.OPENSPP_METRICS_QUEUE_DEPTH_TIMEOUT
+            )
+
+        depth = GaugeMetricFamily(
+            "card_generator_celery_queue_depth",
+            "Number of tasks waiting in a Celery queue.",
+            labels=["queue"],
+        )
+        for queue, message_count in depths.items():
+            depth.add_metric([queue], message_count)
+        yield depth
+
+
+def get_celery_queue_depths() -> dict[str, int]:
+    from config.celery_app import app
+
+    depths = {}
+    with app.connection_for_read() as connection:
+        connection.ensure_connection(max_retries=1)
+        with connection.channel() as channel:
+            for queue in get_celery_queues():
+                _, message_count, _ = channel.queue_declare(queue=queue, passive=True)
+                depths[queue] = message_count
+    return depths
+
+
+def get_celery_queues() -> list[str]:
+    queues = getattr(settings, "CELERY_TASK_QUEUES", None)
+    if queues:
+        return [queue.name for queue in queues]
+    return [getattr(settings, "CELERY_TASK_DEFAULT_QUEUE", "celery")]
+
+
+def get_registry() -> CollectorRegistry:
+    """
+    Get the registry to export. With `PROMETHEUS_MULTIPROC_DIR`, the metrics of all the
+    processes of the host, e.g. gunicorn or Celery workers, are aggregated.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def is_metrics_client_allowed(address: str) -> bool:
+    """Check that the client address is in one of the networks of `OPENSPP_METRICS_ALLOWED_IPS`."""
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in settings.OPENSPP_METRICS_ALLOWED_IPS
+    )
+
+
+def metrics_view(request):
+    if not is_metrics_client_allowed(request.META.get("REMOTE_ADDR", "")):
+        return HttpResponseForbidden()
+    registry = get_registry()
+    output = generate_latest(registry)
+    if settings.OPENSPP_METRICS_CELERY_QUEUES:
+        queue_registry = CollectorRegistry()
+        queue_registry.register(CeleryQueueDepthCollector())
+        output += generate_latest(queue_registry)
+    return HttpResponse(output, content_type=CONTENT_TYPE_LATEST)
+
+
+def start_metrics_server(port: int) -> None:
+    """Serve the metrics of a process without a web server, e.g. a Celery worker."""
+    start_http_server(port, registry=get_registry())
+
+
+def mark_process_dead(pid: int) -> None:
+    """Remove the live gauges of a stopped process from the multiprocess metrics."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid)
+
+
+@receiver(card_rendered)
+def observe_render_stages(sender, timer, **kwargs):
+    for stage, durations in timer.durations.items():
+        for duration in durations:
+            RENDER_STAGE_SECONDS.labels(stage=stage).observe(duration)
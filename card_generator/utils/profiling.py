@@ -0,0 +1,164 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.utils.timezone import now
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+
+
+class SamplingProfiler:
+    """
+    Sample the stack of the profiled thread from a background thread. The profiled code runs
+    untouched between samples, so the overhead stays low enough for production.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        """
+        :param interval: Seconds between two samples
+        """
+        self.interval = interval
+        # Time spent in each stack, from the outermost frame to the innermost one
+        self.samples: Counter[tuple] = Counter()
+        self._thread_id = None
+        self._sampler = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        self._thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._sampler.join()
+
+    def _sample(self) -> None:
+        last_sample = perf_counter()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            sample_time = perf_counter()
+            self.samples[tuple(reversed(stack))] += sample_time - last_sample
+            last_sample = sample_time
+
+    def to_speedscope(self, name: str) -> dict:
+        """Get the profile in the format of https://www.speedscope.app/."""
+        frames = []
+        frame_indexes = {}
+        samples = []
+        for stack in self.samples:
+            sample = []
+            for frame in stack:
+                if frame not in frame_indexes:
+                    frame_indexes[frame] = len(frames)
+                    function, file, line = frame
+                    frames.append({"name": function, "file": file, "line": line})
+                sample.append(frame_indexes[frame])
+            samples.append(sample)
+        weights = list(self.samples.values())
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "card_generator",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+
+
+def is_profiling_requested(request) -> bool | None:
+    """
+    Profile the request when a staff user sends the `X-Profile` header,
+    otherwise leave it to the sampling of `OPENSPP_PROFILING_SAMPLE_RATE`.
+    """
+    if request.headers.get(PROFILE_HEADER) and request.user.is_staff:
+        return True
+    return None
+
+
+def should_profile(enabled: bool | None = None) -> bool:
+    if not settings.OPENSPP_PROFILING_DIR:
+        return False
+    if enabled is not None:
+        return enabled
+    return random.random() < settings.OPENSPP_PROFILING_SAMPLE_RATE  # nosec
+
+
+def save_profile(profiler: SamplingProfiler | cProfile.Profile, name: str) -> str:
+    """
+    Save the profile in `OPENSPP_PROFILING_DIR`.
+    :param profiler: Stopped profiler
+    :param name: Name of the profile, e.g. with the card UUID or batch ID
+    :return: The file name of the profile
+    """
+    os.makedirs(settings.OPENSPP_PROFILING_DIR, exist_ok=True)
+    base_name = f"{name}-{now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    if isinstance(profiler, cProfile.Profile):
+        file_name = os.path.join(settings.OPENSPP_PROFILING_DIR, f"{base_name}.pstats")
+        profiler.dump_stats(file_name)
+        return file_name
+    file_name = os.path.join(
+        settings.OPENSPP_PROFILING_DIR, f"{base_name}.speedscope.json"
+    )
+    with open(file_name, "w") as f:
+        json.dump(profiler.to_speedscope(name), f)
+    return file_name
+
+
+@contextmanager
+def profile(name: str, enabled: bool | None = None):
+    """
+    Profile the block and save the profile in `OPENSPP_PROFILING_DIR`.
+    :param name: Name of the profile, e.g. with the card UUID or batch ID
+    :param enabled: Force the profiling on or off, defaults to profile
+        `OPENSPP_PROFILING_SAMPLE_RATE` of the calls
+    """
+    if not should_profile(enabled):
+        yield
+        return
+
+    if settings.OPENSPP_PROFILING_FORMAT == "pstats":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = SamplingProfiler(settings.OPENSPP_PROFILING_INTERVAL)
+        profiler.start()
+    try:
+        yield
+    finally:
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+        try:
+            file_name = save_profile(profiler, name)
+        except OSError as e:
+            logger.warning(f"Profile {name} could not be saved. {str(e)}")
+        else:
+            logger.info(f"Profile {name} saved in {file_name}.")
@@ -0,0 +1,37 @@
+import asyncio
+import threading
+
+from django.test import SimpleTestCase
+
+from card_generator.utils.executor import BoundedExecutor, ExecutorFull
+
+
+class TestBoundedExecutor(SimpleTestCase):
+    def test_run(self):
+        executor = BoundedExecutor(max_workers=2, max_queued=0)
+        result = asyncio.run(executor.run(sum, [1, 2, 3]))
+        self.assertEqual(6, result)
+        self.assertEqual(0, executor.pending)
+
+    def test_queue_full(self):
+        executor = BoundedExecutor(max_workers=1, max_queued=1)
+        release = threading.Event()
+
+        async def run():
+            running = [
+                asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)
+            ]
+            await asyncio.sleep(0)
+            with self.assertRaises(ExecutorFull):
+                await executor.run(release.wait)
+            release.set()
+            return await asyncio.gather(*running)
+
+        self.assertEqual([True, True], asyncio.run(run()))
+        self.assertEqual(0, executor.pending)
+
+    def test_run_error(self):
+        executor = BoundedExecutor(max_workers=1, max_queued=0)
+        with self.assertRaises(ZeroDivisionError):
+            asyncio.run(executor.run(divmod, 1, 0))
+        self.assertEqual(0, executor.pending)
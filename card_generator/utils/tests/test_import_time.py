@@ -0,0 +1,80 @@
+import subprocess  # nosec
+import sys
+from itertools import islice
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+# Dependencies of the renders and merges, imported on their first use
+HEAVY_MODULES = ("PyPDF2", "bs4", "qrcode", "PIL", "lxml")
+
+
+def get_imports(code: str) -> list[tuple[int, int, str]]:
+    """
+    Run the code in a new interpreter with `-X importtime`.
+    :return: The cumulative time in microseconds, depth and name of each imported module,
+        in the order they were done, i.e. a module after the modules it imports
+    """
+    result = subprocess.run(  # nosec
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=settings.ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or line.endswith("| imported package"):
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((int(cumulative), depth, name.strip()))
+    return imports
+
+
+def get_heavy_imports(imports: list[tuple[int, int, str]]) -> dict[str, str]:
+    """
+    :return: The heavy modules imported, with the closest module of the project importing them,
+        or the module importing them when there is none
+    """
+    heavy_imports = {}
+    for index, (_, depth, name) in enumerate(imports):
+        if name.split(".")[0] not in HEAVY_MODULES:
+            continue
+        # The importers are the next modules with a lower depth than the last one
+        importers = []
+        for _, importer_depth, importer in islice(imports, index + 1, None):
+            if importer_depth < depth:
+                importers.append(importer)
+                depth = importer_depth
+        if not importers or importers[0].split(".")[0] in HEAVY_MODULES:
+            continue
+        heavy_imports[name] = next(
+            (module for module in importers if module.startswith("card_generator")),
+            importers[0],
+        )
+    return heavy_imports
+
+
+class TestImportTime(SimpleTestCase):
+    def test_manage_py_check(self):
+        imports = get_imports(
+            "from django.core.management import execute_from_command_line; "
+            "execute_from_command_line(['manage.py', 'check'])"
+        )
+        self.assertEqual({}, get_heavy_imports(imports))
+
+    def test_worker_boot(self):
+        imports = get_imports(
+            "import django; django.setup(); "
+            "from config.celery_app import app; app.loader.import_default_modules()"
+        )
+        self.assertIn("card_generator.tasks.cards", [name for *_, name in imports])
+        self.assertEqual({}, get_heavy_imports(imports))
+
+    def test_heavy_imports_report(self):
+        imports = get_imports(
+            "import django; django.setup(); import card_generator.cards.qrcode"
+        )
+        heavy_imports = get_heavy_imports(imports)
+        self.assertEqual("card_generator.cards.qrcode", heavy_imports["qrcode"])
@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from card_generator.cards.signals import card_rendered
+from card_generator.utils.metrics import CeleryQueueDepthCollector
+from card_generator.utils.timing import StageTimer
+
+
+class TestMetrics(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(OPENSPP_METRICS_CELERY_QUEUES=False)
+    def test_metrics_endpoint(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(200, response.status_code)
+        content = response.content.decode("utf-8")
+        self.assertIn("card_generator_render_seconds", content)
+        self.assertIn("card_generator_openspp_query_seconds", content)
+        self.assertNotIn("card_generator_celery_queue_depth", content)
+
+    def test_metrics_endpoint_forbidden(self):
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.5")
+        self.assertEqual(403, response.status_code)
+
+    @override_settings(
+        OPENSPP_METRICS_ALLOWED_IPS=["10.0.0.0/8"], OPENSPP_METRICS_CELERY_QUEUES=False
+    )
+    def test_metrics_endpoint_allowed_network(self):
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="10.1.2.3")
+        self.assertEqual(200, response.status_code)
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(403, response.status_code)
+
+    def test_render_stages_are_observed(self):
+        labels = {"stage": "pdf_conversion"}
+        before = (
+            REGISTRY.get_sample_value(
+                "card_generator_render_stage_seconds_count", labels
+            )
+            or 0
+        )
+        timer = StageTimer()
+        with timer.stage("pdf_conversion"):
+            pass
+        card_rendered.send(sender=None, card=None, timer=timer)
+        self.assertEqual(
+            before + 1,
+            REGISTRY.get_sample_value(
+                "card_generator_render_stage_seconds_count", labels
+            ),
+        )
+
+    @mock.patch("config.celery_app.app.connection_for_read")
+    def test_celery_queue_depth(self, mock_connection_for_read):
+        connection = mock_connection_for_read.return_value.__enter__.return_value
+        channel = connection.channel.return_value.__enter__.return_value
+        channel.queue_declare.side_effect = lambda queue, passive: (queue, 3, 0)
+
+        metrics = list(CeleryQueueDepthCollector().collect())
+        self.assertEqual(1, len(metrics))
+        self.assertEqual(
+            ["renders", "merges", "bulk_merges"],
+            [sample.labels["queue"] for sample in metrics[0].samples],
+        )
+        self.assertEqual(3, metrics[0].samples[0].value)
+
+        # The depths are cached between the scrapes
+        list(CeleryQueueDepthCollector().collect())
+        self.assertEqual(3, channel.queue_declare.call_count)
+
+    @mock.patch("config.celery_app.app.connection_for_read")
+    def test_celery_queue_depth_broker_unavailable(self, mock_connection_for_read):
+        mock_connection_for_read.side_effect = ConnectionError("Broker is down")
+        self.assertEqual([], list(CeleryQueueDepthCollector().collect()))
+        mock_connection_for_read.side_effect = None
+        connection = mock_connection_for_read.return_value.__enter__.return_value
+        channel = connection.channel.return_value.__enter__.return_value
+        channel.queue_declare.return_value = ("renders", 0, 0)
+        # The failures are not cached
+        self.assertEqual(1, len(list(CeleryQueueDepthCollector().collect())))
@@ -0,0 +1,86 @@
+import json
+import os
+import pstats
+import tempfile
+from time import perf_counter
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TestCase, override_settings
+
+from card_generator.users.tests.factories import UserFactory
+from card_generator.utils.profiling import is_profiling_requested, profile
+
+
+def busy_loop(seconds: float) -> None:
+    end = perf_counter() + seconds
+    while perf_counter() < end:
+        pass
+
+
+class TestProfiling(TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.profiling_dir = temp_dir.name
+
+    def test_speedscope_profile(self):
+        with override_settings(OPENSPP_PROFILING_DIR=self.profiling_dir):
+            with profile("render-1234", enabled=True):
+                busy_loop(0.05)
+
+        (file_name,) = os.listdir(self.profiling_dir)
+        self.assertTrue(file_name.startswith("render-1234-"))
+        self.assertTrue(file_name.endswith(".speedscope.json"))
+        with open(os.path.join(self.profiling_dir, file_name)) as f:
+            speedscope = json.load(f)
+        frames = [frame["name"] for frame in speedscope["shared"]["frames"]]
+        self.assertIn("busy_loop", frames)
+        self.assertGreater(speedscope["profiles"][0]["endValue"], 0)
+
+    def test_pstats_profile(self):
+        with override_settings(
+            OPENSPP_PROFILING_DIR=self.profiling_dir, OPENSPP_PROFILING_FORMAT="pstats"
+        ):
+            with profile("merge-5", enabled=True):
+                busy_loop(0.01)
+
+        (file_name,) = os.listdir(self.profiling_dir)
+        self.assertTrue(file_name.startswith("merge-5-"))
+        stats = pstats.Stats(os.path.join(self.profiling_dir, file_name))
+        functions = [function for _, _, function in stats.stats]
+        self.assertIn("busy_loop", functions)
+
+    def test_sampling(self):
+        with override_settings(
+            OPENSPP_PROFILING_DIR=self.profiling_dir, OPENSPP_PROFILING_SAMPLE_RATE=0
+        ):
+            with profile("render-1234"):
+                pass
+        self.assertEqual([], os.listdir(self.profiling_dir))
+
+        with override_settings(
+            OPENSPP_PROFILING_DIR=self.profiling_dir, OPENSPP_PROFILING_SAMPLE_RATE=1
+        ):
+            with profile("render-1234"):
+                pass
+        self.assertEqual(1, len(os.listdir(self.profiling_dir)))
+
+    @override_settings(OPENSPP_PROFILING_DIR=None)
+    def test_profiling_disabled(self):
+        with profile("render-1234", enabled=True):
+            pass
+        self.assertEqual([], os.listdir(self.profiling_dir))
+
+    def test_is_profiling_requested(self):
+        request = RequestFactory().post("/", HTTP_X_PROFILE="1")
+        request.user = UserFactory(is_staff=True)
+        self.assertTrue(is_profiling_requested(request))
+
+        request.user = UserFactory()
+        self.assertIsNone(is_profiling_requested(request))
+        request.user = AnonymousUser()
+        self.assertIsNone(is_profiling_requested(request))
+
+        request = RequestFactory().post("/")
+        request.user = UserFactory(is_staff=True)
+        self.assertIsNone(is_profiling_requested(request))
@@ -0,0 +1,25 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from card_generator.utils.timing import StageTimer
+
+
+@mock.patch("card_generator.utils.timing.perf_counter")
+class TestStageTimer(SimpleTestCase):
+    def test_nested_stages(self, mock_perf_counter):
+        # Start timer, start outer, start inner, end inner, end outer, start outer, end outer,
+        # stop timer
+        mock_perf_counter.side_effect = [-1.0, 0.0, 1.0, 3.0, 4.0, 10.0, 10.5, 11.0]
+        timer = StageTimer()
+        with timer.stage("outer"):
+            with timer.stage("inner"):
+                pass
+        with timer.stage("outer"):
+            pass
+        timer.stop()
+
+        self.assertEqual({"outer": 2.5, "inner": 2.0}, timer.as_dict())
+        self.assertEqual([2.0, 0.5], timer.durations["outer"])
+        # The total includes the time outside the stages
+        self.assertEqual(12.0, timer.total)
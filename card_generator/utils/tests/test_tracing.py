@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import SpanKind
+
+from card_generator.cards.client import QueueCardsClient
+from card_generator.cards.fake_openspp import FakeOpenSPP, FakeOpenSPPServer
+from card_generator.tasks.cards import perform_merging
+from card_generator.utils.timing import StageTimer
+from card_generator.utils.tracing import tracer
+
+exporter = InMemorySpanExporter()
+
+
+class FakeTask:
+    name = "merge_cards"
+
+
+class TestTracing(TestCase):
+    def setUp(self):
+        exporter.clear()
+        # The global tracer provider of a process can only be set once, the tracer shared by the
+        # modules records the spans of a provider of the test instead
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+        test_tracer = provider.get_tracer("card_generator")
+        for method in ("start_span", "start_as_current_span"):
+            patcher = mock.patch.object(tracer, method, getattr(test_tracer, method))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_span(self, name):
+        return next(span for span in exporter.get_finished_spans() if span.name == name)
+
+    def test_request_span(self):
+        traceparent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+        self.client.get("/api/v1/cards/", HTTP_TRACEPARENT=traceparent)
+
+        span = self.get_span("GET api/v1/cards/$")
+        self.assertEqual(SpanKind.SERVER, span.kind)
+        self.assertEqual(0x0AF7651916CD43DD8448EB211C80319C, span.context.trace_id)
+        self.assertEqual(0xB7AD6B7169203331, span.parent.span_id)
+        self.assertEqual(401, span.attributes["http.status_code"])
+
+    def test_task_context_propagation(self):
+        headers = {"id": "task-1", "task": "merge_cards"}
+        with tracer.start_as_current_span("enqueue") as enqueue_span:
+            before_task_publish.send(sender="merge_cards", headers=headers)
+        self.assertIn("traceparent", headers)
+
+        # The worker gets the headers of the message as attributes of the request
+        task = FakeTask()
+        task.request = SimpleNamespace(traceparent=headers["traceparent"], retries=0)
+        task_prerun.send(sender=task, task_id="task-1", task=task)
+        with tracer.start_as_current_span("work"):
+            pass
+        task_postrun.send(sender=task, task_id="task-1", task=task, state="SUCCESS")
+
+        run_span = self.get_span("run merge_cards")
+        self.assertEqual(SpanKind.CONSUMER, run_span.kind)
+        self.assertEqual(enqueue_span.context.trace_id, run_span.context.trace_id)
+        self.assertEqual(enqueue_span.context.span_id, run_span.parent.span_id)
+        self.assertEqual("SUCCESS", run_span.attributes["celery.state"])
+        self.assertEqual(run_span.context.span_id, self.get_span("work").parent.span_id)
+
+    def test_stage_spans(self):
+        timer = StageTimer()
+        with timer.stage("jinja_render"):
+            with timer.stage("qr_generation"):
+                pass
+
+        parent = self.get_span("jinja_render")
+        self.assertEqual(
+            parent.context.span_id, self.get_span("qr_generation").parent.span_id
+        )
+
+    @override_settings(OPENSPP_MERGE_CHUNK_SIZE=5)
+    def test_merge_spans(self):
+        cache.clear()
+        server = FakeOpenSPPServer(FakeOpenSPP({5: 12}, pdf_size=1000))
+        server.start(in_process=True)
+        self.addCleanup(server.stop)
+        client = QueueCardsClient(
+            server_root=server.server_root,
+            username="admin",
+            password="password",
+            db_name="devel",
+        )
+        perform_merging(client, 5)
+
+        spans = exporter.get_finished_spans()
+        chunk_spans = [span for span in spans if span.name == "merge_chunk"]
+        self.assertEqual([5, 5, 2], [span.attributes["cards"] for span in chunk_spans])
+        fetch_span = next(span for span in spans if span.name == "fetch_pdfs")
+        self.assertEqual(chunk_spans[0].context.span_id, fetch_span.parent.span_id)
+        query_spans = [
+            span
+            for span in spans
+            if span.kind == SpanKind.CLIENT
+            and span.parent.span_id == fetch_span.context.span_id
+        ]
+        self.assertTrue(query_spans)
+        self.assertEqual("xmlrpc", query_spans[0].attributes["rpc.system"])
+        self.assertTrue(self.get_span("upload_pdf"))
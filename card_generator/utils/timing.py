@@ -0,0 +1,49 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+from card_generator.utils.tracing import tracer
+
+
+class StageTimer:
+    """
+    Measure the duration of a process and of its stages.
+    Stages can be nested, the time spent in a nested stage is not counted in its parent,
+    so the durations of the stages do not overlap. The total is the wall time from the creation
+    of the timer until it is stopped, including the time spent outside the stages. Each stage
+    is also traced as a span.
+    """
+
+    def __init__(self):
+        self.durations: dict[str, list[float]] = defaultdict(list)
+        self._children: list[float] = []
+        self.started = perf_counter()
+        self.stopped: float | None = None
+
+    def stop(self) -> None:
+        self.stopped = perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        self._children.append(0.0)
+        start = perf_counter()
+        try:
+            with tracer.start_as_current_span(name):
+                yield
+        finally:
+            elapsed = perf_counter() - start
+            self.durations[name].append(elapsed - self._children.pop())
+            if self._children:
+                self._children[-1] += elapsed
+
+    @property
+    def total(self) -> float:
+        """Get the wall time in seconds, until now if the timer is not stopped."""
+        stopped = perf_counter() if self.stopped is None else self.stopped
+        return stopped - self.started
+
+    def as_dict(self) -> dict[str, float]:
+        """Get the total duration of each stage in seconds."""
+        return {
+            name: round(sum(durations), 6) for name, durations in self.durations.items()
+        }
@@ -0,0 +1,146 @@
+import os
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery.signals import before_task_publish, task_failure, task_postrun, task_prerun
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from opentelemetry import context, propagate, trace
+from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+)
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+tracer = trace.get_tracer("card_generator")
+
+# Spans of the tasks being executed by this process, by task ID
+_task_spans: dict[str, tuple] = {}
+
+
+def get_span_exporter(exporter: str) -> SpanExporter:
+    """
+    :param exporter: `console`, `file` to append the spans to `OPENSPP_TRACING_FILE` as JSON lines,
+        or `otlp` to send them to the collector of `OTEL_EXPORTER_OTLP_ENDPOINT`
+    """
+    if exporter == "console":
+        return ConsoleSpanExporter()
+    if exporter == "file":
+        return ConsoleSpanExporter(
+            out=open(settings.OPENSPP_TRACING_FILE, "a"),
+            formatter=lambda span: span.to_json(indent=None) + os.linesep,
+        )
+    if exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter()
+    raise ImproperlyConfigured(f"Unknown tracing exporter `{exporter}`.")
+
+
+def configure_tracing(service_name: str) -> None:
+    """
+    Export the spans of this process with `OPENSPP_TRACING_EXPORTER`.
+    Without an exporter, spans are not recorded at all.
+    """
+    if not settings.OPENSPP_TRACING_EXPORTER:
+        return
+    provider = TracerProvider(resource=Resource.create({SERVICE_NAME: service_name}))
+    provider.add_span_processor(
+        BatchSpanProcessor(get_span_exporter(settings.OPENSPP_TRACING_EXPORTER))
+    )
+    trace.set_tracer_provider(provider)
+
+
+class TracingMiddleware:
+    """Trace each request, as part of the trace of the caller when it sends a `traceparent` header."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.start_span(request) as span:
+            response = self.get_response(request)
+            self.end_span(span, request, response)
+            return response
+
+    async def __acall__(self, request):
+        with self.start_span(request) as span:
+            response = await self.get_response(request)
+            self.end_span(span, request, response)
+            return response
+
+    def start_span(self, request):
+        carrier = {
+            key[5:].replace("_", "-").lower(): value
+            for key, value in request.META.items()
+            if key.startswith("HTTP_")
+        }
+        return tracer.start_as_current_span(
+            request.method,
+            context=propagate.extract(carrier),
+            kind=SpanKind.SERVER,
+            attributes={"http.method": request.method, "http.target": request.path},
+        )
+
+    def end_span(self, span, request, response) -> None:
+        if request.resolver_match:
+            span.update_name(f"{request.method} {request.resolver_match.route}")
+        span.set_attribute("http.status_code", response.status_code)
+        if response.status_code >= 500:
+            span.set_status(Status(StatusCode.ERROR))
+
+
+@before_task_publish.connect
+def inject_trace_context(headers=None, **kwargs):
+    """Send the current trace with the task, so it is continued by the worker."""
+    if headers is not None:
+        propagate.inject(headers)
+
+
+@task_prerun.connect
+def start_task_span(task_id=None, task=None, **kwargs):
+    carrier = {}
+    for field in propagate.get_global_textmap().fields:
+        value = getattr(task.request, field, None)
+        if value is not None:
+            carrier[field] = value
+    # Eager tasks have no headers and continue the current trace
+    parent = propagate.extract(carrier, context=context.get_current())
+    span = tracer.start_span(
+        f"run {task.name}",
+        context=parent,
+        kind=SpanKind.CONSUMER,
+        attributes={"celery.task_id": task_id, "celery.retries": task.request.retries},
+    )
+    token = context.attach(trace.set_span_in_context(span))
+    _task_spans[task_id] = (span, token)
+
+
+@task_failure.connect
+def record_task_failure(task_id=None, exception=None, **kwargs):
+    if task_id not in _task_spans:
+        return
+    span, _ = _task_spans[task_id]
+    span.record_exception(exception)
+    span.set_status(Status(StatusCode.ERROR, str(exception)))
+
+
+@task_postrun.connect
+def end_task_span(task_id=None, state=None, **kwargs):
+    if task_id not in _task_spans:
+        return
+    span, token = _task_spans.pop(task_id)
+    span.set_attribute("celery.state", state or "")
+    context.detach(token)
+    span.end()
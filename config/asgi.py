@@ -0,0 +1,26 @@
+"""
+ASGI config for Card Generator project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+The async views, e.g. the async render endpoint, only hold a thread of the process
+while they run blocking code, so one process can serve many concurrent renders.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/dev/howto/deployment/asgi/
+
+"""
+import os
+import sys
+from pathlib import Path
+
+from django.core.asgi import get_asgi_application
+
+ROOT_DIR = Path(__file__).resolve(strict=True).parent.parent
+sys.path.append(str(ROOT_DIR / "card_generator"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.production")
+
+application = get_asgi_application()
+
+from card_generator.utils.tracing import configure_tracing  # noqa E402
+
+configure_tracing("card-generator")
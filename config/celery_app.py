@@ -1,6 +1,7 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
 
 # set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.local")
@@ -15,3 +16,34 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
+
+
+@worker_init.connect
+def start_worker_metrics_server(**kwargs):
+    from django.conf import settings
+
+    from card_generator.utils.metrics import start_metrics_server
+
+    if settings.OPENSPP_METRICS_WORKER_PORT:
+        start_metrics_server(settings.OPENSPP_METRICS_WORKER_PORT)
+
+
+@worker_init.connect
+def configure_worker_tracing(**kwargs):
+    from card_generator.utils.tracing import configure_tracing
+
+    configure_tracing("card-generator-worker")
+
+
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    from card_generator.cards.warmup import warm_up
+
+    warm_up("celery")
+
+
+@worker_process_shutdown.connect
+def mark_worker_process_dead(pid=None, **kwargs):
+    from card_generator.utils.metrics import mark_process_dead
+
+    mark_process_dead(pid or os.getpid())
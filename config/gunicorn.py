@@ -0,0 +1,15 @@
+"""Gunicorn settings, loaded with `-c config/gunicorn.py`."""
+
+
+def post_worker_init(worker):
+    """Warm up each worker once it loaded the application, before it accepts requests."""
+    from card_generator.cards.warmup import warm_up
+
+    warm_up("gunicorn")
+
+
+def child_exit(server, worker):
+    """Remove the live gauges of a stopped worker from the multiprocess metrics."""
+    from card_generator.utils.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
@@ -4,6 +4,7 @@ Base settings to build other settings files upon.
 from pathlib import Path
 
 import environ
+from kombu import Queue
 
 ROOT_DIR = Path(__file__).resolve(strict=True).parent.parent.parent
 # card_generator/
@@ -128,9 +129,10 @@ AUTH_PASSWORD_VALIDATORS = [
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
+    "card_generator.utils.tracing.TracingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "card_generator.utils.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -161,6 +163,21 @@ STATICFILES_FINDERS = [
 MEDIA_ROOT = str(APPS_DIR / "media")
 # https://docs.djangoproject.com/en/dev/ref/settings/#media-url
 MEDIA_URL = "/media/"
+# Store the media, e.g. the card templates, in an S3-compatible bucket shared by the nodes
+# instead of MEDIA_ROOT. DJANGO_AWS_S3_ENDPOINT_URL points to another service than AWS, e.g. MinIO.
+# https://django-storages.readthedocs.io/en/latest/backends/amazon-S3.html
+AWS_STORAGE_BUCKET_NAME = env("DJANGO_AWS_STORAGE_BUCKET_NAME", default=None)
+if AWS_STORAGE_BUCKET_NAME:
+    INSTALLED_APPS += ["storages"]
+    DEFAULT_FILE_STORAGE = "storages.backends.s3boto3.S3Boto3Storage"
+    AWS_ACCESS_KEY_ID = env("DJANGO_AWS_ACCESS_KEY_ID", default=None)
+    AWS_SECRET_ACCESS_KEY = env("DJANGO_AWS_SECRET_ACCESS_KEY", default=None)
+    AWS_S3_REGION_NAME = env("DJANGO_AWS_S3_REGION_NAME", default=None)
+    AWS_S3_ENDPOINT_URL = env("DJANGO_AWS_S3_ENDPOINT_URL", default=None)
+    AWS_LOCATION = env("DJANGO_AWS_LOCATION", default="media")
+    AWS_DEFAULT_ACL = None
+    # Uploads with the name of an existing file get a new name, like on the local storage
+    AWS_S3_FILE_OVERWRITE = False
 
 # TEMPLATES
 # ------------------------------------------------------------------------------
@@ -318,6 +335,102 @@ OPENSPP_ID_QUEUE_MODEL = env.str("OPENSPP_CARDS_MODEL", default="spp.print.queue
 OPENSPP_DEFAULT_FETCH_LIMIT = env.str("OPENSPP_DEFAULT_FETCH_LIMIT", default=10)
 OPENSPP_DEFAULT_CARD_X_DPI = env.str("OPENSPP_DEFAULT_CARD_X_DPI", default="72")
 OPENSPP_DEFAULT_CARD_Y_DPI = env.str("OPENSPP_DEFAULT_CARD_Y_DPI", default="72")
+OPENSPP_MERGE_CHUNK_SIZE = env.int("OPENSPP_MERGE_CHUNK_SIZE", default=100)
+# Merge checkpoints are kept in the cache for a day by default, the merged chunks are stored
+# in OPENSPP_MERGE_CHECKPOINT_PATH of the default storage
+OPENSPP_MERGE_CHECKPOINT_TIMEOUT = env.int(
+    "OPENSPP_MERGE_CHECKPOINT_TIMEOUT", default=60 * 60 * 24
+)
+OPENSPP_MERGE_CHECKPOINT_PATH = env.str(
+    "OPENSPP_MERGE_CHECKPOINT_PATH", default="merge-checkpoints"
+)
+# Store identical fonts and images of the cards only once in the merged PDF
+OPENSPP_MERGE_DEDUPE_RESOURCES = env.bool(
+    "OPENSPP_MERGE_DEDUPE_RESOURCES", default=True
+)
+# Duplicate merge requests of a Batch are coalesced into the in-flight task until it
+# finishes or this timeout expires
+OPENSPP_MERGE_LOCK_TIMEOUT = env.int("OPENSPP_MERGE_LOCK_TIMEOUT", default=60 * 60 * 6)
+OPENSPP_MERGE_STATUS_TIMEOUT = env.int(
+    "OPENSPP_MERGE_STATUS_TIMEOUT", default=60 * 60 * 24
+)
+# Gzip encode XML-RPC requests larger than this number of bytes. Only enable it if the
+# OpenSPP server accepts gzip encoded requests.
+OPENSPP_XMLRPC_GZIP_THRESHOLD = env.int("OPENSPP_XMLRPC_GZIP_THRESHOLD", default=None)
+
+# Clients allowed to scrape the metrics endpoint, as addresses or networks, e.g. `10.0.0.0/8`
+OPENSPP_METRICS_ALLOWED_IPS = env.list(
+    "OPENSPP_METRICS_ALLOWED_IPS", default=["127.0.0.1", "::1"]
+)
+# Report the depth of the Celery queues on the metrics endpoint, cached for a few seconds
+OPENSPP_METRICS_CELERY_QUEUES = env.bool("OPENSPP_METRICS_CELERY_QUEUES", default=True)
+OPENSPP_METRICS_QUEUE_DEPTH_TIMEOUT = env.int(
+    "OPENSPP_METRICS_QUEUE_DEPTH_TIMEOUT", default=10
+)
+# Port of the metrics server of the Celery workers, disabled by default
+OPENSPP_METRICS_WORKER_PORT = env.int("OPENSPP_METRICS_WORKER_PORT", default=None)
+
+# Export traces with `console`, `file` or `otlp`, disabled by default
+OPENSPP_TRACING_EXPORTER = env.str("OPENSPP_TRACING_EXPORTER", default="")
+OPENSPP_TRACING_FILE = env.str("OPENSPP_TRACING_FILE", default="traces.jsonl")
+
+# Save profiles of renders and merges in this directory, disabled by default. Staff users
+# can profile a request with the `X-Profile` header, and a share of all the renders and
+# merges can be sampled with the sample rate, from 0 to 1.
+OPENSPP_PROFILING_DIR = env.str("OPENSPP_PROFILING_DIR", default=None)
+OPENSPP_PROFILING_SAMPLE_RATE = env.float("OPENSPP_PROFILING_SAMPLE_RATE", default=0)
+# `speedscope` to sample the stacks every interval in seconds, or `pstats` for cProfile
+OPENSPP_PROFILING_FORMAT = env.str("OPENSPP_PROFILING_FORMAT", default="speedscope")
+OPENSPP_PROFILING_INTERVAL = env.float("OPENSPP_PROFILING_INTERVAL", default=0.005)
+
+# Threads of the async render endpoint per process, defaults to the number of CPUs, and
+# renders waiting for a thread before new ones are refused, defaults to 4 per thread
+OPENSPP_ASYNC_RENDER_WORKERS = env.int("OPENSPP_ASYNC_RENDER_WORKERS", default=None)
+OPENSPP_ASYNC_RENDER_QUEUE_SIZE = env.int(
+    "OPENSPP_ASYNC_RENDER_QUEUE_SIZE", default=None
+)
+
+# Renders running at the same time on the host, defaults to the number of CPUs, limited to
+# one render per OPENSPP_RENDER_SLOT_MEMORY_MB of memory. Up to OPENSPP_RENDER_QUEUE_SIZE
+# renders, defaults to 4 per slot, wait OPENSPP_RENDER_QUEUE_TIMEOUT seconds for a slot.
+OPENSPP_RENDER_SLOTS = env.int("OPENSPP_RENDER_SLOTS", default=None)
+OPENSPP_RENDER_SLOT_MEMORY_MB = env.int("OPENSPP_RENDER_SLOT_MEMORY_MB", default=256)
+OPENSPP_RENDER_QUEUE_SIZE = env.int("OPENSPP_RENDER_QUEUE_SIZE", default=None)
+OPENSPP_RENDER_QUEUE_TIMEOUT = env.float("OPENSPP_RENDER_QUEUE_TIMEOUT", default=10)
+# Directory of the lock files of the render slots, shared by the processes of the host
+OPENSPP_RENDER_SLOTS_DIR = env.str("OPENSPP_RENDER_SLOTS_DIR", default=None)
+
+# Store a copy of the uploaded templates optimized for the renders, with the coordinates of
+# the paths rounded to OPENSPP_SVG_PRECISION decimals
+OPENSPP_SVG_OPTIMIZATION = env.bool("OPENSPP_SVG_OPTIMIZATION", default=True)
+OPENSPP_SVG_PRECISION = env.int("OPENSPP_SVG_PRECISION", default=3)
+# Load fonts subset to the text of the templates and to OPENSPP_FONT_CHARSET in the renders,
+# the other characters use the complete fonts. It only saves loading large fonts, e.g. CJK
+# fonts: cairo subsets the fonts embedded in the PDFs already. The subsets are stored in
+# OPENSPP_FONTS_DIR, shared by the processes of the host.
+OPENSPP_FONT_SUBSETTING = env.bool("OPENSPP_FONT_SUBSETTING", default=False)
+OPENSPP_FONT_CHARSET = env.str(
+    "OPENSPP_FONT_CHARSET",
+    default="".join(map(chr, range(0x20, 0x7F)))
+    + "".join(map(chr, range(0xA0, 0x180))),
+)
+OPENSPP_FONTS_DIR = env.str("OPENSPP_FONTS_DIR", default=None)
+# Directory where each node keeps the card templates read from a remote storage, e.g. S3
+OPENSPP_TEMPLATE_STORAGE_CACHE_DIR = env.str(
+    "OPENSPP_TEMPLATE_STORAGE_CACHE_DIR", default=None
+)
+# Seconds the responses of the card list, details and fields are cached, they are invalidated
+# when a card changes
+OPENSPP_CARD_CACHE_TIMEOUT = env.int("OPENSPP_CARD_CACHE_TIMEOUT", default=300)
+# Seconds the clients may reuse the card list, details and fields before revalidating them
+OPENSPP_CARD_MAX_AGE = env.int("OPENSPP_CARD_MAX_AGE", default=0)
+# Compiled card templates kept in memory by each process
+OPENSPP_TEMPLATE_CACHE_SIZE = env.int("OPENSPP_TEMPLATE_CACHE_SIZE", default=256)
+# Warm up new gunicorn and Celery worker processes: import the render modules, compile the
+# templates of up to OPENSPP_WARMUP_TEMPLATES cards and render the sample card
+OPENSPP_WARMUP = env.bool("OPENSPP_WARMUP", default=True)
+OPENSPP_WARMUP_TEMPLATES = env.int("OPENSPP_WARMUP_TEMPLATES", default=100)
+OPENSPP_WARMUP_RENDER = env.bool("OPENSPP_WARMUP_RENDER", default=True)
 
 # TLS
 OPENSPP_CUSTOM_TLS = env.bool("OPENSPP_USE_TLS", default=False)
@@ -327,3 +440,16 @@ if OPENSPP_CUSTOM_TLS:
 # Celery
 CELERY_MAX_RETRIES = env.int("CELERY_MAX_RETRIES", default=3)
 CELERY_RETRY_COUNTDOWN = env.int("CELERY_RETRY_COUNTDOWN", default=30)
+# Interactive renders, small merges and bulk merges have their own queues, so each can
+# be consumed by workers tuned for its workload
+CELERY_TASK_QUEUES = (Queue("renders"), Queue("merges"), Queue("bulk_merges"))
+CELERY_TASK_DEFAULT_QUEUE = "merges"
+CELERY_TASK_ROUTES = {"card_generator.tasks.cards.merge_cards": {"queue": "merges"}}
+# Merges are only acknowledged once done, so a merge is redelivered instead of lost when
+# its worker stops. Redis redelivers unacknowledged tasks after the visibility timeout,
+# which has to be longer than the longest merge.
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "visibility_timeout": env.int("CELERY_VISIBILITY_TIMEOUT", default=60 * 60 * 6)
+}
+# Batches with more cards are merged on the bulk merges queue
+OPENSPP_BULK_MERGE_THRESHOLD = env.int("OPENSPP_BULK_MERGE_THRESHOLD", default=1000)
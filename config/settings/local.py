@@ -22,6 +22,16 @@ CACHES = {
         "LOCATION": "",
     }
 }
+# The web and celery containers share merge checkpoints through Redis when available
+REDIS_URL = env.str("REDIS_URL", default=None)
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_URL,
+            "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
+        }
+    }
 
 # EMAIL
 # ------------------------------------------------------------------------------